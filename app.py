@@ -2,14 +2,25 @@
 
 import dash
 from dash import dcc, html, Input, Output, MATCH, ALL, State, ctx, dash_table
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import os, threading, json, time, shutil
+import flask
+import os, io, time, shutil
 import pandas as pd
 import plotly.express as px
 
 # utils import (eigene imports)
-from utils.uploader import save_uploaded_image
-from utils.dataloader import get_account_overview
+from utils.uploader import save_uploaded_image, decode_upload
+from utils.archive_import import archive_ext, import_archive, import_message
+from utils.dataset_catalog import get_catalog, is_party_dir
+from utils import chunked_upload
+from utils.blob_store import get_store
+from utils.thumbnails import get_thumbnail
+from face_analysis.analyze_images import checkpoint_count
+from face_analysis.progress import snapshot as progress_snapshot, mark_error, forget as forget_progress
+from face_analysis import results_db, metrics
+from face_analysis.phash_index import get_index as get_phash_index
+from face_analysis.scheduler import Scheduler
 
 app = dash.Dash(
     __name__,
@@ -20,6 +31,8 @@ app.title = "Instagram Diversity Scanner"
 
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
+# summaries von analysen vor dem index übernehmen
+results_db.sync_summaries(os.path.join(DATA_DIR, "analysis"))
 
 # ---------------- helper funktionen ---------------- #
 RACE_KEY_MAP = {
@@ -33,24 +46,31 @@ RACE_KEY_MAP = {
 }
 
 
-def load_party_summaries():
-    """Liest alle summary.json Dateien und bastelt DataFrames zurück"""
-    root = os.path.join(DATA_DIR, "analysis")
-    rows, race_rows = [], []
+# gebaute DataFrames/figuren, pro name ein eintrag (schlüssel, wert)
+_CACHE = {}
+
+
+def cached(name, key, build):
+    """build() nur aufrufen, wenn sich key seit dem letzten mal geändert hat"""
+    hit = _CACHE.get(name)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    wert = build()
+    _CACHE[name] = (key, wert)
+    return wert
 
-    if not os.path.isdir(root):
-        return pd.DataFrame(), pd.DataFrame()
 
-    for party in sorted(os.listdir(root)):
-        summary_file = os.path.join(root, party, "summary.json")
-        if not os.path.isfile(summary_file):
-            continue
+def load_party_summaries():
+    """Summaries als DataFrames, nur neu gebaut wenn sich der Index geändert hat"""
+    return cached("summaries", results_db.data_version(), _party_summary_frames)
+
 
-        try:
-            s = json.load(open(summary_file, encoding="utf-8"))
-        except Exception:
-            continue
+def _party_summary_frames():
+    """Liest die Summaries aus dem Ergebnis-Index und bastelt DataFrames zurück"""
+    rows, race_rows = [], []
 
+    for s in results_db.party_summaries():
+        party = s["party"]
         faces_total = int(s.get("faces_total", 0) or 0)
         total_images = int(s.get("total_images", 0) or 0)
         images_processed = int(s.get("images_processed", 0) or 0)
@@ -98,11 +118,104 @@ def load_party_summaries():
                 "pct": round(pct, 1)
             })
 
+    if not rows:
+        return pd.DataFrame(), pd.DataFrame()
+
     df = pd.DataFrame(rows).sort_values("party")
     races_long_df = pd.DataFrame(race_rows)
     return df, races_long_df
 
 
+TREND_GRAINS = {"day": "Tag", "week": "Woche", "month": "Monat"}
+TREND_METRICS = {
+    "female_pct": "Frauen %",
+    "poc_pct": "PoC %",
+    "faces": "Gesichter",
+    "images": "Bilder",
+}
+
+
+def load_trends(grain):
+    """Zeitreihe pro Partei, nur neu gebaut wenn sich der Index geändert hat"""
+    return cached(f"trends-{grain}", results_db.data_version(), lambda: _trend_frame(grain))
+
+
+def _trend_frame(grain):
+    """Zeitreihe pro Partei aus den vorberechneten Trend-Tabellen"""
+    rows = results_db.trends(grain, metrics=["images", "faces", "gender:Female", "race:White"])
+    df = pd.DataFrame(rows, columns=["party", "bucket", "metric", "n"])
+    if df.empty:
+        return df
+
+    wide = df.pivot_table(index=["party", "bucket"], columns="metric", values="n",
+                          aggfunc="sum", fill_value=0).reset_index()
+    for col in ("images", "faces", "gender:Female", "race:White"):
+        if col not in wide:
+            wide[col] = 0
+    faces = wide["faces"].where(wide["faces"] > 0)
+    wide["female_pct"] = (100 * wide["gender:Female"] / faces).round(1).fillna(0)
+    wide["poc_pct"] = (100 * (wide["faces"] - wide["race:White"]) / faces).round(1).fillna(0)
+    return wide.sort_values(["party", "bucket"])
+
+
+# ---------- Vorschau-Bilder (thumbnails) für den Fortschritt ---------- #
+@app.server.route("/preview/<party>/<path:image_name>")
+def serve_preview(party, image_name):
+    # nur bilder direkt aus data/<partei>/
+    if not is_party_dir(party, DATA_DIR):
+        flask.abort(404)
+    if not image_name.lower().endswith((".jpg", ".jpeg", ".png")):
+        flask.abort(404)
+    party_dir = os.path.abspath(os.path.join(DATA_DIR, party))
+    pfad = os.path.join(party_dir, os.path.basename(image_name))
+    if not os.path.isfile(pfad):
+        flask.abort(404)
+    try:
+        thumb, key = get_thumbnail(pfad)
+    except Exception:
+        flask.abort(404)
+    # kleines jpeg, browser darf es behalten (etag ändert sich mit dem bild)
+    resp = flask.send_file(thumb, mimetype="image/jpeg", etag=key, conditional=True, max_age=3600)
+    resp.headers["Cache-Control"] = "public, max-age=3600"
+    return resp
+
+
+# ---------- Upload in Stücken (große Mengen, siehe utils/chunked_upload.py) ---------- #
+def _upload_antwort(fn, *args):
+    try:
+        return flask.jsonify(fn(*args))
+    except chunked_upload.UploadError as e:
+        return flask.jsonify({"error": str(e), **e.extra}), e.status
+
+
+@app.server.route("/upload/init", methods=["POST"])
+def upload_init():
+    data = flask.request.get_json(silent=True) or {}
+    return _upload_antwort(chunked_upload.init_upload, data.get("party"), data.get("filename"), data.get("size"),
+                           data.get("last_modified"), data.get("prefix"))
+
+
+@app.server.route("/upload/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    return _upload_antwort(chunked_upload.upload_status, upload_id)
+
+
+@app.server.route("/upload/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    offset = flask.request.args.get("offset", type=int)
+    if offset is None:
+        return flask.jsonify({"error": "offset fehlt"}), 400
+    return _upload_antwort(chunked_upload.write_chunk, upload_id, offset,
+                           flask.request.stream, flask.request.content_length)
+
+
+# ---------- Metriken (prometheus) ---------- #
+@app.server.route("/metrics")
+def serve_metrics():
+    # stufen-histogramme, zähler, queue-tiefe, laufende jobs
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # ---------- Layout (Reiter) ---------- #
 app.layout = dbc.Container([
     html.H1("Instagram Diversity Scanner", className="text-center my-4"),
@@ -133,16 +246,26 @@ def render_import_tab():
                 children=html.Div(["📄 Dateien hier ablegen oder klicken"]),
                 style={"border": "2px dashed #888", "padding": "40px", "textAlign": "center"},
                 multiple=True,
-                accept=".jpg,.jpeg,.png"
+                accept=".jpg,.jpeg,.png,.zip,.tar.gz,.tgz"
             ),
             html.Div(id="upload-feedback", className="mt-2 text-muted"),
-            html.Div(id="upload-status", className="mt-2 text-danger")
+            html.Div(id="upload-status", className="mt-2 text-danger"),
+
+            # große mengen: stückweise direkt auf platte (assets/chunked_upload.js)
+            html.H5("Große Mengen hochladen", className="mt-4"),
+            html.Small("Dateien werden in Stücken übertragen; bricht die Verbindung ab, "
+                       "einfach dieselben Dateien noch einmal auswählen – es geht beim letzten Stück weiter. "
+                       "Archive (.zip, .tar.gz) werden ohne Auspacken direkt eingelesen.",
+                       className="text-muted"),
+            html.Div(dbc.Button("Dateien auswählen …", id="chunked-pick", color="secondary", size="sm"),
+                     className="mt-2"),
+            html.Div(id="chunked-progress", className="mt-2 small")
         ], md=6)
     ])
 
 
 def render_overview_tab():
-    overview = get_account_overview()
+    overview = get_catalog().overview()
     cards = []
     for acc, count in overview.items():
         cards.append(
@@ -159,26 +282,54 @@ def render_overview_tab():
     return html.Div(cards)
 
 
-def party_card(party):
-    analysis_dir = os.path.join("data", "analysis", party)
-    os.makedirs(analysis_dir, exist_ok=True)
-    summary_file = os.path.join(analysis_dir, "summary.json")
-    analyzed = os.path.exists(summary_file)
-
-    if analyzed:
+PRIORITIES = [{"label": "Priorität: hoch", "value": 1},
+              {"label": "Priorität: normal", "value": 0},
+              {"label": "Priorität: niedrig", "value": -1}]
+
+
+def party_card(party, jobs=None):
+    # stand aus dem katalog (speicher) und der warteschlange
+    info = get_catalog().info(party)
+    analyzed = info["analyzed"]
+    gesichert = info["checkpoint"]
+    job = (jobs if jobs is not None else SCHEDULER.latest_jobs()).get(party)
+    job_status = job["status"] if job else None
+
+    if job_status == "running":
+        status_txt = "▶ Läuft"
+        color = "steelblue"
+    elif job_status == "queued":
+        status_txt = "⏳ In der Warteschlange"
+        color = "steelblue"
+    elif gesichert:
+        # pausierter oder abgebrochener lauf, nächster start macht dort weiter
+        wie = "Pausiert" if job_status == "paused" else "Unterbrochen"
+        status_txt = f"⏸ {wie} ({gesichert} Bilder gesichert) – Analyse setzt dort fort"
+        color = "orange"
+    elif analyzed:
         status_txt = "✅ Bereits analysiert"
         color = "green"
     else:
         status_txt = "❌ Noch nicht analysiert"
         color = "red"
 
+    offen = job_status in ("queued", "running", "paused")
     return dbc.Card([
         dbc.CardBody([
             html.H5(party, className="card-title"),
             html.P(status_txt, style={"color": color}),
-            dbc.Button("Analysiere Partei",
-                       id={"type": "analyze-btn", "index": party},
-                       color="primary", size="sm", className="mb-2"),
+            html.Div([
+                dbc.Button("Fortsetzen" if job_status == "paused" else "Analysiere Partei",
+                           id={"type": "analyze-btn", "index": party},
+                           color="primary", size="sm"),
+                dbc.Button("Pausieren", id={"type": "pause-btn", "index": party},
+                           color="secondary", size="sm", outline=True,
+                           disabled=job_status not in ("queued", "running")),
+                dbc.Button("Abbrechen", id={"type": "cancel-btn", "index": party},
+                           color="danger", size="sm", outline=True, disabled=not offen),
+                dbc.Select(id={"type": "prio-select", "index": party}, options=PRIORITIES,
+                           value=SCHEDULER.priority(party), size="sm", style={"width": "180px"}),
+            ], className="d-flex gap-2 mb-2"),
 
             html.Div(id={"type": "progress-box", "index": party}, children=[
                 dbc.Progress(id={"type": "progress-bar", "index": party},
@@ -192,22 +343,49 @@ def party_card(party):
     ], className="mb-3")
 
 
-def render_analysis_tab():
-    cards = []
-    data_dir = os.path.join("data")
-    for party in sorted(os.listdir(data_dir)):
-        party_dir = os.path.join(data_dir, party)
-        if not os.path.isdir(party_dir): continue
-        if party in ("analysis", ".status"): continue
-        cards.append(party_card(party))
+def _dauer(secs):
+    secs = int(secs or 0)
+    return f"{secs // 60}m {secs % 60}s"
+
+
+def render_job_list():
+    """warteschlange: wartende/laufende aufträge und die letzten fertigen"""
+    offen, fertig = SCHEDULER.jobs()
+    jetzt = time.time()
+    zeilen = []
+    for j in offen + fertig:
+        laufzeit = j["run_secs"] + (jetzt - j["started_at"] if j["status"] == "running" and j["started_at"] else 0)
+        ende = time.strftime("%d.%m. %H:%M", time.localtime(j["finished_at"])) if j["finished_at"] else ""
+        zeilen.append({"Partei": j["party"], "Status": j["status"], "Priorität": j["priority"],
+                       "Angefordert": time.strftime("%d.%m. %H:%M", time.localtime(j["requested_at"])),
+                       "Fertig": ende, "Dauer": _dauer(laufzeit), "Meldung": j["message"] or ""})
+    if not zeilen:
+        return html.Small("Keine Aufträge.", className="text-muted")
+    return dash_table.DataTable(
+        data=zeilen, columns=[{"name": c, "id": c} for c in zeilen[0]],
+        style_table={"overflowX": "auto"}, style_cell={"fontSize": "0.85rem", "padding": "4px"},
+        style_data_conditional=[
+            {"if": {"filter_query": '{Status} = "running"'}, "fontWeight": "bold"},
+            {"if": {"filter_query": '{Status} = "error"'}, "color": "crimson"},
+        ])
+
+
+def render_party_cards():
+    jobs = SCHEDULER.latest_jobs()
+    return [party_card(party, jobs) for party in get_catalog().parties()]
 
+
+def render_analysis_tab():
     return html.Div([
         html.H4("Analyse starten"),
         dbc.Button("Alle Parteien analysieren",
                    id="start-analysis-btn", color="success", className="mb-3"),
+        html.H5("Warteschlange"),
+        html.Div(render_job_list(), id="job-list", className="mb-3"),
         html.Hr(),
-        dcc.Interval(id="progress-poller", interval=1500, n_intervals=0),
-        html.Div(cards, id="analysis-status")
+        dcc.Interval(id="progress-poller", interval=ACTIVE_POLL_MS, n_intervals=0),
+        dcc.Store(id="progress-version"),
+        html.Div(render_party_cards(), id="analysis-status")
     ])
 
 
@@ -226,54 +404,42 @@ def render_settings_tab():
     ])
 
 
-# --- Tab insights
-def render_insights_tab(ref_values):
-    df, races_long = load_party_summaries()
-    if df.empty:
-        return html.Div([html.P("Keine Analysen gefunden. Bitte zuerst im Tab 'Analyse' ausführen.")])
+def with_ref_line(fig, y, text):
+    """
+    referenzlinie auf eine gecachte figur (dict) legen, gleiche form wie
+    add_hline(..., line_dash="dash", annotation_position="top left"), nur ohne
+    die figur neu zu bauen
+    """
+    layout = dict(fig.get("layout", {}))
+    layout["shapes"] = list(layout.get("shapes", ())) + [
+        {"type": "line", "xref": "x domain", "x0": 0, "x1": 1, "yref": "y", "y0": y, "y1": y,
+         "line": {"dash": "dash"}}]
+    layout["annotations"] = list(layout.get("annotations", ())) + [
+        {"text": text, "showarrow": False, "xref": "x domain", "x": 0, "xanchor": "left",
+         "yref": "y", "y": y, "yanchor": "bottom"}]
+    return {"data": fig["data"], "layout": layout}
 
-    # Kennzahlen
-    columns = [
-        {"name": "Partei", "id": "party"},
-        {"name": "Bilder gesamt", "id": "total_images", "type": "numeric"},
-        {"name": "Bilder verarbeitet", "id": "images_processed", "type": "numeric"},
-        {"name": "Gesichter", "id": "faces_total", "type": "numeric"},
-        {"name": "Frauen %", "id": "female_pct", "type": "numeric"},
-        {"name": "PoC %", "id": "poc_pct", "type": "numeric"},
-        {"name": "Ø Alter", "id": "average_age", "type": "numeric"},
-    ]
-    table = dash_table.DataTable(
-        id="summary-table",
-        columns=columns,
-        data=df.to_dict("records"),
-        sort_action="native",
-        style_table={"overflowX": "auto"},
-        style_cell={"padding": "6px", "fontSize": 14},
-        style_header={"fontWeight": "bold"}
-    )
 
-    # referenzwerte badges
-    ref_gender = (ref_values or {}).get("gender_f", 54)
-    ref_poc = (ref_values or {}).get("skin_poc", 29)
-    ref_badges = dbc.Badge(f"Referenz Frauen: {ref_gender}%", color="primary", className="me-2")
-    ref_badges2 = dbc.Badge(f"Referenz PoC: {ref_poc}%", color="info")
+def insights_figures():
+    """tabelle + diagramme ohne referenzlinien, nur neu wenn sich die daten ändern"""
+    return cached("insights", results_db.data_version(), _build_insights_figures)
+
+
+def _build_insights_figures():
+    df, races_long = load_party_summaries()
+    if df.empty:
+        return None
 
     # Diagramme
     fig_gender = px.bar(df, x="party", y="female_pct", text="female_pct",
                         labels={"party": "Partei", "female_pct": "Frauen in %"},
                         title="Frauenanteil pro Partei")
     fig_gender.update_traces(texttemplate="%{text:.1f}%", textposition="outside", cliponaxis=False)
-    fig_gender.add_hline(y=ref_gender, line_dash="dash",
-                         annotation_text=f"Referenz {ref_gender}%",
-                         annotation_position="top left")
 
     fig_poc = px.bar(df, x="party", y="poc_pct", text="poc_pct",
                      labels={"party": "Partei", "poc_pct": "PoC in %"},
                      title="Anteil People of Color pro Partei")
     fig_poc.update_traces(texttemplate="%{text:.1f}%", textposition="outside", cliponaxis=False)
-    fig_poc.add_hline(y=ref_poc, line_dash="dash",
-                      annotation_text=f"Referenz {ref_poc}%",
-                      annotation_position="top left")
 
     fig_age = px.bar(df, x="party", y="average_age",
                      labels={"party": "Partei", "average_age": "Ø Alter"},
@@ -288,10 +454,56 @@ def render_insights_tab(ref_values):
     if not races_long.empty:
         fig_races = px.bar(races_long, x="party", y="pct", color="race", barmode="stack",
                            labels={"party": "Partei", "pct": "%", "race": "Hauttyp"},
-                           title="Hauttypen-Verteilung pro Partei")
+                           title="Hauttypen-Verteilung pro Partei").to_plotly_json()
     else:
         fig_races = None
 
+    return {
+        "rows": df.to_dict("records"),
+        "gender": fig_gender.to_plotly_json(),
+        "poc": fig_poc.to_plotly_json(),
+        "age": fig_age.to_plotly_json(),
+        "corr": fig_corr.to_plotly_json(),
+        "races": fig_races,
+    }
+
+
+# --- Tab insights
+def render_insights_tab(ref_values):
+    figs = insights_figures()
+    if figs is None:
+        return html.Div([html.P("Keine Analysen gefunden. Bitte zuerst im Tab 'Analyse' ausführen.")])
+
+    # Kennzahlen
+    columns = [
+        {"name": "Partei", "id": "party"},
+        {"name": "Bilder gesamt", "id": "total_images", "type": "numeric"},
+        {"name": "Bilder verarbeitet", "id": "images_processed", "type": "numeric"},
+        {"name": "Gesichter", "id": "faces_total", "type": "numeric"},
+        {"name": "Frauen %", "id": "female_pct", "type": "numeric"},
+        {"name": "PoC %", "id": "poc_pct", "type": "numeric"},
+        {"name": "Ø Alter", "id": "average_age", "type": "numeric"},
+    ]
+    table = dash_table.DataTable(
+        id="summary-table",
+        columns=columns,
+        data=figs["rows"],
+        sort_action="native",
+        style_table={"overflowX": "auto"},
+        style_cell={"padding": "6px", "fontSize": 14},
+        style_header={"fontWeight": "bold"}
+    )
+
+    # referenzwerte badges
+    ref_gender = (ref_values or {}).get("gender_f", 54)
+    ref_poc = (ref_values or {}).get("skin_poc", 29)
+    ref_badges = dbc.Badge(f"Referenz Frauen: {ref_gender}%", color="primary", className="me-2")
+    ref_badges2 = dbc.Badge(f"Referenz PoC: {ref_poc}%", color="info")
+
+    # referenzlinien nur drüberlegen, die figuren kommen aus dem cache
+    fig_gender = with_ref_line(figs["gender"], ref_gender, f"Referenz {ref_gender}%")
+    fig_poc = with_ref_line(figs["poc"], ref_poc, f"Referenz {ref_poc}%")
+
     return html.Div([
         html.H4("Datenauswertung"),
         html.Div([ref_badges, ref_badges2], className="mb-3"),
@@ -302,10 +514,20 @@ def render_insights_tab(ref_values):
             dbc.Col(dcc.Graph(figure=fig_poc), md=6)
         ]),
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=fig_age), md=6),
-            dbc.Col(dcc.Graph(figure=fig_corr), md=6)
+            dbc.Col(dcc.Graph(figure=figs["age"]), md=6),
+            dbc.Col(dcc.Graph(figure=figs["corr"]), md=6)
         ]),
-        dcc.Graph(figure=fig_races) if fig_races else html.Div()
+        dcc.Graph(figure=figs["races"]) if figs["races"] else html.Div(),
+        html.Hr(),
+        html.H5("Zeitverlauf"),
+        dbc.Row([
+            dbc.Col(dcc.RadioItems(id="trend-grain", value="month", inline=True,
+                                   options=[{"label": v, "value": k} for k, v in TREND_GRAINS.items()],
+                                   inputStyle={"marginRight": "4px", "marginLeft": "12px"}), md=6),
+            dbc.Col(dcc.Dropdown(id="trend-metric", value="female_pct", clearable=False,
+                                 options=[{"label": v, "value": k} for k, v in TREND_METRICS.items()]), md=6),
+        ], className="mb-2"),
+        dcc.Graph(id="trend-graph")
     ], id="insights-content")
 
 
@@ -316,6 +538,9 @@ def render_insights_tab(ref_values):
     Input("ref-values", "data"),
 )
 def render_tab_content(active_tab, ref_values):
+    # referenzwerte ändern sich beim schieben der slider, betrifft nur die auswertung
+    if ctx.triggered_id == "ref-values" and active_tab != "insights":
+        return dash.no_update
     if active_tab == "import":
         return render_import_tab()
     elif active_tab == "overview":
@@ -329,6 +554,36 @@ def render_tab_content(active_tab, ref_values):
     return html.P("Fehler: Unbekannter Tab")
 
 
+# ---------- Callback: Zeitverlauf ---------- #
+@app.callback(
+    Output("trend-graph", "figure"),
+    Input("trend-grain", "value"),
+    Input("trend-metric", "value"),
+    State("ref-values", "data"),
+)
+def update_trends(grain, metric, ref_values):
+    grain = grain or "month"
+    fig = cached(f"trend-fig-{grain}-{metric}", results_db.data_version(),
+                 lambda: _build_trend_figure(grain, metric))
+    ref = {"female_pct": (ref_values or {}).get("gender_f", 54),
+           "poc_pct": (ref_values or {}).get("skin_poc", 29)}.get(metric)
+    if ref is not None and fig["data"]:
+        fig = with_ref_line(fig, ref, f"Referenz {ref}%")
+    return fig
+
+
+def _build_trend_figure(grain, metric):
+    df = load_trends(grain)
+    label = TREND_METRICS.get(metric, metric)
+    if df.empty:
+        return px.line(title="Keine Zeitstempel in den analysierten Bildern").to_plotly_json()
+
+    fig = px.line(df, x="bucket", y=metric, color="party", markers=True,
+                  labels={"bucket": TREND_GRAINS.get(grain, grain), metric: label, "party": "Partei"},
+                  title=f"{label} pro {TREND_GRAINS.get(grain, grain)}")
+    return fig.to_plotly_json()
+
+
 # ---------- Callback zum Upload von Bildern ---------- #
 @app.callback(
     Output("upload-status", "children"),
@@ -344,21 +599,34 @@ def handle_folder_upload(contents, filenames, party):
     try:
         saved = 0
         skipped = 0
+        archive = []
         for content, filename in zip(contents, filenames):
+            if archive_ext(filename):
+                # archiv: einträge direkt in den blob-store, kein auspacken
+                res = import_archive(party, io.BytesIO(decode_upload(content)), filename)
+                saved += res["stored"] + res["renamed"]
+                skipped += res["duplicate"] + res["skipped"] + res["errors"]
+                archive.append(html.Div(import_message(filename, res)))
+                continue
             result = save_uploaded_image(party, content, filename)
-            if result.startswith("✅"):
+            if result.endswith("gespeichert") or " gespeichert als " in result:
                 saved += 1
             else:
                 skipped += 1
         return "", html.Div([
             html.Span("✅ Upload abgeschlossen: "),
-            html.Span(f"{saved} Bilder gespeichert, {skipped} Dateien übersprungen.", style={"color": "green"})
+            html.Span(f"{saved} Bilder gespeichert, {skipped} Dateien übersprungen.", style={"color": "green"}),
+            *archive
         ])
     except Exception as e:
         return "", f"❌ Fehler bei Verarbeitung: {str(e)}"
 
 
 # ---------- Callback zum Löschen von Datensätzen ---------- #
+# so lange wartet das löschen höchstens auf das anhalten einer laufenden analyse
+DELETE_WAIT_SECS = 60
+
+
 @app.callback(
     Output("tab-content", "children", allow_duplicate=True),
     Input({"type": "delete-btn", "index": dash.ALL}, "n_clicks"),
@@ -369,7 +637,10 @@ def delete_dataset(n_clicks_list, active_tab):
     if not any(n_clicks_list):
         return dash.no_update
     triggered = ctx.triggered_id
-    if triggered and "index" in triggered:
+    # erst löschen, wenn ein laufender auftrag wirklich steht, sonst schreibt
+    # er checkpoint, progress.json und index-zeilen in die gelöschte partei zurück
+    if triggered and "index" in triggered and SCHEDULER.cancel(triggered["index"], wait=True,
+                                                                timeout=DELETE_WAIT_SECS):
         dir_to_remove = os.path.join(DATA_DIR, triggered["index"])
         if os.path.isdir(dir_to_remove):
             shutil.rmtree(dir_to_remove)
@@ -377,6 +648,13 @@ def delete_dataset(n_clicks_list, active_tab):
         ana_dir = os.path.join(DATA_DIR, "analysis", triggered["index"])
         if os.path.isdir(ana_dir):
             shutil.rmtree(ana_dir)
+        results_db.delete_party(triggered["index"])
+        forget_progress(triggered["index"])
+        get_phash_index().forget_party(triggered["index"])
+        get_catalog().remove_party(triggered["index"])
+        # manifest weg, blobs ohne link/manifest gleich mit
+        get_store().forget_party(triggered["index"])
+        get_store().gc()
     # Nach dem Löschen ggf. Inhalt des aktuellen Tabs neu zeichnen
     if active_tab == "insights":
         return render_insights_tab(dash.get_app().layout.children[1].data)
@@ -390,13 +668,10 @@ def delete_dataset(n_clicks_list, active_tab):
     prevent_initial_call=True
 )
 def start_all_analyses(n):
-    data_dir = os.path.join("data")
-    for party in os.listdir(data_dir):
-        party_dir = os.path.join(data_dir, party)
-        if os.path.isdir(party_dir) and party not in ("analysis", ".status"):
-            start_background_analysis(party)
+    for party in get_catalog().parties():
+        start_background_analysis(party)
     # re-render, damit Cards da sind
-    return render_analysis_tab().children
+    return render_party_cards()
 
 
 # ---------- Callback: Einzelne Analyse-Buttons ---------- #
@@ -407,31 +682,55 @@ def start_all_analyses(n):
 )
 def analyze_single_party(n_clicks_list):
     triggered = ctx.triggered_id
-    if triggered and "index" in triggered:
+    if triggered and "index" in triggered and ctx.triggered[0]["value"]:
         party = triggered["index"]
         start_background_analysis(party)
-    return render_analysis_tab().children
+    return render_party_cards()
 
 
-# ---------- Progress-Updates inklus Vorschau ---------- #
+# ---------- Callback: Pausieren / Abbrechen ---------- #
 @app.callback(
-    Output({"type": "progress-bar", "index": MATCH}, "value"),
-    Output({"type": "progress-bar", "index": MATCH}, "label"),
-    Output({"type": "progress-text", "index": MATCH}, "children"),
-    Output({"type": "progress-preview", "index": MATCH}, "children"),
-    Input("progress-poller", "n_intervals"),
-    State({"type": "progress-bar", "index": MATCH}, "id")
+    Output("analysis-status", "children", allow_duplicate=True),
+    Input({"type": "pause-btn", "index": ALL}, "n_clicks"),
+    Input({"type": "cancel-btn", "index": ALL}, "n_clicks"),
+    prevent_initial_call=True
 )
-def update_progress(_n, comp_id):
-    party = comp_id["index"]
-    progress_path = os.path.join("data", "analysis", party, "progress.json")
-    if not os.path.exists(progress_path):
-        return 0, "", "", ""
-    try:
-        p = json.load(open(progress_path, encoding="utf-8"))
-    except Exception:
-        return 0, "", "", ""
+def halt_party(_pause, _cancel):
+    triggered = ctx.triggered_id
+    if not triggered or not ctx.triggered[0]["value"]:
+        return dash.no_update
+    if triggered["type"] == "pause-btn":
+        SCHEDULER.pause(triggered["index"])
+    else:
+        SCHEDULER.cancel(triggered["index"])
+    return render_party_cards()
+
+
+# ---------- Callback: Priorität je Partei ---------- #
+@app.callback(
+    Output({"type": "prio-select", "index": MATCH}, "valid"),
+    Input({"type": "prio-select", "index": MATCH}, "value"),
+    State({"type": "prio-select", "index": MATCH}, "id"),
+    prevent_initial_call=True
+)
+def save_priority(value, comp_id):
+    if value is None:
+        return dash.no_update
+    SCHEDULER.set_priority(comp_id["index"], int(value))
+    return True
+
+
+# ---------- Fortschritt aller Karten + Warteschlange (ein request) ---------- #
+# solange nichts läuft, fragt der poller nur alle IDLE_POLL_MS nach (läufe aus
+# anderen prozessen, z.b. run_batch, tauchen über jobs/job_queue auf).
+# start/pausieren/abbrechen zeichnen die karten (analysis-status) neu, das
+# stellt ihn über update_all_progress sofort wieder schnell.
+ACTIVE_POLL_MS = 1500
+IDLE_POLL_MS = 12000
 
+
+def progress_view(p):
+    """stand eines laufs -> (prozent, label, text, vorschau) für die karte"""
     total = max(1, int(p.get("total", 1)))
     done = int(p.get("done", 0))
     percent = min(100, round(100 * done / total))
@@ -441,6 +740,9 @@ def update_progress(_n, comp_id):
     now = int(time.time())
     started = int(p.get("started_at", now))
     elapsed = now - started
+    if status != "running" and p.get("elapsed_secs") is not None:
+        # fertige läufe: laufzeit bleibt stehen
+        elapsed = int(p["elapsed_secs"])
     eta_secs = p.get("eta_secs")
     eta_str = f" | ETA: {eta_secs//60}m {eta_secs%60}s" if isinstance(eta_secs, int) else ""
 
@@ -449,8 +751,13 @@ def update_progress(_n, comp_id):
         percent = 100
 
     text = f"{done}/{total} Bilder • {status.upper()}: {msg} | Laufzeit: {elapsed//60}m {elapsed%60}s{eta_str}"
+    vf = p.get("prefilter")
+    if vf:
+        text += f" | Vorfilter: {vf['skipped']}/{vf['checked']} ohne Gesicht"
     if status == "error":
         text = f"❌ Fehler: {msg}"
+    elif status in ("paused", "cancelled"):
+        text = f"⏸ {msg}" if status == "paused" else f"⏹ Abgebrochen: {msg}"
 
     # Vorschau 
     prev_children = ""
@@ -467,6 +774,52 @@ def update_progress(_n, comp_id):
     return percent, label, text, prev_children
 
 
+@app.callback(
+    Output({"type": "progress-bar", "index": ALL}, "value"),
+    Output({"type": "progress-bar", "index": ALL}, "label"),
+    Output({"type": "progress-text", "index": ALL}, "children"),
+    Output({"type": "progress-preview", "index": ALL}, "children"),
+    Output("job-list", "children"),
+    Output("progress-version", "data"),
+    Output("progress-poller", "interval"),
+    Input("progress-poller", "n_intervals"),
+    Input("analysis-status", "children"),
+    State({"type": "progress-bar", "index": ALL}, "id"),
+    State("progress-version", "data"),
+)
+def update_all_progress(_n, _cards, ids, client_version):
+    # ein stand für alle karten: speicher dieses prozesses + eine abfrage im index
+    # (läufe aus anderen prozessen, z.b. run_batch)
+    mem_version, laeufe = progress_snapshot()
+    version = [mem_version, SCHEDULER.version, results_db.jobs_version()]
+    # karten wurden neu gezeichnet -> immer alles schicken
+    if ctx.triggered_id == "progress-poller" and version == client_version:
+        if not SCHEDULER.count("running"):
+            raise PreventUpdate
+        # nichts neues, aber die dauer laufender aufträge zählt weiter
+        return (*[dash.no_update] * 4, render_job_list(), dash.no_update, ACTIVE_POLL_MS)
+
+    jobs = results_db.job_statuses()
+    werte = [[], [], [], []]
+    for comp_id in ids:
+        party = comp_id["index"]
+        p = laeufe.get(party)
+        if not p:
+            job = jobs.get(party)
+            p = job and {"status": job["status"], "message": job["message"] or "",
+                         "done": job["done"], "total": job["total"],
+                         "started_at": int(job["started_at"] or time.time()),
+                         "elapsed_secs": (job["finished_at"] - job["started_at"]
+                                          if job["finished_at"] and job["started_at"] else None)}
+        for liste, wert in zip(werte, progress_view(p) if p else (0, "", "", "")):
+            liste.append(wert)
+
+    aktiv = (any(p.get("status") == "running" for p in laeufe.values())
+             or any(j["status"] == "running" for j in jobs.values())
+             or SCHEDULER.count("queued") > 0)
+    return (*werte, render_job_list(), version, ACTIVE_POLL_MS if aktiv else IDLE_POLL_MS)
+
+
 # ---------- Einstellungen speichern ---------- #
 @app.callback(
     Output("settings-status", "children"),
@@ -484,18 +837,51 @@ def save_settings(gender_f, skin_poc):
     return status, data
 
 
-# --- Hintergrundjobs
-ACTIVE_JOBS = {}
-
-def start_background_analysis(party):
-    if party in ACTIVE_JOBS and ACTIVE_JOBS[party].is_alive():
-        return
-    party_dir = os.path.join(DATA_DIR, party)
-    if not os.path.isdir(party_dir): return
+# --- Hintergrundjobs (warteschlange, siehe face_analysis/scheduler.py)
+def run_analysis(party, should_stop=None):
     from face_analysis.analyze_images import analyze_party_images
-    t = threading.Thread(target=analyze_party_images, args=(party_dir,), daemon=True)
-    t.start()
-    ACTIVE_JOBS[party] = t
+    party_dir = os.path.join(DATA_DIR, party)
+    if not os.path.isdir(party_dir):
+        raise FileNotFoundError(f"Ordner fehlt: {party_dir}")
+    try:
+        ergebnis = analyze_party_images(party_dir,
+                                        prefilter_mode=os.environ.get("FACE_PREFILTER", "off"),
+                                        dedup=os.environ.get("FACE_DEDUP", "off"),
+                                        should_stop=should_stop)
+    except Exception as e:
+        # sonst bleibt der job für immer auf "running"
+        mark_error(party, str(e))
+        results_db.set_job_status(party, "error", str(e))
+        get_catalog().set_analysis(party, checkpoint=checkpoint_count(party))
+        raise
+    if ergebnis is None:
+        # angehalten, checkpoint bleibt
+        get_catalog().set_analysis(party, checkpoint=checkpoint_count(party))
+    else:
+        get_catalog().set_analysis(party, analyzed=True, checkpoint=0)
+    return ergebnis
+
+
+SCHEDULER = Scheduler(run_analysis)
+metrics.register_gauge("analysis_jobs_queued", "Analysen in der Warteschlange",
+                       lambda: SCHEDULER.count("queued"))
+metrics.register_gauge("analysis_jobs_running", "Analysen, die gerade laufen",
+                       lambda: SCHEDULER.count("running"))
+
+
+@app.server.before_request
+def _start_background():
+    # erst mit dem ersten request, sonst arbeitet beim debug-reloader auch der
+    # überwachungs-prozess die schlange ab
+    get_catalog().start(results_db.analyzed_parties)
+    SCHEDULER.start()
+
+
+def start_background_analysis(party, priority=None):
+    if not os.path.isdir(os.path.join(DATA_DIR, party)): return
+    # alter stand (fertig, abgebrochen, fehler) gehört nicht zum neuen lauf
+    forget_progress(party, keep_running=True)
+    SCHEDULER.enqueue(party, priority)
 
 
 if __name__ == "__main__":
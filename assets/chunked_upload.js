@@ -0,0 +1,181 @@
+// assets/chunked_upload.js
+//
+// upload großer mengen in stücken (gegenstück: utils/chunked_upload.py).
+// dash lädt alles aus assets/ automatisch. der knopf #chunked-pick öffnet
+// eine dateiauswahl, die partei kommt aus #party-name. mehrere dateien laufen
+// parallel, pro datei gehen die stücke der reihe nach raus. archive (.zip,
+// .tar.gz) liest der server nach dem letzten stück direkt in die partei ein. bricht etwas ab,
+// fragt der nächste versuch den stand beim server ab und macht dort weiter.
+
+(function () {
+    var CHUNK = 4 * 1024 * 1024;   // bytes pro stück
+    var PARALLEL = 3;              // dateien gleichzeitig
+    var RETRIES = 5;
+    var PREFIX = 64 * 1024;        // so viele bytes vom anfang gehen in die upload-id
+
+    function zeile(box, name) {
+        var div = document.createElement("div");
+        div.innerHTML = '<code></code> <progress max="100" value="0" style="width:160px"></progress> <span></span>';
+        div.querySelector("code").textContent = name;
+        box.appendChild(div);
+        return {
+            set: function (pct, text) {
+                div.querySelector("progress").value = pct;
+                div.querySelector("span").textContent = text;
+            }
+        };
+    }
+
+    function warte(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function json(resp) {
+        var data = {};
+        try { data = await resp.json(); } catch (e) { /* leer */ }
+        if (!resp.ok && resp.status !== 409) {
+            var err = new Error(data.error || ("HTTP " + resp.status));
+            err.fatal = resp.status !== 503 && resp.status < 500;
+            throw err;
+        }
+        data.status = resp.status;
+        return data;
+    }
+
+    // fnv-1a (32 bit) über den dateianfang, gleich gerechnet in utils/chunked_upload.py
+    // (prefix_hash). unterscheidet gleichnamige dateien gleicher größe
+    async function anfang(file) {
+        var bytes = new Uint8Array(await file.slice(0, PREFIX).arrayBuffer());
+        var h = 0x811c9dc5;
+        for (var i = 0; i < bytes.length; i++) {
+            h = Math.imul(h ^ bytes[i], 0x01000193);
+        }
+        return ("0000000" + (h >>> 0).toString(16)).slice(-8);
+    }
+
+    async function ladeDatei(party, file, anzeige) {
+        var init = await json(await fetch("/upload/init", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({party: party, filename: file.name, size: file.size,
+                                  last_modified: file.lastModified, prefix: await anfang(file)})
+        }));
+        var id = init.upload_id;
+        var offset = init.offset;
+        var fehler = 0;
+        while (offset < file.size) {
+            anzeige.set(Math.floor(100 * offset / file.size), Math.round(offset / 1048576) + " / " + Math.round(file.size / 1048576) + " MB");
+            try {
+                var stueck = file.slice(offset, Math.min(offset + CHUNK, file.size));
+                var r = await json(await fetch("/upload/" + id + "?offset=" + offset, {method: "PUT", body: stueck}));
+                if (r.status === 409) {
+                    // server hat einen anderen stand (z.b. nach abbruch)
+                    offset = r.offset;
+                    continue;
+                }
+                offset = r.offset;
+                fehler = 0;
+                if (r.done) {
+                    return r.message;
+                }
+            } catch (e) {
+                if (e.fatal || ++fehler > RETRIES) {
+                    throw e;
+                }
+                await warte(500 * Math.pow(2, fehler));
+                try {
+                    var st = await json(await fetch("/upload/" + id));
+                    offset = st.offset;
+                } catch (e2) {
+                    // stand nicht abfragbar (netz weg): nächster versuch, solange RETRIES reichen
+                    if (e2.fatal) {
+                        throw e2;
+                    }
+                }
+            }
+        }
+        return await fertig(id, anzeige);
+    }
+
+    // alle bytes sind beim server: warten, bis er "done" meldet (archive werden
+    // im hintergrund eingelesen), erst dann gilt die datei als gespeichert
+    async function fertig(id, anzeige) {
+        var fehler = 0;
+        while (true) {
+            try {
+                var st = await json(await fetch("/upload/" + id));
+                fehler = 0;
+                if (st.done) {
+                    return st.message;
+                }
+                if (!st.importing) {
+                    throw Object.assign(new Error("Upload nicht abgeschlossen"), {fatal: true});
+                }
+                anzeige.set(100, st.message || "wird eingelesen ...");
+            } catch (e) {
+                if (e.fatal || ++fehler > RETRIES) {
+                    throw e;
+                }
+            }
+            await warte(1000);
+        }
+    }
+
+    async function ladeAlle(files) {
+        var partyFeld = document.getElementById("party-name");
+        var box = document.getElementById("chunked-progress");
+        var party = partyFeld ? partyFeld.value.trim() : "";
+        if (!box) {
+            return;
+        }
+        if (!party) {
+            box.textContent = "❌ Bitte zuerst einen Parteinamen eingeben.";
+            return;
+        }
+        box.innerHTML = "";
+        var offen = Array.prototype.slice.call(files);
+        var ok = 0, fehler = 0;
+
+        async function worker() {
+            while (offen.length) {
+                var file = offen.shift();
+                var anzeige = zeile(box, file.name);
+                try {
+                    var meldung = await ladeDatei(party, file, anzeige);
+                    anzeige.set(100, "✅ " + meldung);
+                    ok++;
+                } catch (e) {
+                    anzeige.set(0, "❌ " + e.message);
+                    fehler++;
+                }
+            }
+        }
+
+        var worker_liste = [];
+        for (var i = 0; i < Math.min(PARALLEL, offen.length); i++) {
+            worker_liste.push(worker());
+        }
+        await Promise.all(worker_liste);
+        var summe = document.createElement("div");
+        summe.className = "mt-2";
+        summe.textContent = "Fertig: " + ok + " Dateien übertragen, " + fehler + " Fehler.";
+        box.appendChild(summe);
+    }
+
+    // der knopf wird von dash gerendert, also über das dokument abfangen
+    document.addEventListener("click", function (ev) {
+        if (!ev.target.closest || !ev.target.closest("#chunked-pick")) {
+            return;
+        }
+        var input = document.createElement("input");
+        input.type = "file";
+        input.multiple = true;
+        input.accept = ".jpg,.jpeg,.png,.zip,.tar.gz,.tgz";
+        input.addEventListener("change", function () {
+            if (input.files.length) {
+                ladeAlle(input.files);
+            }
+        });
+        input.click();
+    });
+})();
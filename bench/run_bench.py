@@ -0,0 +1,298 @@
+# bench/run_bench.py
+#
+# benchmark der pipeline ohne echtes FairFace: baut einen arbeitsordner mit
+# synthetischen partei-ordnern und bench/fake_predict.py als predict.py und
+# misst darin die szenarien. jedes szenario läuft in einem eigenen prozess,
+# damit peak-RSS und I/O sauber getrennt sind. ergebnis als json.
+#
+#   python -m bench.run_bench --parties 3 --images 200 --latency 0.02
+#   python -m bench.run_bench --compare bench/results/alt.json
+#
+# szenarien:
+#   analyze_cold      alle parteien analysieren, leerer cache
+#   analyze_warm      nochmal, alles aus dem ergebnis-cache
+#   party_summaries   load_party_summaries() (app.py) wiederholt
+#   account_overview  get_account_overview() wiederholt (alter weg, zum vergleich)
+#   catalog_overview  was die oberfläche seit dem katalog liest: ein kompletter
+#                     scan (scan_ms), dann overview() + info() je partei wiederholt
+
+import os, sys, json, time, shutil, random, resource, argparse, platform, subprocess, tempfile
+from collections import defaultdict
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_PREDICT = os.path.join(REPO, "bench", "fake_predict.py")
+RESULTS_DIR = os.path.join(REPO, "bench", "results")
+SCENARIOS = ("analyze_cold", "analyze_warm", "party_summaries", "account_overview", "catalog_overview")
+
+
+# ---------------- arbeitsordner ---------------- #
+
+def make_dataset(workdir, parties, images, size=(1080, 1080), seed=42):
+    """synthetische bilder: data/BENCH<n>/<i>_<ts>_jpg.jpg, deterministisch"""
+    from PIL import Image, ImageDraw
+
+    rnd = random.Random(seed)
+    for p in range(parties):
+        party_dir = os.path.join(workdir, "data", f"BENCH{p}")
+        os.makedirs(party_dir, exist_ok=True)
+        for i in range(images):
+            img = Image.new("RGB", size, tuple(rnd.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(img)
+            for _ in range(12):
+                x0, x1 = sorted(rnd.randrange(size[0]) for _ in range(2))
+                y0, y1 = sorted(rnd.randrange(size[1]) for _ in range(2))
+                draw.rectangle([x0, y0, x1, y1], fill=tuple(rnd.randrange(256) for _ in range(3)))
+            ts = 1_500_000_000 + rnd.randrange(200_000_000)
+            img.save(os.path.join(party_dir, f"{p}{i:06d}_{ts}_jpg.jpg"), quality=85)
+
+
+def make_workdir(workdir, args):
+    fairface_dir = os.path.join(workdir, "face_analysis", "model", "FairFace")
+    os.makedirs(fairface_dir, exist_ok=True)
+    shutil.copy(FAKE_PREDICT, os.path.join(fairface_dir, "predict.py"))
+    make_dataset(workdir, args.parties, args.images, (args.size, args.size), args.seed)
+
+
+# ---------------- messen ---------------- #
+
+def proc_io():
+    """/proc/self/io (nur linux), sonst leer"""
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except OSError:
+        return {}
+
+
+class StageTimer:
+    """kumulierte zeit + aufrufe je funktion (über alle threads summiert)"""
+
+    def __init__(self):
+        self.secs = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, owner, name, label=None):
+        fn = getattr(owner, name)
+        label = label or name
+
+        def wrapper(*a, **kw):
+            t = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                self.secs[label] += time.perf_counter() - t
+                self.calls[label] += 1
+        setattr(owner, name, wrapper)
+
+    def as_dict(self):
+        return {k: {"secs": round(self.secs[k], 4), "calls": self.calls[k]} for k in sorted(self.secs)}
+
+
+def _analyze(args, stages):
+    from face_analysis import analyze_images, outputs, result_cache, results_db
+
+    # die einzelnen stufen der pipeline
+    stages.wrap(analyze_images, "list_images_ordner", "list_images")
+    stages.wrap(analyze_images, "normalized_path", "normalize")
+    stages.wrap(analyze_images, "fairface_batch", "fairface")
+    stages.wrap(analyze_images, "read_fairface_csv", "parse_csv")
+    stages.wrap(analyze_images, "zaehle_faces", "count")
+    stages.wrap(analyze_images, "crops_aus_cache", "cache_crops")
+    stages.wrap(analyze_images.Checkpoint, "append", "checkpoint_append")
+    stages.wrap(outputs.PartyOutputs, "add", "outputs_add")
+    stages.wrap(outputs.PartyOutputs, "close", "outputs_close")
+    stages.wrap(results_db.RunWriter, "flush", "index_flush")
+    stages.wrap(results_db.RunWriter, "commit", "index_commit")
+    stages.wrap(result_cache.ResultCache, "image_hash", "cache_hash")
+    stages.wrap(result_cache.ResultCache, "put", "cache_put")
+
+    parties = sorted(d for d in os.listdir("data") if d.startswith("BENCH"))
+    images = 0
+    for party in parties:
+        images += len(analyze_images.list_images_ordner(os.path.join("data", party)))
+        analyze_images.analyze_party_images(os.path.join("data", party),
+                                            use_worker=not args.no_worker,
+                                            batch_size=args.batch_size,
+                                            workers=args.workers)
+    analyze_images.get_pool().close()
+    return {"images": images, "parties": len(parties)}
+
+
+def _repeat(fn, n):
+    zeiten = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        zeiten.append(time.perf_counter() - t)
+    zeiten.sort()
+    return {"iterations": n,
+            "mean_ms": round(1000 * sum(zeiten) / n, 3),
+            "p50_ms": round(1000 * zeiten[n // 2], 3),
+            "max_ms": round(1000 * zeiten[-1], 3)}
+
+
+def _catalog(catalog, analyzed, n):
+    # ohne watcher/hintergrund-thread: nur der start-scan und die lesezugriffe
+    t = time.perf_counter()
+    catalog.reconcile(analyzed)
+    scan_ms = round(1000 * (time.perf_counter() - t), 3)
+
+    def lesen():
+        catalog.overview()
+        for party in catalog.parties():
+            catalog.info(party)
+
+    return {"scan_ms": scan_ms, **_repeat(lesen, n)}
+
+
+def run_scenario(name, args):
+    """läuft im kind-prozess, cwd = arbeitsordner"""
+    stages = StageTimer()
+    # imports (dash-app!) nicht mitmessen
+    if name == "party_summaries":
+        import app
+    elif name == "account_overview":
+        from utils.dataloader import get_account_overview
+    elif name == "catalog_overview":
+        from utils.dataset_catalog import DatasetCatalog
+        from face_analysis import results_db
+    io_start = proc_io()
+    t0 = time.perf_counter()
+
+    if name in ("analyze_cold", "analyze_warm"):
+        result = _analyze(args, stages)
+    elif name == "party_summaries":
+        result = _repeat(app.load_party_summaries, args.repeat)
+    elif name == "account_overview":
+        result = _repeat(get_account_overview, args.repeat)
+    elif name == "catalog_overview":
+        result = _catalog(DatasetCatalog(), results_db.analyzed_parties(), args.repeat)
+    else:
+        raise SystemExit(f"unbekanntes szenario: {name}")
+
+    wall = time.perf_counter() - t0
+    io_end = proc_io()
+    self_ru = resource.getrusage(resource.RUSAGE_SELF)
+    kids_ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    result.update({
+        "scenario": name,
+        "wall_secs": round(wall, 4),
+        # ru_maxrss ist auf linux in KiB
+        "peak_rss_mb": round(self_ru.ru_maxrss / 1024, 1),
+        "peak_rss_children_mb": round(kids_ru.ru_maxrss / 1024, 1),
+        "cpu_secs": round(self_ru.ru_utime + self_ru.ru_stime, 3),
+        "cpu_secs_children": round(kids_ru.ru_utime + kids_ru.ru_stime, 3),
+        "io": {k: io_end[k] - io_start.get(k, 0) for k in io_end},
+        "block_io_children": {"in": kids_ru.ru_inblock, "out": kids_ru.ru_oublock},
+    })
+    if "images" in result:
+        result["images_per_sec"] = round(result["images"] / wall, 2) if wall else None
+        result["stages"] = stages.as_dict()
+    return result
+
+
+# ---------------- steuerung ---------------- #
+
+def _child_env(args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO + os.pathsep + env.get("PYTHONPATH", "")
+    env["FAKE_STARTUP"] = str(args.startup)
+    env["FAKE_LATENCY"] = str(args.latency)
+    env["FAKE_FACES"] = str(args.faces)
+    if args.workers:
+        env["FAIRFACE_WORKERS"] = str(args.workers)
+    return env
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(alt, neu):
+    """images/sec bzw. mean_ms gegen einen älteren lauf"""
+    alt_by = {r["scenario"]: r for r in alt.get("results", [])}
+    for r in neu["results"]:
+        a = alt_by.get(r["scenario"])
+        if not a:
+            continue
+        for key, besser in (("images_per_sec", "höher"), ("mean_ms", "niedriger"), ("peak_rss_mb", "niedriger")):
+            if r.get(key) and a.get(key):
+                print(f"  {r['scenario']:<18} {key:<15} {a[key]:>10} -> {r[key]:>10}  "
+                      f"({r[key] / a[key]:.2f}x, {besser} ist besser)")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="benchmark der analyse-pipeline mit fake-FairFace")
+    ap.add_argument("--parties", type=int, default=2)
+    ap.add_argument("--images", type=int, default=100, help="bilder pro partei")
+    ap.add_argument("--size", type=int, default=1080, help="kantenlänge der testbilder")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency", type=float, default=0.05, help="fake-inferenz sekunden pro bild")
+    ap.add_argument("--startup", type=float, default=1.0, help="fake-modell-ladezeit sekunden")
+    ap.add_argument("--faces", type=int, default=3, help="max. gesichter pro bild")
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--no-worker", action="store_true", help="predict.py pro batch als subprocess")
+    ap.add_argument("--repeat", type=int, default=50, help="wiederholungen für die lese-szenarien")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--workdir", default=None, help="arbeitsordner (standard: temporär)")
+    ap.add_argument("--keep", action="store_true", help="arbeitsordner nicht löschen")
+    ap.add_argument("--out", default=None, help="json-ergebnis (standard: bench/results/<zeit>.json)")
+    ap.add_argument("--compare", default=None, help="älteres json zum vergleichen")
+    ap.add_argument("--_child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args._child:
+        print(json.dumps(run_scenario(args._child, args)))
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fairface-bench-")
+    t = time.perf_counter()
+    make_workdir(workdir, args)
+    print(f"arbeitsordner {workdir} ({args.parties}x{args.images} bilder, "
+          f"{time.perf_counter() - t:.1f}s)", file=sys.stderr)
+
+    results = []
+    try:
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            cmd = [sys.executable, "-m", "bench.run_bench", "--_child", name] + (argv or sys.argv[1:])
+            proc = subprocess.run(cmd, cwd=workdir, env=_child_env(args), capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                raise SystemExit(f"szenario {name} fehlgeschlagen")
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            extra = f", {r['images_per_sec']} bilder/s" if "images_per_sec" in r else f", {r['mean_ms']} ms"
+            print(f"{name}: {r['wall_secs']}s{extra}, peak {r['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("_child", "compare", "out")},
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(out)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
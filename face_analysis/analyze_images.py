@@ -1,11 +1,20 @@
 # face_analysis/analyze_images.py
 
-import os, sys, csv, json, time, subprocess, shutil, base64
-from collections import Counter
+import os, io, csv, json, time, shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import pandas as pd
 import re
 
+from face_analysis.fairface_worker import FairFaceError, get_pool, current_pool
+from face_analysis.result_cache import get_cache, model_version
+from face_analysis.progress import ProgressChannel, preview_url, PROGRESS
+from face_analysis import metrics
+from face_analysis.outputs import PartyOutputs
+from face_analysis import result_store, results_db, prefilter, phash_index
+from face_analysis.normalize import NORMALIZE_MAX_SIDE, normalized_path, prune_norm
+
 # gültige Bild-Endungen
 VALID_EXTS = (".jpg", ".jpeg", ".png")
 
@@ -13,6 +22,11 @@ VALID_EXTS = (".jpg", ".jpeg", ".png")
 _TS_UNDERSCORE = re.compile(r'_(\d{10,13})(?=_)')
 # fallback: irgendeine 10-13 stellige Zahl
 _TS_FALLBACK = re.compile(r'(?<!\d)(\d{10,13})(?!\d)')
+# crop-namen von predict.py: <bild>_face<n>.<ext>
+_CROP_NAME = re.compile(r'^(.*)_face\d+\.[^.]*$')
+
+# unterbrochene läufe machen hier weiter
+CHECKPOINT_NAME = "_checkpoint.jsonl"
 
 _MIN_TS = int(datetime(2005, 1, 1, tzinfo=timezone.utc).timestamp())
 _MAX_TS = int(datetime(2100, 1, 1, tzinfo=timezone.utc).timestamp())
@@ -37,20 +51,6 @@ def list_images_ordner(folder_path):
     return all_imgs
 
 
-def save_progress(pfad, **kw):
-    data = {"ts": int(time.time())}
-    if os.path.exists(pfad):
-        try:
-            with open(pfad, encoding="utf-8") as r:
-                data.update(json.load(r))
-        except Exception:
-            pass
-    data.update(kw)
-    os.makedirs(os.path.dirname(pfad), exist_ok=True)
-    with open(pfad, "w", encoding="utf-8") as fp:
-        json.dump(data, fp, indent=2, ensure_ascii=False)
-
-
 def read_fairface_csv(dateipfad):
     df = pd.read_csv(dateipfad)
 
@@ -110,51 +110,385 @@ def extract_ts_from_filename(fname):
     return None
 
 
-def bild_to_datauri(pfad):
-    try:
-        with open(pfad, "rb") as f:
-            content = f.read()
-        return "data:image/jpeg;base64," + base64.b64encode(content).decode("ascii")
-    except Exception:
-        return None
+def _laufende_analysen():
+    return [p for p in list(PROGRESS.values()) if p.get("status") == "running"]
+
+
+metrics.register_gauge("fairface_active_jobs", "Laufende Analysen",
+                       lambda: len(_laufende_analysen()))
+metrics.register_gauge("fairface_queue_depth", "Offene Bilder in laufenden Analysen",
+                       lambda: sum(max(0, int(p.get("total") or 0) - int(p.get("done") or 0))
+                                   for p in _laufende_analysen()))
+metrics.register_gauge("fairface_pool_busy_slots", "FairFace-Slots, die gerade rechnen",
+                       lambda: current_pool().busy() if current_pool() else 0)
+metrics.register_gauge("fairface_pool_size", "FairFace-Slots insgesamt",
+                       lambda: current_pool().size if current_pool() else 0)
+
+
+def bild_key(bild_pfad):
+    # so benennt predict.py die crops: <name bis zum ersten punkt>_face<n>.<ext>
+    return os.path.basename(str(bild_pfad).replace("\\", "/")).split(".")[0]
+
+
+def crop_key(face_name_align):
+    # crop-dateiname zurück auf den bild-key abbilden
+    m = _CROP_NAME.match(os.path.basename(str(face_name_align).replace("\\", "/")))
+    return m.group(1) if m else None
+
+
+def crop_keys(spalte):
+    # wie crop_key, für eine ganze spalte auf einmal
+    namen = spalte.astype(str).str.replace("\\", "/", regex=False).str.rsplit("/", n=1).str[-1]
+    return namen.str.extract(_CROP_NAME, expand=False)
+
+
+class Batch:
+    """
+    bilder für einen FairFace-aufruf. gleiche bild-keys nie im selben batch
+    (sonst wären die crops in test_outputs.csv nicht mehr eindeutig)
+    """
+
+    def __init__(self):
+        self.bilder = []
+        self.keys = set()
+        # bild_path -> sha256, wenn schon bekannt (cache-lookup)
+        self.shas = {}
+        self.future = None
+        self.log_geschrieben = False
+        self.zeiten = None
+
+    def passt(self, bild_path, batch_size):
+        return len(self.bilder) < max(1, batch_size) and bild_key(bild_path) not in self.keys
+
+    def add(self, bild_path, sha=None):
+        self.bilder.append(bild_path)
+        self.keys.add(bild_key(bild_path))
+        if sha:
+            self.shas[bild_path] = sha
+
+
+def infer_batch(batch, slot, log, crops_dst=None, use_worker=True, sw=None):
+    """
+    ein FairFace-aufruf für mehrere bilder im arbeitsordner des slots.
+    gibt {bild_key: ([face rows], counts)} zurück, zuordnung über face_name_align.
+    sw -> metrics.Stopwatch für die stufen-zeiten
+    """
+    sw = sw or metrics.Stopwatch()
+    det_src = slot.detected_dir
+    produced = slot.output_csv
+
+    # frisch anfangen, sonst landen crops/ergebnisse vom letzten aufruf mit drin
+    if os.path.isdir(det_src):
+        shutil.rmtree(det_src, ignore_errors=True)
+    os.makedirs(det_src, exist_ok=True)
+    if os.path.exists(produced):
+        os.remove(produced)
+
+    with sw("csv_write"), open(slot.csv_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["img_path"])
+        for bild_path in batch:
+            w.writerow([bild_path])
+
+    with sw("inference"):
+        log.write(slot.run(use_worker=use_worker))
+
+    keys = [bild_key(b) for b in batch]
+    faces_by_key = {k: ([], leere_counts()) for k in keys}
+    if os.path.exists(produced) and os.path.getsize(produced) > 0:
+        try:
+            with sw("parse"):
+                faces_df = read_fairface_csv(produced)
+                faces_df["_key"] = crop_keys(faces_df["face_name_align"])
+                ohne_bild = ~faces_df["_key"].isin(keys)
+                for name in faces_df.loc[ohne_bild, "face_name_align"]:
+                    log.write(f"Crop ohne Bild: {name}\n")
+                faces_df = faces_df[~ohne_bild]
+
+                counts = zaehle_faces(faces_df, keys)
+                rows = faces_df.drop(columns="_key").to_dict(orient="records")
+                for key, row in zip(faces_df["_key"], rows):
+                    faces_by_key[key][0].append(row)
+                faces_by_key = {k: (faces_by_key[k][0], counts[k]) for k in keys}
+        except Exception as e:
+            log.write(f"CSV Fehler bei {', '.join(os.path.basename(b) for b in batch)}: {e}\n")
+
+    # crops einsammeln
+    if crops_dst:
+        with sw("crops_move"):
+            os.makedirs(crops_dst, exist_ok=True)
+            for fname in os.listdir(det_src):
+                shutil.move(os.path.join(det_src, fname), os.path.join(crops_dst, fname))
+    return faces_by_key
+
+
+def fairface_batch(pool, batch, crops_dst=None, use_worker=True, sw=None):
+    """
+    holt sich einen freien slot aus dem pool und gibt
+    ({bild_path: (faces_list, counts, fehler)}, log_text) zurück
+    """
+    sw = sw or metrics.Stopwatch()
+    log = io.StringIO()
+    t = time.perf_counter()
+    with pool.slot() as slot:
+        sw.zeiten["slot_wait"] += time.perf_counter() - t
+        try:
+            faces_by_key = infer_batch(batch, slot, log, crops_dst, use_worker, sw)
+            return {b: (*faces_by_key[bild_key(b)], None) for b in batch}, log.getvalue()
+        except Exception as e:
+            if isinstance(e, FairFaceError):
+                log.write(e.log)
+            if len(batch) == 1:
+                return {batch[0]: ([], None, e)}, log.getvalue()
+            # batch kaputt -> einzeln nachholen, damit nur das kaputte bild fehlt
+            log.write(f"Batch Fehler ({e}), einzeln weiter\n")
+            ergebnisse = {}
+            for b in batch:
+                try:
+                    ergebnisse[b] = (*infer_batch([b], slot, log, crops_dst, use_worker, sw)[bild_key(b)], None)
+                except Exception as e2:
+                    if isinstance(e2, FairFaceError):
+                        log.write(e2.log)
+                    ergebnisse[b] = ([], None, e2)
+            return ergebnisse, log.getvalue()
 
 
-def analyze_party_images(party_folder: str):
+def analyze_batch(pool, batch, crops_dst=None, use_worker=True, prefilter_mode="off",
+                  max_side=NORMALIZE_MAX_SIDE, shas=None):
+    """
+    läuft in einem thread: bilder normalisieren (EXIF, max. kantenlänge),
+    dann der vorfilter (wenn an), dann FairFace.
+    gibt ({bild_path: (faces_list, counts, fehler)}, log_text, vorfilter, zeiten)
+    zurück, vorfilter = ({bild_path: kandidat}, sekunden) oder None,
+    zeiten = {stufe: sekunden} für den ganzen batch.
+    shas: {bild_path: sha256} aus dem cache-lookup, spart das nochmal-hashen
+    """
+    sw = metrics.Stopwatch()
+    # FairFace liest die normalisierte kopie (gleicher dateiname), zurück
+    # gemeldet wird aber immer unter dem originalpfad
+    with sw("normalize"):
+        shas = shas or {}
+        pfade = {b: normalized_path(b, max_side, sha=shas.get(b)) for b in batch}
+    original = {v: k for k, v in pfade.items()}
+    lesen = list(pfade.values())
+
+    if prefilter_mode == "off":
+        ergebnisse, log_text = fairface_batch(pool, lesen, crops_dst, use_worker, sw)
+        return {original[p]: e for p, e in ergebnisse.items()}, log_text, None, dict(sw.zeiten)
+
+    with sw("prefilter"):
+        kandidaten, secs = prefilter.check(lesen)
+    laufen = lesen if prefilter_mode == "verify" else [p for p in lesen if kandidaten[p]]
+    ergebnisse, log_text = {}, ""
+    if laufen:
+        ergebnisse, log_text = fairface_batch(pool, laufen, crops_dst, use_worker, sw)
+    for p in lesen:
+        if p not in ergebnisse:
+            # kein gesicht-kandidat -> FairFace gespart
+            ergebnisse[p] = ([], leere_counts(), None)
+    return ({original[p]: e for p, e in ergebnisse.items()}, log_text,
+            ({original[p]: k for p, k in kandidaten.items()}, secs), dict(sw.zeiten))
+
+
+def leere_counts():
+    return {"faces_total": 0, "genders": {}, "races": {}, "races4": {}, "ages": []}
+
+
+def zaehle_faces(faces_df, keys):
+    """
+    zählwerte fürs per-image record, für alle bilder eines FairFace-outputs
+    auf einmal (faces_df mit spalte _key). reihenfolge der labels wie sie
+    zuerst vorkommen, alter als float wenn möglich, sonst als text.
+    """
+    counts = {k: leere_counts() for k in keys}
+    if faces_df.empty:
+        return counts
+
+    for spalte, ziel in (("gender", "genders"), ("race", "races"), ("race4", "races4")):
+        if spalte not in faces_df.columns:
+            continue
+        # fehlende werte zählen wie bisher als "nan" (str(float('nan')))
+        werte = faces_df[spalte].fillna("nan").astype(str).str.strip()
+        ok = werte != ""
+        anzahl = pd.DataFrame({"k": faces_df["_key"][ok], "v": werte[ok]}).groupby(["k", "v"], sort=False).size()
+        for (k, v), n in anzahl.items():
+            counts[k][ziel][v] = int(n)
+
+    for c in counts.values():
+        c["faces_total"] = sum(c["genders"].values())
+
+    if "age" in faces_df.columns:
+        age = faces_df["age"]
+        zahl = pd.to_numeric(age, errors="coerce")
+        ist_zahl = zahl.notna() | age.isna()
+        ages = pd.Series(zahl.astype(float).tolist(), index=age.index, dtype=object)
+        ages[~ist_zahl] = age[~ist_zahl].astype(str)
+        ok = age.astype(str) != ""
+        for k, a in zip(faces_df["_key"][ok], ages[ok]):
+            counts[k]["ages"].append(a)
+
+    return counts
+
+
+def crops_aus_cache(entry, bild_path, crops_dst):
+    """
+    crops eines cache-treffers in den crops-ordner linken. hieß das bild beim
+    cachen anders, werden die crops (und face_name_align) umbenannt.
+    """
+    neu_key = bild_key(bild_path)
+    faces = []
+    for row in entry["faces"]:
+        alt_name = os.path.basename(str(row.get("face_name_align", "")))
+        alt_key = crop_key(alt_name)
+        neu_name = neu_key + alt_name[len(alt_key):] if alt_key else alt_name
+        src = os.path.join(entry["crops"], alt_name)
+        if os.path.isfile(src):
+            os.makedirs(crops_dst, exist_ok=True)
+            dst = os.path.join(crops_dst, neu_name)
+            if os.path.exists(dst):
+                os.remove(dst)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+        faces.append(dict(row, face_name_align=neu_name))
+    return faces
+
+
+class Checkpoint:
+    """
+    append-only log der fertigen bilder (record + face rows), eine json-zeile
+    pro bild. wird nach jeder zeile geflusht, fsync höchstens alle paar sekunden.
+    """
+
+    def __init__(self, pfad, fsync_secs=2.0):
+        self.pfad = pfad
+        self.fsync_secs = fsync_secs
+        self._f = open(pfad, "a", encoding="utf-8")
+        self._last_sync = time.time()
+
+    def append(self, rec, faces):
+        self._f.write(json.dumps({"rec": rec, "faces": faces}, ensure_ascii=False) + "\n")
+        self._f.flush()
+        if time.time() - self._last_sync >= self.fsync_secs:
+            os.fsync(self._f.fileno())
+            self._last_sync = time.time()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+
+def lade_checkpoint(pfad):
+    """
+    {img_path: byte-offset der zeile} aus einem checkpoint (die zeilen selbst
+    bleiben auf platte). eine halbe letzte zeile (absturz beim schreiben)
+    wird abgeschnitten.
+    """
+    fertig = {}
+    if not os.path.exists(pfad):
+        return fertig
+    gut_bis = 0
+    with open(pfad, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                fertig[json.loads(line)["rec"]["img_path"]] = gut_bis
+            except (ValueError, KeyError, TypeError):
+                break
+            gut_bis += len(line)
+    if gut_bis < os.path.getsize(pfad):
+        with open(pfad, "r+b") as f:
+            f.truncate(gut_bis)
+    return fertig
+
+
+def lies_checkpoint(f, offset):
+    """(rec, faces) der checkpoint-zeile an offset"""
+    f.seek(offset)
+    eintrag = json.loads(f.readline())
+    return eintrag["rec"], eintrag["faces"]
+
+
+def checkpoint_count(party_name):
+    """wie viele bilder ein unterbrochener lauf schon gesichert hat (0 = keiner)"""
+    pfad = os.path.join("data", "analysis", party_name, CHECKPOINT_NAME)
+    if not os.path.exists(pfad):
+        return 0
+    with open(pfad, "rb") as f:
+        return sum(1 for line in f if line.endswith(b"\n"))
+
+
+def analyze_party_images(party_folder: str, use_worker: bool = True, batch_size: int = 1,
+                         workers: int = None, use_cache: bool = True, resume: bool = True,
+                         prefilter_mode: str = "off", max_side: int = NORMALIZE_MAX_SIDE,
+                         dedup: str = "off", phash_dist: int = phash_index.PHASH_MAX_DIST,
+                         should_stop=None):
     """
     Hauptanalyse für einen Ordner mit Bildern.
     Es wird eine Reihe von outputs erstellt (json, csv, logs).
+    use_worker=False -> wie früher ein predict.py-prozess pro bild.
+    batch_size -> so viele bilder pro FairFace-aufruf (ergebnis ist gleich).
+    workers -> wie viele batches dieser partei gleichzeitig laufen dürfen
+    (standard: so viele wie der FairFace-pool slots hat).
+    use_cache -> unveränderte bilder (gleicher inhalt + modell) nicht neu rechnen.
+    resume -> ist ein checkpoint von einem abgebrochenen lauf da, werden die
+    dort gesicherten bilder übernommen statt neu analysiert.
+    prefilter_mode -> "on": bilder ohne gesicht-kandidat (HOG auf kleiner kopie)
+    gehen nicht durch FairFace und bekommen faces_total 0. "verify": FairFace
+    läuft trotzdem, es wird gezählt wie oft der vorfilter daneben liegt.
+    max_side -> größere (oder per EXIF gedrehte) bilder werden vor der erkennung
+    gedreht/verkleinert und in data/analysis/_norm gecacht. 0 = aus.
+    dedup -> "reuse": fast gleiche bilder (dHash-abstand <= phash_dist, auch aus
+    anderen parteien) übernehmen das ergebnis des originals aus dem cache und
+    bekommen duplicate_of (nur wenn das ergebnis wirklich übernommen wurde,
+    also nicht mit use_cache=False). "exclude": duplikate aus derselben
+    partei zusätzlich nicht in summary/trends mitzählen.
+    should_stop -> funktion ohne argumente, wird vor jedem bild gefragt. gibt sie
+    einen status zurück ("paused"/"cancelled"), hört der lauf dort auf; der
+    checkpoint bleibt, der nächste start macht weiter. rückgabe dann None.
     """
+    if prefilter_mode not in prefilter.MODES:
+        raise ValueError(f"prefilter_mode muss einer von {prefilter.MODES} sein")
+    if dedup not in phash_index.MODES:
+        raise ValueError(f"dedup muss einer von {phash_index.MODES} sein")
     party_name = os.path.basename(party_folder.rstrip("/\\"))
 
     out_dir = os.path.join("data", "analysis", party_name)
     os.makedirs(out_dir, exist_ok=True)
 
-    progress_file = os.path.join(out_dir, "progress.json")
-    save_progress(progress_file, status="running", party=party_name,
-                   message="Starte Analyse ...", done=0, total=0,
-                   started_at=int(time.time()))
+    progress = ProgressChannel(party_name)
+    progress.update(status="running", message="Starte Analyse ...", done=0, total=0,
+                    started_at=int(time.time()))
 
     images = list_images_ordner(party_folder)
     total = len(images)
 
-    # outputs anlegen
-    per_image_jsonl = os.path.join(out_dir, "per_image.jsonl")
-    open(per_image_jsonl, "w", encoding="utf-8").close()
-    per_image_rows = []
-    all_faces = []
+    # checkpoint vom letzten (abgebrochenen) lauf
+    ckpt_path = os.path.join(out_dir, CHECKPOINT_NAME)
+    if not resume and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    fertig = lade_checkpoint(ckpt_path)
 
-    fairface_dir = os.path.join("face_analysis", "model", "FairFace")
-    predict_script = "predict.py"
-    det_src = os.path.join(fairface_dir, "detected_faces")
     det_dst = os.path.join(out_dir, "detected_faces")
+    det_neu = os.path.join(out_dir, "_detected_faces_neu")
 
-    if os.path.isdir(det_src):
-        shutil.rmtree(det_src, ignore_errors=True)
-    os.makedirs(det_src, exist_ok=True)
+    # crops vom abgebrochenen lauf behalten
+    if os.path.isdir(det_neu) and not fertig:
+        shutil.rmtree(det_neu, ignore_errors=True)
 
     log_path = os.path.join(out_dir, "predict.log")
-    log = open(log_path, "w", encoding="utf-8", newline="")
-    log.write(f"PARTEI: {party_name}\nTOTAL IMAGES: {total}\n\n")
+    log = open(log_path, "a" if fertig else "w", encoding="utf-8", newline="")
+    log.write(f"PARTEI: {party_name}\nTOTAL IMAGES: {total}\n")
+    if fertig:
+        log.write(f"FORTSETZUNG: {len(fertig)} Bilder aus Checkpoint\n")
+    if prefilter_mode != "off" and not prefilter.available():
+        log.write("Vorfilter: face_recognition fehlt, läuft ohne\n")
+        prefilter_mode = "off"
+    log.write("\n")
 
     if total == 0:
         # keine bilder -> default leere dateien
@@ -164,206 +498,325 @@ def analyze_party_images(party_folder: str):
                     f.write("[]")
                 else:
                     f.write("face_file,race,race4,gender,age\n")
-        save_progress(progress_file, status="done", message="Keine Bilder da.", total=0, done=0)
+        progress.update(status="done", message="Keine Bilder da.", total=0, done=0)
+        results_db.set_job_status(party_name, "done", "Keine Bilder da.")
         log.close()
+        if os.path.exists(ckpt_path):
+            os.remove(ckpt_path)
         return os.path.join(out_dir, "predictions.csv")
 
     start = time.time()
     done = 0
-    tmp_csv = os.path.join(out_dir, "_single.csv")
-
-    for bild_path in images:
-        bild_name = os.path.basename(bild_path)
-        ts = extract_ts_from_filename(bild_name)
-        iso = iso_from_ts(ts) if ts else ""
-
-        preview = bild_to_datauri(bild_path)
-
-        save_progress(progress_file, status="running",
-                       message=f"Analysiere {bild_name}",
-                       done=done, total=total,
-                       current_image=bild_name,
-                       current_preview=preview,
-                       current_result="")
-
-        # einzel-csv schreiben
-        with open(tmp_csv, "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["img_path"])
-            w.writerow([bild_path])
-
-        # predict.py call
-        cmd = [sys.executable, predict_script, "--csv", os.path.abspath(tmp_csv).replace("\\", "/")]
-        log.write("CMD: " + " ".join(cmd) + "\n")
-
-        try:
-            proc = subprocess.run(cmd, cwd=fairface_dir, capture_output=True, text=True)
-            log.write(proc.stdout or "")
-            if proc.stderr:
-                log.write("\nSTDERR:\n" + proc.stderr + "\n")
-            if proc.returncode != 0:
-                raise RuntimeError(f"predict.py exit {proc.returncode}")
-        except Exception as e:
-            # fehler -> trotzdem weitermachen
-            rec = {
-                "party": party_name,
-                "image_name": bild_name,
-                "img_path": bild_path,
-                "created_ts": ts,
-                "created_iso": iso,
-                "faces_total": 0,
-                "genders": {}, "races": {}, "races4": {},
-                "ages": [], "error": str(e)
-            }
-            with open(per_image_jsonl, "a", encoding="utf-8") as jf:
-                jf.write(json.dumps(rec, ensure_ascii=False) + "\n")
-            per_image_rows.append(rec)
-            done += 1
-            elapsed = int(time.time() - start)
-            save_progress(progress_file, status="running",
-                           message="Fehler übersprungen",
-                           done=done, total=total, elapsed_secs=elapsed,
-                           current_image=bild_name,
-                           current_preview=preview,
-                           current_result=f"Fehler: {e}")
-            continue
-
-        # outputs von fairface lesen
-        produced = os.path.join(fairface_dir, "test_outputs.csv")
-        faces_df, faces_list = None, []
-        if os.path.exists(produced) and os.path.getsize(produced) > 0:
-            try:
-                faces_df = read_fairface_csv(produced)
-                faces_list = faces_df.to_dict(orient="records")
-            except Exception as e:
-                log.write(f"CSV Fehler bei {bild_name}: {e}\n")
-
-        genders, races, races4 = Counter(), Counter(), Counter()
-        ages = []
-
-        for row in faces_list:
-            g = str(row.get("gender", "")).strip()
-            r = str(row.get("race", "")).strip()
-            r4 = str(row.get("race4", "")).strip() if "race4" in row else ""
-            a = row.get("age", "")
-            if g: genders[g] += 1
-            if r: races[r] += 1
-            if r4: races4[r4] += 1
-            if a != "" and a is not None:
-                try:
-                    ages.append(float(a))
-                except Exception:
-                    ages.append(str(a))
-
-        faces_total = sum(genders.values()) if genders else 0
-
-        rec = {
-            "party": party_name,
-            "image_name": bild_name,
-            "img_path": bild_path,
-            "created_ts": ts,
-            "created_iso": iso,
-            "faces_total": faces_total,
-            "genders": dict(genders),
-            "races": dict(races),
-            "races4": dict(races4),
-            "ages": ages,
-            "error": None
-        }
-        with open(per_image_jsonl, "a", encoding="utf-8") as jf:
-            jf.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        per_image_rows.append(rec)
-
-        g_str = ", ".join([f"{k}={v}" for k, v in sorted(genders.items())]) or "keine"
-        r_str = ", ".join([f"{k}={v}" for k, v in sorted(races.items())]) or "—"
-        result_text = f"{faces_total} gesichter · Gender: {g_str} · Race: {r_str}"
-
-        done += 1
-        elapsed = int(time.time() - start)
-        speed = done / max(1, elapsed)
-        remaining = max(0, total - done)
-        eta = int(remaining / speed) if speed > 0 else None
-        save_progress(progress_file, status="running",
-                       message=f"Fertig: {bild_name}",
-                       done=done, total=total,
-                       elapsed_secs=elapsed, eta_secs=eta,
-                       current_image=bild_name,
-                       current_preview=preview,
-                       current_result=result_text)
-
-        for row in faces_list:
-            all_faces.append({
-                "face_file": os.path.basename(str(row.get("face_name_align", ""))),
-                "race": str(row.get("race", "")),
-                "race4": str(row.get("race4", "")) if "race4" in row else "",
-                "gender": str(row.get("gender", "")),
-                "age": row.get("age", "")
-            })
-
-    # ende schleife
-
-    if os.path.isdir(det_dst):
-        shutil.rmtree(det_dst, ignore_errors=True)
-    if os.path.isdir(det_src):
-        shutil.move(det_src, det_dst)
-        os.makedirs(det_src, exist_ok=True)
+    pool = get_pool()
+    parallel = max(1, workers or pool.size)
+    cache = get_cache() if use_cache else None
+    # normalisierung ändert die eingabe großer bilder -> gehört zum cache-key
+    model = f"{model_version(pool.fairface_dir)}-max{max_side}" if cache else None
+    cache_hits = 0
+    uebernommen = 0
+    vorfilter = prefilter.PrefilterStats(prefilter_mode) if prefilter_mode != "off" else None
+    phash = phash_index.get_index() if dedup != "off" else None
+    originale = {}
+    # bilder, die in diesem lauf durch FairFace gehen (für duplikate davon)
+    im_lauf = set()
+    duplikate = 0
+    ckpt = Checkpoint(ckpt_path)
+    ckpt_reader = open(ckpt_path, "rb")
+    # stufen-zeiten pro bild
+    timing = metrics.TimingLog(os.path.join(out_dir, "timing.jsonl"), "a" if fertig else "w")
+    lookup_zeit = {}
+    eta_schaetzer = metrics.EtaSchaetzer()
+
+    # outputs werden direkt mitgeschrieben
+    outputs = PartyOutputs(out_dir, party_name, total)
+    store = result_store.PartyStore(party_name) if result_store.available() else None
+    index = results_db.RunWriter(party_name, total)
+
+    def ablegen(rec, face_rows):
+        # duplikate stehen in den dateien, zählen aber (bei "exclude") nicht mit -
+        # nur innerhalb der partei, sonst hinge die summary von der reihenfolge
+        # ab, in der die parteien analysiert wurden
+        dup = rec.get("duplicate_of")
+        zaehlt = not (dedup == "exclude" and dup and dup.split("/", 1)[0] == rec["party"])
+        outputs.add(rec, face_rows, zaehlt)
+        index.add(rec, face_rows, zaehlt)
+        if store is not None:
+            store.add(rec, face_rows)
+
+    bilder = iter(images)
+    # (bild_path, sha, art, quelle) in bild-reihenfolge
+    # art: "batch" (FairFace läuft), "cache" (cache-treffer), "checkpoint" (schon fertig),
+    # "dup" (duplikat eines bilds, das in diesem lauf vorher durch FairFace geht)
+    laufend = deque()
+    offen = None
+    vorlauf = 2 * parallel * max(1, batch_size)
+
+    def abschicken(batch):
+        erstes = os.path.basename(batch.bilder[0])
+        rest = f" (+{len(batch.bilder) - 1} weitere)" if len(batch.bilder) > 1 else ""
+        progress.update(message=f"Analysiere {erstes}{rest}",
+                        done=done, total=total,
+                        current_image=erstes,
+                        current_preview=preview_url(party_name, erstes),
+                        current_result="")
+        batch.future = ex.submit(analyze_batch, pool, batch.bilder, det_neu, use_worker,
+                                 prefilter_mode, max_side, batch.shas)
 
-    pred_csv = os.path.join(out_dir, "predictions.csv")
-    with open(pred_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["face_file", "race", "race4", "gender", "age"])
-        for r in all_faces:
-            w.writerow([r["face_file"], r["race"], r["race4"], r["gender"], r["age"]])
-    with open(os.path.join(out_dir, "predictions.json"), "w", encoding="utf-8") as fp:
-        json.dump(all_faces, fp, indent=2, ensure_ascii=False)
-
-    # per_image.csv bauen
-    per_image_csv = os.path.join(out_dir, "per_image.csv")
-    all_gender_keys = sorted({k for r in per_image_rows for k in r["genders"].keys()})
-    all_race_keys = sorted({k for r in per_image_rows for k in r["races"].keys()})
-    all_race4_keys = sorted({k for r in per_image_rows for k in r["races4"].keys()})
-
-    header = ["party", "image_name", "created_ts", "created_iso", "faces_total"]
-    header += [f"gender_{k}" for k in all_gender_keys]
-    header += [f"race_{k}" for k in all_race_keys]
-    header += [f"race4_{k}" for k in all_race4_keys]
-    header += ["ages_json", "error"]
-
-    with open(per_image_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(header)
-        for r in per_image_rows:
-            row = [
-                r["party"], r["image_name"], r["created_ts"] or "",
-                r["created_iso"] or "", r["faces_total"]
-            ]
-            row += [r["genders"].get(k, 0) for k in all_gender_keys]
-            row += [r["races"].get(k, 0) for k in all_race_keys]
-            row += [r["races4"].get(k, 0) for k in all_race4_keys]
-            row += [json.dumps(r["ages"], ensure_ascii=False), r["error"] or ""]
-            w.writerow(row)
-
-    # summary schreiben
-    sum_faces = sum(r["faces_total"] for r in per_image_rows)
-    agg_gender, agg_race = Counter(), Counter()
-    for r in per_image_rows:
-        agg_gender.update(r["genders"])
-        agg_race.update(r["races"])
-
-    summary = {
-        "party": party_name,
-        "total_images": total,
-        "images_processed": len(per_image_rows),
-        "faces_total": int(sum_faces),
-        "by_gender": dict(agg_gender),
-        "by_race": dict(agg_race)
-    }
-    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as fp:
-        json.dump(summary, fp, indent=2, ensure_ascii=False)
+    try:
+        gestoppt = None
+        with ThreadPoolExecutor(max_workers=parallel) as ex:
+            while True:
+                if should_stop is not None:
+                    gestoppt = should_stop()
+                    if gestoppt:
+                        # laufende batches nicht mehr abwarten als nötig
+                        ex.shutdown(wait=False, cancel_futures=True)
+                        break
+                # bilder vorausschicken, ergebnisse in reihenfolge abholen
+                # (so sind die outputs gleich, egal wie viel parallel läuft)
+                while len(laufend) < vorlauf:
+                    bild_path = next(bilder, None)
+                    if bild_path is None:
+                        if offen is not None:
+                            abschicken(offen)
+                            offen = None
+                        break
+                    if bild_path in fertig:
+                        laufend.append((bild_path, None, "checkpoint", fertig.pop(bild_path)))
+                        continue
+
+                    # erst im cache schauen, dann erst FairFace
+                    t_lookup = time.perf_counter()
+                    sha, entry = None, None
+                    if cache is not None:
+                        try:
+                            sha = cache.image_hash(bild_path)
+                            entry = cache.get(sha, model)
+                        except OSError as e:
+                            log.write(f"Cache Fehler bei {bild_path}: {e}\n")
+
+                    # fast gleiches bild schon mal gesehen? dann dessen ergebnis
+                    if phash is not None:
+                        try:
+                            pid, ph = phash.add_image(bild_path, party_name, sha)
+                            original = phash.find_original(pid, ph, phash_dist, prefer_party=party_name)
+                        except Exception as e:
+                            log.write(f"pHash Fehler bei {bild_path}: {e}\n")
+                            original = None
+                        # duplikat ist es nur, wenn wirklich das ergebnis des originals genommen wird
+                        if original is not None and cache is not None and original["sha"]:
+                            if entry is None:
+                                entry = cache.get(original["sha"], model)
+                                if entry is None and original["path"] in im_lauf:
+                                    # original läuft gerade in diesem lauf: kommt in der
+                                    # reihenfolge vorher dran, danach steht es im cache
+                                    lookup_zeit[bild_path] = time.perf_counter() - t_lookup
+                                    laufend.append((bild_path, sha, "dup", original))
+                                    continue
+                                if entry is not None:
+                                    originale[bild_path] = original
+                            elif original["sha"] == sha:
+                                # gleiche bytes, der cache-treffer ist das ergebnis des originals
+                                originale[bild_path] = original
+                    if cache is not None or phash is not None:
+                        lookup_zeit[bild_path] = time.perf_counter() - t_lookup
+                    if entry is not None:
+                        laufend.append((bild_path, sha, "cache", entry))
+                        continue
+
+                    if offen is not None and not offen.passt(bild_path, batch_size):
+                        abschicken(offen)
+                        offen = None
+                    if offen is None:
+                        offen = Batch()
+                    offen.add(bild_path, sha)
+                    im_lauf.add(bild_path)
+                    laufend.append((bild_path, sha, "batch", offen))
+                if not laufend:
+                    break
+
+                bild_path, sha, art, quelle = laufend.popleft()
+                bild_name = os.path.basename(bild_path)
+
+                if art == "checkpoint":
+                    # schon im letzten lauf fertig geworden
+                    ablegen(*lies_checkpoint(ckpt_reader, quelle))
+                    done += 1
+                    uebernommen += 1
+                    continue
+
+                ts = extract_ts_from_filename(bild_name)
+                iso = iso_from_ts(ts) if ts else ""
+
+                if art == "dup":
+                    # das original ist durch, sein ergebnis sollte jetzt im cache stehen
+                    entry = cache.get(quelle["sha"], model)
+                    if entry is not None:
+                        originale[bild_path] = quelle
+                        art, quelle = "cache", entry
+                    else:
+                        # original fehlgeschlagen/übersprungen -> selbst rechnen, kein duplikat
+                        art, quelle = "batch", Batch()
+                        quelle.add(bild_path, sha)
+
+                if art == "batch":
+                    if quelle.future is None:
+                        abschicken(quelle)
+                        offen = None
+                    # fairface call (worker oder predict.py) ist im thread gelaufen
+                    t_wait = time.perf_counter()
+                    ergebnisse, log_text, vf, batch_zeiten = quelle.future.result()
+                    zeiten = {"wait": time.perf_counter() - t_wait}
+                    if not quelle.log_geschrieben:
+                        log.write(log_text)
+                        quelle.log_geschrieben = True
+                        if vf is not None:
+                            vorfilter.secs += vf[1]
+                    # batch-stufen auf die bilder umlegen
+                    for stage, secs in batch_zeiten.items():
+                        zeiten[stage] = secs / len(quelle.bilder)
+                    faces_list, counts, err = ergebnisse[bild_path]
+                    kandidat = vf[0][bild_path] if vf is not None else None
+                else:
+                    t_crops = time.perf_counter()
+                    faces_list, err = crops_aus_cache(quelle, bild_path, det_neu), None
+                    zeiten = {"cache_crops": time.perf_counter() - t_crops}
+                    counts = quelle["counts"]
+                    cache_hits += 1
+                    metrics.inc("fairface_cache_hits_total")
+                    kandidat = None
+                if bild_path in lookup_zeit:
+                    zeiten["cache_lookup"] = lookup_zeit.pop(bild_path)
+
+                if err is not None:
+                    # fehler -> trotzdem weitermachen
+                    metrics.inc("fairface_image_errors_total")
+                    counts = leere_counts()
+                    message = "Fehler übersprungen"
+                    result_text = f"Fehler: {err}"
+                else:
+                    if kandidat is not None:
+                        vorfilter.add(kandidat, counts["faces_total"])
+                    # übersprungene bilder nicht cachen, FairFace hat sie nie gesehen
+                    skip = kandidat is False and prefilter_mode == "on"
+                    if art == "batch" and cache is not None and sha and not skip:
+                        crop_files = [os.path.join(det_neu, os.path.basename(str(r.get("face_name_align", ""))))
+                                      for r in faces_list]
+                        cache_rows = [dict(r, face_name_align=os.path.basename(str(r.get("face_name_align", ""))))
+                                      for r in faces_list]
+                        cache.put(sha, model, cache_rows, counts,
+                                  [c for c in crop_files if os.path.isfile(c)])
+
+                    g_str = ", ".join([f"{k}={v}" for k, v in sorted(counts["genders"].items())]) or "keine"
+                    r_str = ", ".join([f"{k}={v}" for k, v in sorted(counts["races"].items())]) or "—"
+                    message = f"Fertig: {bild_name}"
+                    result_text = f"{counts['faces_total']} gesichter · Gender: {g_str} · Race: {r_str}"
+                    if skip:
+                        result_text = "kein Gesicht (Vorfilter)"
+
+                rec = {
+                    "party": party_name,
+                    "image_name": bild_name,
+                    "img_path": bild_path,
+                    "created_ts": ts,
+                    "created_iso": iso,
+                    **counts,
+                    "error": None if err is None else str(err)
+                }
+                if dedup != "off":
+                    original = originale.pop(bild_path, None)
+                    rec["duplicate_of"] = (f"{original['party']}/{os.path.basename(original['path'])}"
+                                           if original else None)
+                    duplikate += original is not None
+                face_rows = []
+                for row in faces_list:
+                    face_rows.append({
+                        "face_file": os.path.basename(str(row.get("face_name_align", ""))),
+                        "race": str(row.get("race", "")),
+                        "race4": str(row.get("race4", "")) if "race4" in row else "",
+                        "gender": str(row.get("gender", "")),
+                        "age": row.get("age", "")
+                    })
+
+                # erst checkpoint, dann outputs
+                with metrics.messen(zeiten, "checkpoint"):
+                    ckpt.append(rec, face_rows)
+                with metrics.messen(zeiten, "outputs"):
+                    ablegen(rec, face_rows)
+                timing.write(bild_name, zeiten, source=art)
+                metrics.observe_stages(zeiten)
+                metrics.inc("fairface_images_total")
+
+                done += 1
+                elapsed = int(time.time() - start)
+                remaining = max(0, total - done)
+                # geglätteter durchsatz, am anfang (noch kein messpunkt) der schnitt
+                eta_schaetzer.update()
+                eta = eta_schaetzer.eta(remaining)
+                if eta is None:
+                    speed = (done - uebernommen) / max(1, elapsed)
+                    eta = int(remaining / speed) if speed > 0 else None
+                progress.update(message=message,
+                                done=done, total=total,
+                                elapsed_secs=elapsed, eta_secs=eta,
+                                current_image=bild_name,
+                                current_preview=preview_url(party_name, bild_name),
+                                current_result=result_text,
+                                cache_hits=cache_hits,
+                                prefilter=vorfilter.as_dict() if vorfilter else None,
+                                duplicates=duplikate)
+
+        ckpt.close()
+        ckpt_reader.close()
+        timing.close()
+        if cache is not None:
+            cache.evict()
+        prune_norm()
+
+        if gestoppt:
+            # alles bis hier steht im checkpoint, outputs sind unvollständig
+            outputs.abort()
+            if store is not None:
+                store.abort()
+            index.fail(f"Angehalten nach {done}/{total} Bildern", status=gestoppt)
+            progress.update(status=gestoppt, message=f"Angehalten nach {done}/{total} Bildern",
+                            done=done, total=total, eta_secs=None)
+            log.write(f"ANGEHALTEN ({gestoppt}) nach {done}/{total} Bildern\n")
+            log.close()
+            return None
+
+        # ende schleife
+
+        if os.path.isdir(det_dst):
+            shutil.rmtree(det_dst, ignore_errors=True)
+        os.makedirs(det_neu, exist_ok=True)
+        shutil.move(det_neu, det_dst)
+
+        if vorfilter is not None:
+            log.write(f"Vorfilter: {json.dumps(vorfilter.as_dict())}\n")
+            summary = outputs.close(prefilter=vorfilter.as_dict())
+        else:
+            summary = outputs.close()
+        if store is not None:
+            store.commit()
+        index.commit(summary, os.path.join(out_dir, "summary.json"))
+    except Exception as e:
+        # absturz: checkpoint bleibt für resume, halbe outputs und die schon
+        # in den index geschriebenen zeilen dieses laufs kommen weg
+        for f in (ckpt, ckpt_reader, timing, log):
+            f.close()
+        outputs.abort()
+        if store is not None:
+            store.abort()
+        index.fail(str(e))
+        raise
 
     elapsed = int(time.time() - start)
-    save_progress(progress_file, status="done",
-                   message="Analyse abgeschlossen.",
-                   elapsed_secs=elapsed, total=total, done=total)
+    progress.update(status="done",
+                    message="Analyse abgeschlossen.",
+                    elapsed_secs=elapsed, total=total, done=total)
     log.close()
-    return pred_csv
+    # alles geschrieben -> checkpoint wird nicht mehr gebraucht
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    return outputs.pred_csv
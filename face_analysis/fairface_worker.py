@@ -0,0 +1,336 @@
+# face_analysis/fairface_worker.py
+#
+# langlebiger FairFace-worker: predict.py (torch, dlib, modelle) wird nur einmal
+# geladen, danach kommen die aufträge als json-zeilen über stdin rein und die
+# antworten gehen über stdout zurück. der alte weg (ein predict.py-prozess pro
+# bild) bleibt als fallback in run_predict_subprocess().
+#
+# mehrere worker laufen als pool (FairFacePool), jeder slot hat seinen eigenen
+# arbeitsordner für detected_faces/test_outputs.csv -> parteien stören sich nicht.
+
+import os, sys, json, subprocess, threading, io, contextlib, traceback, atexit, queue, shutil
+
+FAIRFACE_DIR = os.path.join("face_analysis", "model", "FairFace")
+PREDICT_SCRIPT = "predict.py"
+WORK_ROOT = os.path.join("data", "analysis", "_work")
+
+# was predict.py selbst schreibt, wird nicht in die workspaces verlinkt
+_OUTPUT_NAMES = ("detected_faces", "test_outputs.csv", "worker.log")
+
+# nach so vielen neustarts geben wir auf (dann -> subprocess fallback)
+MAX_RESTARTS = 5
+
+
+class FairFaceError(RuntimeError):
+    def __init__(self, msg, log=""):
+        super().__init__(msg)
+        self.log = log
+
+
+class WorkerUnavailable(FairFaceError):
+    """worker lässt sich nicht (mehr) starten -> subprocess benutzen"""
+
+
+def run_predict_subprocess(csv_path, cwd=FAIRFACE_DIR, env=None):
+    """alter weg: predict.py als eigener prozess, gibt das log zurück"""
+    cmd = [sys.executable, PREDICT_SCRIPT, "--csv", os.path.abspath(csv_path).replace("\\", "/")]
+    full_env = dict(os.environ, **(env or {}))
+    proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=full_env)
+    log = "CMD: " + " ".join(cmd) + "\n" + (proc.stdout or "")
+    if proc.stderr:
+        log += "\nSTDERR:\n" + proc.stderr + "\n"
+    if proc.returncode != 0:
+        raise FairFaceError(f"predict.py exit {proc.returncode}", log)
+    return log
+
+
+class FairFaceWorker:
+    """
+    client für den worker-prozess. predict() ist threadsafe (ein auftrag
+    gleichzeitig), stirbt der prozess wird er neu gestartet.
+    """
+
+    def __init__(self, fairface_dir=FAIRFACE_DIR, log_path=None, env=None):
+        self.fairface_dir = fairface_dir
+        self.log_path = log_path or os.path.join(fairface_dir, "worker.log")
+        self.env = env
+        self.restarts = 0
+        self.broken = False
+        self._gestartet = False
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        if self.alive():
+            return
+        self._kill()
+        env = dict(os.environ)
+        if self.env:
+            env.update(self.env)
+        stderr = open(self.log_path, "a", encoding="utf-8")
+        try:
+            self._proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)],
+                cwd=self.fairface_dir, env=env,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                text=True, encoding="utf-8", bufsize=1,
+            )
+        finally:
+            stderr.close()
+
+        # warten bis predict.py importiert ist
+        antwort = self._read()
+        if not antwort or not antwort.get("ready"):
+            self._kill()
+            self.broken = True
+            fehler = (antwort or {}).get("error", "worker ohne antwort beendet")
+            raise WorkerUnavailable(f"FairFace-Worker startet nicht: {fehler}")
+
+    def predict(self, csv_path, detected_dir="detected_faces", output_csv="test_outputs.csv"):
+        """
+        ein auftrag wie `predict.py --csv csv_path`. gibt das log zurück,
+        wirft FairFaceError wenn predict fehlschlägt.
+        """
+        req = {
+            "csv": os.path.abspath(csv_path).replace("\\", "/"),
+            "detected_dir": detected_dir,
+            "output_csv": output_csv,
+        }
+        with self._lock:
+            # ein neuer versuch falls der worker mittendrin abstürzt
+            for versuch in range(2):
+                if not self.alive():
+                    if self._gestartet:
+                        self.restarts += 1
+                        if self.restarts > MAX_RESTARTS:
+                            self.broken = True
+                            raise WorkerUnavailable("FairFace-Worker stürzt dauernd ab")
+                    self.start()
+                    self._gestartet = True
+                try:
+                    self._proc.stdin.write(json.dumps(req) + "\n")
+                    self._proc.stdin.flush()
+                    antwort = self._read()
+                except (BrokenPipeError, OSError):
+                    antwort = None
+                if antwort is None:
+                    # prozess ist weg -> nochmal mit frischem worker
+                    self._kill()
+                    continue
+                if not antwort.get("ok"):
+                    raise FairFaceError(antwort.get("error", "unbekannter fehler"), antwort.get("log", ""))
+                return antwort.get("log", "")
+        raise FairFaceError("FairFace-Worker abgestürzt")
+
+    def close(self):
+        with self._lock:
+            if self.alive():
+                try:
+                    self._proc.stdin.write(json.dumps({"cmd": "quit"}) + "\n")
+                    self._proc.stdin.flush()
+                    self._proc.wait(timeout=5)
+                except Exception:
+                    pass
+            self._kill()
+
+    def _read(self):
+        line = self._proc.stdout.readline()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def _kill(self):
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            self._proc.kill()
+        try:
+            self._proc.wait(timeout=5)
+        except Exception:
+            pass
+        self._proc = None
+
+
+def prepare_workspace(ws_dir, fairface_dir=FAIRFACE_DIR):
+    """
+    arbeitsordner für predict.py im subprocess-modus: predict.py und die
+    modell-ordner werden verlinkt (kopiert falls symlinks nicht gehen),
+    die outputs landen dann im workspace statt im gemeinsamen FairFace-ordner.
+    """
+    os.makedirs(ws_dir, exist_ok=True)
+    for name in os.listdir(fairface_dir):
+        if name in _OUTPUT_NAMES or name.startswith("_"):
+            continue
+        ziel = os.path.join(ws_dir, name)
+        if os.path.lexists(ziel):
+            continue
+        quelle = os.path.abspath(os.path.join(fairface_dir, name))
+        try:
+            os.symlink(quelle, ziel, target_is_directory=os.path.isdir(quelle))
+        except OSError:
+            if os.path.isdir(quelle):
+                shutil.copytree(quelle, ziel)
+            else:
+                shutil.copy2(quelle, ziel)
+
+
+class FairFaceSlot:
+    """ein worker + eigener arbeitsordner. immer nur ein auftrag gleichzeitig."""
+
+    def __init__(self, index, fairface_dir=FAIRFACE_DIR, threads=None):
+        self.fairface_dir = fairface_dir
+        self.dir = os.path.abspath(os.path.join(WORK_ROOT, f"slot-{os.getpid()}-{index}"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.detected_dir = os.path.join(self.dir, "detected_faces")
+        self.output_csv = os.path.join(self.dir, "test_outputs.csv")
+        self.csv_path = os.path.join(self.dir, "_batch.csv")
+        # torch soll sich die kerne mit den anderen slots teilen
+        self.env = {"OMP_NUM_THREADS": str(threads), "MKL_NUM_THREADS": str(threads)} if threads else {}
+        self.worker = FairFaceWorker(fairface_dir, log_path=os.path.join(self.dir, "worker.log"), env=self.env)
+        self._ws_ready = False
+
+    def run(self, use_worker=True):
+        """FairFace auf self.csv_path laufen lassen, gibt das log zurück"""
+        if use_worker and not self.worker.broken:
+            try:
+                return "WORKER: " + self.csv_path + "\n" + self.worker.predict(
+                    self.csv_path, detected_dir=self.detected_dir, output_csv=self.output_csv)
+            except WorkerUnavailable as e:
+                fallback = f"{e} -> fallback auf predict.py\n"
+                return fallback + self._run_subprocess()
+        return self._run_subprocess()
+
+    def _run_subprocess(self):
+        if not self._ws_ready:
+            prepare_workspace(self.dir, self.fairface_dir)
+            self._ws_ready = True
+        return run_predict_subprocess(self.csv_path, cwd=self.dir, env=self.env)
+
+    def close(self):
+        self.worker.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class FairFacePool:
+    """
+    feste anzahl slots (standard: anzahl kerne). alle analysen im prozess
+    teilen sich den pool, dadurch laufen parteien und batches echt parallel
+    ohne die maschine zu überbuchen. worker starten erst bei bedarf.
+    """
+
+    def __init__(self, size=None, fairface_dir=FAIRFACE_DIR):
+        self.fairface_dir = fairface_dir
+        self.size = max(1, int(size or os.environ.get("FAIRFACE_WORKERS") or os.cpu_count() or 1))
+        threads = max(1, (os.cpu_count() or 1) // self.size)
+        self.slots = [FairFaceSlot(i, fairface_dir, threads) for i in range(self.size)]
+        self._frei = queue.LifoQueue()
+        for slot in reversed(self.slots):
+            self._frei.put(slot)
+
+    @contextlib.contextmanager
+    def slot(self):
+        # lifo: zuletzt benutzte slots zuerst, deren worker sind schon warm
+        s = self._frei.get()
+        try:
+            yield s
+        finally:
+            self._frei.put(s)
+
+    def busy(self):
+        """wie viele slots gerade rechnen"""
+        return self.size - self._frei.qsize()
+
+    def close(self):
+        for s in self.slots:
+            s.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """gemeinsamer pool für den ganzen prozess"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = FairFacePool()
+            atexit.register(_POOL.close)
+        return _POOL
+
+
+def current_pool():
+    """pool, falls schon einer läuft (legt keinen an)"""
+    return _POOL
+
+
+# ---------------- ab hier: der worker-prozess selbst ---------------- #
+
+def _einmal_laden(fn):
+    # modelle nur einmal laden, predict.py ruft die loader bei jedem aufruf
+    cache = {}
+
+    def wrapper(*args, **kwargs):
+        key = repr((args, sorted(kwargs.items())))
+        if key not in cache:
+            cache[key] = fn(*args, **kwargs)
+        return cache[key]
+    return wrapper
+
+
+def _serve():
+    # stdout gehört dem protokoll, alles andere (prints von dlib/torch) -> stderr
+    proto = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def send(obj):
+        proto.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        proto.flush()
+
+    sys.path.insert(0, os.getcwd())
+    try:
+        import pandas as pd
+        import predict
+        for mod_name, attrs in (("dlib", ("cnn_face_detection_model_v1", "shape_predictor")),
+                                ("torch", ("load",))):
+            mod = getattr(predict, mod_name, None)
+            for attr in attrs:
+                if mod is not None and hasattr(mod, attr):
+                    setattr(mod, attr, _einmal_laden(getattr(mod, attr)))
+        predict_fn = getattr(predict, "predidct_age_gender_race", None) or predict.predict_age_gender_race
+    except Exception as e:
+        send({"ready": False, "error": f"{type(e).__name__}: {e}"})
+        return
+    send({"ready": True, "pid": os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req = json.loads(line)
+        if req.get("cmd") == "quit":
+            break
+
+        buf = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+                detected_dir = req.get("detected_dir") or "detected_faces"
+                os.makedirs(detected_dir, exist_ok=True)
+                imgs = pd.read_csv(req["csv"])["img_path"]
+                predict.detect_face(imgs, detected_dir)
+                predict_fn(req.get("output_csv") or "test_outputs.csv", detected_dir)
+            send({"ok": True, "log": buf.getvalue()})
+        except Exception as e:
+            buf.write(traceback.format_exc())
+            send({"ok": False, "error": f"{type(e).__name__}: {e}", "log": buf.getvalue()})
+
+
+if __name__ == "__main__":
+    _serve()
@@ -0,0 +1,160 @@
+# face_analysis/metrics.py
+#
+# zeitmessung der pipeline-stufen: histogramme (prometheus-format, siehe
+# render()), ein timing.jsonl pro partei mit den stufen-zeiten jedes bildes
+# und eine geglättete ETA (EWMA über den durchsatz).
+#
+# stufen pro bild (batch-stufen werden auf die bilder im batch umgelegt):
+#   normalize, prefilter, csv_write, inference (subprocess/worker), parse,
+#   crops_move, cache_lookup, wait (auf den batch warten), outputs, checkpoint
+
+import json, time, threading
+from collections import defaultdict
+
+# sekunden, grob von "fast nix" bis "sehr langsamer FairFace-aufruf"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_LOCK = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # letzter = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+# stufe -> Histogram (sekunden pro bild)
+STAGES = defaultdict(Histogram)
+# name -> zahl (immer nur hochzählen)
+COUNTERS = defaultdict(float)
+# name -> (hilfetext, funktion die den aktuellen wert liefert)
+GAUGES = {}
+
+
+def observe_stages(zeiten):
+    with _LOCK:
+        for stage, secs in zeiten.items():
+            STAGES[stage].observe(secs)
+
+
+def inc(name, value=1):
+    with _LOCK:
+        COUNTERS[name] += value
+
+
+def register_gauge(name, help_text, fn):
+    """wert wird erst beim abfragen von /metrics geholt"""
+    GAUGES[name] = (help_text, fn)
+
+
+def _fmt(v):
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def render():
+    """alles im prometheus text-format (version 0.0.4)"""
+    zeilen = []
+    with _LOCK:
+        zeilen.append("# HELP fairface_stage_seconds Zeit pro Bild und Pipeline-Stufe")
+        zeilen.append("# TYPE fairface_stage_seconds histogram")
+        for stage in sorted(STAGES):
+            h = STAGES[stage]
+            kumuliert = 0
+            for grenze, n in zip(h.buckets, h.counts):
+                kumuliert += n
+                zeilen.append(f'fairface_stage_seconds_bucket{{stage="{stage}",le="{grenze}"}} {kumuliert}')
+            zeilen.append(f'fairface_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            zeilen.append(f'fairface_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+            zeilen.append(f'fairface_stage_seconds_count{{stage="{stage}"}} {h.count}')
+        for name in sorted(COUNTERS):
+            zeilen.append(f"# TYPE {name} counter")
+            zeilen.append(f"{name} {_fmt(COUNTERS[name])}")
+    for name in sorted(GAUGES):
+        help_text, fn = GAUGES[name]
+        try:
+            wert = fn()
+        except Exception:
+            continue
+        zeilen.append(f"# HELP {name} {help_text}")
+        zeilen.append(f"# TYPE {name} gauge")
+        zeilen.append(f"{name} {_fmt(wert)}")
+    return "\n".join(zeilen) + "\n"
+
+
+class Stopwatch:
+    """sammelt stufen-zeiten: with sw("parse"): ..."""
+
+    def __init__(self):
+        self.zeiten = defaultdict(float)
+
+    def __call__(self, stage):
+        return messen(self.zeiten, stage)
+
+
+class messen:
+    """with messen(zeiten, "outputs"): ... -> zeiten["outputs"] += dauer"""
+
+    def __init__(self, ziel, stage):
+        self.ziel = ziel
+        self.stage = stage
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.ziel[self.stage] = self.ziel.get(self.stage, 0.0) + time.perf_counter() - self.t
+        return False
+
+
+class TimingLog:
+    """timing.jsonl: eine zeile pro bild mit den stufen-zeiten"""
+
+    def __init__(self, pfad, mode="w"):
+        self._f = open(pfad, mode, encoding="utf-8")
+
+    def write(self, image_name, zeiten, **extra):
+        rec = {"image_name": image_name, "ts": round(time.time(), 3),
+               "stages": {k: round(v, 6) for k, v in zeiten.items()}}
+        rec.update(extra)
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._f.close()
+
+
+class EtaSchaetzer:
+    """
+    ETA aus dem geglätteten durchsatz (bilder/s, EWMA). ein messpunkt erst nach
+    min_secs, sonst springt die rate bei batches (viele bilder auf einmal) hin und her.
+    """
+
+    def __init__(self, alpha=0.3, min_secs=1.0):
+        self.alpha = alpha
+        self.min_secs = min_secs
+        self.rate = None
+        self._t = time.monotonic()
+        self._n = 0
+
+    def update(self, neu_fertig=1):
+        self._n += neu_fertig
+        jetzt = time.monotonic()
+        dt = jetzt - self._t
+        if dt >= self.min_secs and self._n:
+            probe = self._n / dt
+            self.rate = probe if self.rate is None else self.alpha * probe + (1 - self.alpha) * self.rate
+            self._t, self._n = jetzt, 0
+
+    def eta(self, remaining):
+        if not self.rate:
+            return None
+        return int(remaining / self.rate)
@@ -0,0 +1,105 @@
+# face_analysis/normalize.py
+#
+# vorverarbeitung vor der erkennung: bild einmal dekodieren, EXIF-drehung
+# anwenden und auf eine maximale kantenlänge verkleinern. die kopie liegt
+# unter data/analysis/_norm/<sha[:2]>/<sha>-<max_side>/<originalname>, damit
+# predict.py die crops weiterhin nach dem originalnamen benennt.
+# bilder, an denen nichts zu tun ist, werden direkt (original) gelesen.
+# die kopien sind nur ein zwischenstand für FairFace (das ergebnis liegt im
+# ergebnis-cache): prune_norm hält _norm unter NORMALIZE_CACHE_MB, die am
+# längsten nicht benutzten fliegen zuerst raus (lru über die mtime).
+
+import os, time, threading
+from PIL import Image, ImageOps
+
+from face_analysis.result_cache import file_sha256
+
+NORM_DIR = os.path.join("data", "analysis", "_norm")
+# FairFace skaliert selbst auf ~800x800 pixel fläche runter, darüber ist nur dekodier-aufwand
+NORMALIZE_MAX_SIDE = int(os.environ.get("NORMALIZE_MAX_SIDE", "1600"))
+NORMALIZE_CACHE_MB = int(os.environ.get("NORMALIZE_CACHE_MB", "1024"))
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def needs_normalize(img, max_side):
+    orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+    return orientation not in (0, 1) or max(img.size) > max_side
+
+
+def normalized_path(pfad, max_side=NORMALIZE_MAX_SIDE, norm_dir=NORM_DIR, sha=None):
+    """
+    pfad, den FairFace lesen soll: das original, oder die normalisierte kopie
+    (wird beim ersten mal erzeugt, absoluter pfad). kaputte bilder ->
+    original, FairFace entscheidet dann wie bisher. sha: sha256 des bilds,
+    falls schon bekannt
+    """
+    if not max_side:
+        return pfad
+    try:
+        with Image.open(pfad) as img:
+            # nur der header ist gelesen, dekodiert wird erst unten
+            if not needs_normalize(img, max_side):
+                return pfad
+            sha = sha or file_sha256(pfad)
+            # absolut wie die originalpfade: FairFace läuft in einem anderen arbeitsordner
+            ziel = os.path.abspath(os.path.join(norm_dir, sha[:2], f"{sha}-{max_side}",
+                                                os.path.basename(pfad))).replace("\\", "/")
+            if os.path.exists(ziel):
+                # benutzt -> fliegt bei prune_norm als letztes raus
+                os.utime(ziel)
+                return ziel
+
+            fmt = img.format or "JPEG"
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            os.makedirs(os.path.dirname(ziel), exist_ok=True)
+            tmp = f"{ziel}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if fmt == "JPEG":
+                img.save(tmp, fmt, quality=95)
+            else:
+                img.save(tmp, fmt)
+        os.replace(tmp, ziel)
+        return ziel
+    except Exception:
+        return pfad
+
+
+def prune_norm(max_bytes=NORMALIZE_CACHE_MB * 1024 * 1024, norm_dir=NORM_DIR):
+    """älteste kopien löschen, bis _norm wieder unter 90% von max_bytes ist"""
+    if not os.path.isdir(norm_dir):
+        return 0
+    kopien = []
+    total = 0
+    for sub in os.scandir(norm_dir):
+        if not sub.is_dir():
+            continue
+        for d in os.scandir(sub.path):
+            for f in os.scandir(d.path) if d.is_dir() else ():
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                kopien.append((st.st_mtime, st.st_size, f.path))
+                total += st.st_size
+    if total <= max_bytes:
+        return 0
+    ziel = int(max_bytes * 0.9)
+    # was gerade ein paralleler lauf benutzt, bleibt liegen
+    grenze = time.time() - 3600
+    entfernt = 0
+    for mtime, size, pfad in sorted(kopien):
+        if total <= ziel or mtime > grenze:
+            break
+        try:
+            os.remove(pfad)
+            # leeren <sha>-<max_side>-ordner gleich mit
+            os.rmdir(os.path.dirname(pfad))
+        except OSError:
+            pass
+        total -= size
+        entfernt += 1
+    return entfernt
@@ -0,0 +1,120 @@
+# face_analysis/outputs.py
+#
+# schreibt die outputs einer partei während der analyse mit (append-only),
+# statt am ende alles nochmal durchzugehen. die summary kommt aus laufenden
+# zählern, die spalten von per_image.csv sind durch die FairFace-labels fest.
+
+import os, csv, json
+from collections import Counter
+
+# label-space von FairFace (fair7 / fair4)
+GENDER_LABELS = ["Female", "Male"]
+RACE_LABELS = ["Black", "East Asian", "Indian", "Latino_Hispanic",
+               "Middle Eastern", "Southeast Asian", "White"]
+RACE4_LABELS = ["Asian", "Black", "Indian", "White"]
+
+FACE_COLUMNS = ["face_file", "race", "race4", "gender", "age"]
+
+
+def per_image_header():
+    header = ["party", "image_name", "created_ts", "created_iso", "faces_total"]
+    header += [f"gender_{k}" for k in GENDER_LABELS] + ["gender_other"]
+    header += [f"race_{k}" for k in RACE_LABELS] + ["race_other"]
+    header += [f"race4_{k}" for k in RACE4_LABELS] + ["race4_other"]
+    header += ["ages_json", "error"]
+    return header
+
+
+def _spalten(counts, labels):
+    # feste spalten + rest (unbekannte labels) in *_other
+    werte = [counts.get(k, 0) for k in labels]
+    werte.append(sum(v for k, v in counts.items() if k not in labels))
+    return werte
+
+
+class PartyOutputs:
+    """per_image.jsonl/.csv, predictions.csv/.json und summary.json einer partei"""
+
+    def __init__(self, out_dir, party_name, total):
+        self.out_dir = out_dir
+        self.party = party_name
+        self.total = total
+        self.pred_csv = os.path.join(out_dir, "predictions.csv")
+
+        self.images_processed = 0
+        self.faces_total = 0
+        self.by_gender = Counter()
+        self.by_race = Counter()
+        self.duplicates_excluded = 0
+
+        self._jsonl = open(os.path.join(out_dir, "per_image.jsonl"), "w", encoding="utf-8")
+        self._img_csv_f = open(os.path.join(out_dir, "per_image.csv"), "w", newline="", encoding="utf-8")
+        self._img_csv = csv.writer(self._img_csv_f)
+        self._img_csv.writerow(per_image_header())
+        self._pred_csv_f = open(self.pred_csv, "w", newline="", encoding="utf-8")
+        self._pred_csv = csv.writer(self._pred_csv_f)
+        self._pred_csv.writerow(FACE_COLUMNS)
+        self._pred_json = open(os.path.join(out_dir, "predictions.json"), "w", encoding="utf-8")
+        self._json_faces = 0
+
+    def add(self, rec, face_rows, zaehlt=True):
+        self._jsonl.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+        row = [
+            rec["party"], rec["image_name"], rec["created_ts"] or "",
+            rec["created_iso"] or "", rec["faces_total"]
+        ]
+        row += _spalten(rec["genders"], GENDER_LABELS)
+        row += _spalten(rec["races"], RACE_LABELS)
+        row += _spalten(rec["races4"], RACE4_LABELS)
+        row += [json.dumps(rec["ages"], ensure_ascii=False), rec["error"] or ""]
+        self._img_csv.writerow(row)
+
+        for face in face_rows:
+            self._pred_csv.writerow([face[c] for c in FACE_COLUMNS])
+            # gleiche formatierung wie json.dump(liste, indent=2)
+            teil = json.dumps(face, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            self._pred_json.write(("[\n  " if self._json_faces == 0 else ",\n  ") + teil)
+            self._json_faces += 1
+
+        self.images_processed += 1
+        if not zaehlt:
+            # duplikat, steht in den dateien, aber nicht in der summary
+            self.duplicates_excluded += 1
+            return
+        self.faces_total += rec["faces_total"]
+        self.by_gender.update(rec["genders"])
+        self.by_race.update(rec["races"])
+
+    def flush(self):
+        for f in (self._jsonl, self._img_csv_f, self._pred_csv_f, self._pred_json):
+            f.flush()
+
+    def summary(self):
+        summary = {
+            "party": self.party,
+            "total_images": self.total,
+            "images_processed": self.images_processed,
+            "faces_total": int(self.faces_total),
+            "by_gender": dict(self.by_gender),
+            "by_race": dict(self.by_race)
+        }
+        if self.duplicates_excluded:
+            summary["duplicates_excluded"] = self.duplicates_excluded
+        return summary
+
+    def abort(self):
+        """lauf angehalten: nur zumachen, keine summary"""
+        for f in (self._jsonl, self._img_csv_f, self._pred_csv_f, self._pred_json):
+            f.close()
+
+    def close(self, **extra):
+        """dateien zumachen und summary.json schreiben, gibt die summary zurück"""
+        self._pred_json.write("\n]" if self._json_faces else "[]")
+        for f in (self._jsonl, self._img_csv_f, self._pred_csv_f, self._pred_json):
+            f.close()
+        summary = self.summary()
+        summary.update(extra)
+        with open(os.path.join(self.out_dir, "summary.json"), "w", encoding="utf-8") as fp:
+            json.dump(summary, fp, indent=2, ensure_ascii=False)
+        return summary
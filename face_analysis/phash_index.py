@@ -0,0 +1,191 @@
+# face_analysis/phash_index.py
+#
+# perceptual-hash index (dHash, 64 bit) über alle analysierten bilder, auch
+# über parteigrenzen hinweg. findet reposts und gleiche pressefotos, auch wenn
+# sie neu komprimiert oder leicht skaliert sind. nachbarsuche über einen
+# BK-tree (hamming-abstand) im speicher, die hashes liegen in sqlite:
+#   data/analysis/_phash.sqlite
+#
+# "original" ist immer das bild, das zuerst im index gelandet ist.
+
+import os, sqlite3, threading
+from PIL import Image
+
+PHASH_DB = os.path.join("data", "analysis", "_phash.sqlite")
+PHASH_MAX_DIST = int(os.environ.get("PHASH_MAX_DIST", "4"))
+
+# "off" = aus, "reuse" = ergebnis des originals übernehmen und duplicate_of setzen,
+# "exclude" = wie reuse, duplikate zählen aber nicht in summary/trends
+MODES = ("off", "reuse", "exclude")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    party TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    dhash INTEGER NOT NULL,
+    sha TEXT
+);
+CREATE INDEX IF NOT EXISTS phashes_party ON phashes(party);
+"""
+
+
+def dhash(pfad, size=8):
+    """difference hash: graustufen (size+1)x size, nachbarpixel vergleichen"""
+    with Image.open(pfad) as img:
+        img.draft("L", (4 * (size + 1), 4 * size))  # jpeg: gleich klein dekodieren
+        klein = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+        px = list(klein.getdata())
+    h = 0
+    for y in range(size):
+        zeile = px[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            h = (h << 1) | (zeile[x] > zeile[x + 1])
+    return h
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# sqlite kann nur signed 64 bit
+def _to_db(h):
+    return h - (1 << 63)
+
+
+def _from_db(v):
+    return v + (1 << 63)
+
+
+class BKTree:
+    """BK-tree über hamming-abstände, knoten = [hash, [ids], {abstand: kind}]"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, h, item):
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            kind = node[2].get(d)
+            if kind is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = kind
+
+    def search(self, h, max_dist):
+        """[(abstand, item)] aller einträge mit abstand <= max_dist"""
+        treffer = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_dist:
+                treffer.extend((d, item) for item in node[1])
+            for kd, kind in node[2].items():
+                if d - max_dist <= kd <= d + max_dist:
+                    stack.append(kind)
+        return treffer
+
+
+class PhashIndex:
+    def __init__(self, db_path=PHASH_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self.tree = BKTree()
+        # id -> (path, party, dhash, sha) vom aktuellen stand; alte baum-knoten
+        # (bild hat sich geändert) fallen beim nachschlagen raus
+        self.eintraege = {}
+        self.ids = {}
+        for i, path, party, h, sha in self._db.execute("SELECT id, path, party, dhash, sha FROM phashes"):
+            h = _from_db(h)
+            self.eintraege[i] = (path, party, h, sha)
+            self.ids[path] = i
+            self.tree.add(h, i)
+
+    def add_image(self, pfad, party=None, sha=None):
+        """hash holen (oder berechnen, wenn bild neu/geändert) -> (id, dhash)"""
+        pfad = os.path.abspath(pfad)
+        st = os.stat(pfad)
+        with self._lock:
+            row = self._db.execute("SELECT id, size, mtime_ns, dhash, sha FROM phashes WHERE path=?",
+                                   (pfad,)).fetchone()
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            i, h = row[0], _from_db(row[3])
+            if sha and sha != row[4]:
+                with self._lock:
+                    self._db.execute("UPDATE phashes SET sha=? WHERE id=?", (sha, i))
+                    self._db.commit()
+                    self.eintraege[i] = (pfad, party, h, sha)
+            return i, h
+
+        h = dhash(pfad)
+        with self._lock:
+            if row:
+                i = row[0]
+                self._db.execute("UPDATE phashes SET party=?, size=?, mtime_ns=?, dhash=?, sha=? WHERE id=?",
+                                 (party, st.st_size, st.st_mtime_ns, _to_db(h), sha, i))
+            else:
+                cur = self._db.execute(
+                    "INSERT INTO phashes (path, party, size, mtime_ns, dhash, sha) VALUES (?, ?, ?, ?, ?, ?)",
+                    (pfad, party, st.st_size, st.st_mtime_ns, _to_db(h), sha))
+                i = cur.lastrowid
+            self._db.commit()
+            self.eintraege[i] = (pfad, party, h, sha)
+            self.ids[pfad] = i
+            self.tree.add(h, i)
+        return i, h
+
+    def find_original(self, own_id, h, max_dist=PHASH_MAX_DIST, prefer_party=None):
+        """
+        ältestes ähnlichstes bild, das vor own_id im index war (und noch da ist)
+        -> {"path", "party", "sha", "dist"} oder None. prefer_party: bilder
+        dieser partei gehen vor (egal wie alt die aus anderen sind)
+        """
+        with self._lock:
+            treffer = self.tree.search(h, max_dist)
+            kandidaten = {}
+            for _, i in treffer:
+                if i >= own_id or i not in self.eintraege:
+                    continue
+                # abstand zum aktuellen hash, knoten von geänderten bildern sind veraltet
+                path, party, aktuell, sha = self.eintraege[i]
+                d = hamming(aktuell, h)
+                if d <= max_dist:
+                    kandidaten[i] = (prefer_party is not None and party != prefer_party, d, i, path, party, sha)
+        for _, d, i, path, party, sha in sorted(kandidaten.values()):
+            if os.path.exists(path):
+                return {"path": path, "party": party, "sha": sha, "dist": d}
+        return None
+
+    def forget_party(self, party):
+        with self._lock:
+            ids = [r[0] for r in self._db.execute("SELECT id FROM phashes WHERE party=?", (party,))]
+            self._db.execute("DELETE FROM phashes WHERE party=?", (party,))
+            self._db.commit()
+            for i in ids:
+                path = self.eintraege.pop(i, (None,))[0]
+                self.ids.pop(path, None)
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = PhashIndex()
+        return _INDEX
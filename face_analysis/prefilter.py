@@ -0,0 +1,89 @@
+# face_analysis/prefilter.py
+#
+# schneller vorfilter vor FairFace: HOG-gesichtssuche (face_recognition) auf
+# einer verkleinerten kopie. bilder ohne kandidat (text-grafiken, slogans,
+# landschaften) brauchen den teuren FairFace-aufruf nicht.
+# face_recognition ist optional, ohne wird nicht gefiltert.
+
+import os, time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    import face_recognition
+except ImportError:  # pragma: no cover - optional
+    face_recognition = None
+
+# "off" = aus, "on" = bilder ohne kandidat überspringen,
+# "verify" = trotzdem FairFace laufen lassen und abweichungen zählen
+MODES = ("off", "on", "verify")
+PREFILTER_SIDE = int(os.environ.get("PREFILTER_SIDE", "640"))
+PREFILTER_UPSAMPLE = int(os.environ.get("PREFILTER_UPSAMPLE", "1"))
+
+
+def available():
+    return face_recognition is not None
+
+
+def has_face_candidate(pfad, max_side=PREFILTER_SIDE, upsample=PREFILTER_UPSAMPLE):
+    """True, wenn der HOG-detektor auf der verkleinerten kopie etwas findet"""
+    with Image.open(pfad) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        arr = np.asarray(img.convert("RGB"))
+    return len(face_recognition.face_locations(arr, number_of_times_to_upsample=upsample, model="hog")) > 0
+
+
+def check(pfade):
+    """
+    vorfilter für mehrere bilder -> ({pfad: kandidat}, sekunden).
+    kaputte bilder zählen als kandidat, dann entscheidet FairFace.
+    """
+    start = time.perf_counter()
+    kandidaten = {}
+    for pfad in pfade:
+        try:
+            kandidaten[pfad] = has_face_candidate(pfad)
+        except Exception:
+            kandidaten[pfad] = True
+    return kandidaten, time.perf_counter() - start
+
+
+class PrefilterStats:
+    """zähler für progress und summary.json"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.checked = 0
+        self.skipped = 0
+        self.secs = 0.0
+        # nur im verify-modus: vorfilter sagt leer, FairFace findet gesichter
+        self.missed = 0
+        # vorfilter findet was, FairFace nicht
+        self.extra = 0
+
+    def add(self, kandidat, faces_total):
+        self.checked += 1
+        if not kandidat:
+            self.skipped += 1
+        if self.mode == "verify":
+            if not kandidat and faces_total > 0:
+                self.missed += 1
+            elif kandidat and faces_total == 0:
+                self.extra += 1
+
+    def as_dict(self):
+        d = {
+            "mode": self.mode,
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.checked, 4) if self.checked else 0.0,
+            "secs": round(self.secs, 3),
+            "ms_per_image": round(1000 * self.secs / self.checked, 1) if self.checked else 0.0,
+        }
+        if self.mode == "verify":
+            d["missed"] = self.missed
+            d["extra"] = self.extra
+            d["disagreement_rate"] = round((self.missed + self.extra) / self.checked, 4) if self.checked else 0.0
+        return d
@@ -0,0 +1,108 @@
+# face_analysis/progress.py
+#
+# fortschritt der analysen. der aktuelle stand liegt im speicher (PROGRESS),
+# progress.json ist nur noch ein snapshot für andere prozesse / nach neustart:
+# höchstens alle paar sekunden, atomar (tmp-datei + os.replace), ohne bilddaten.
+# die vorschau ist nur eine url (siehe preview_url), kein base64 mehr.
+
+import os, json, time, threading
+from urllib.parse import quote
+
+PROGRESS = {}
+_LOCK = threading.Lock()
+# wird bei jeder änderung hochgezählt, die app schickt nur bei neuem stand etwas
+_VERSION = [0]
+
+# status-wechsel werden immer sofort geschrieben, sonst max. einmal pro intervall
+SNAPSHOT_SECS = 2.0
+
+
+def progress_path(party):
+    return os.path.join("data", "analysis", party, "progress.json")
+
+
+def preview_url(party, image_name):
+    """url der vorschau, wird von der dash-app ausgeliefert"""
+    return f"/preview/{quote(party)}/{quote(image_name)}"
+
+
+def write_json_atomic(pfad, data):
+    os.makedirs(os.path.dirname(pfad), exist_ok=True)
+    tmp = f"{pfad}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False)
+    os.replace(tmp, pfad)
+
+
+class ProgressChannel:
+    def __init__(self, party, snapshot_secs=SNAPSHOT_SECS):
+        self.party = party
+        self.pfad = progress_path(party)
+        self.snapshot_secs = snapshot_secs
+        self._last_write = 0.0
+        self.state = {"party": party, "ts": int(time.time())}
+        with _LOCK:
+            PROGRESS[party] = self.state
+
+    def update(self, **kw):
+        with _LOCK:
+            # im lock lesen, sonst überholt ein gleichzeitiges mark_error/finish
+            status_alt = self.state.get("status")
+            self.state.update(kw)
+            self.state["ts"] = int(time.time())
+            _VERSION[0] += 1
+        if ("status" in kw and kw["status"] != status_alt) or time.time() - self._last_write >= self.snapshot_secs:
+            self.flush()
+
+    def flush(self):
+        with _LOCK:
+            data = dict(self.state)
+        write_json_atomic(self.pfad, data)
+        self._last_write = time.time()
+
+
+def snapshot():
+    """(version, {partei: stand}) aller läufe dieses prozesses in einem rutsch"""
+    with _LOCK:
+        return _VERSION[0], {party: dict(state) for party, state in PROGRESS.items()}
+
+
+def read_progress(party):
+    """stand aus dem speicher, sonst der letzte snapshot auf platte (oder None)"""
+    with _LOCK:
+        state = PROGRESS.get(party)
+        if state is not None:
+            return dict(state)
+    pfad = progress_path(party)
+    if not os.path.exists(pfad):
+        return None
+    try:
+        with open(pfad, encoding="utf-8") as fp:
+            return json.load(fp)
+    except Exception:
+        return None
+
+
+def forget(party, keep_running=False):
+    """
+    stand einer partei aus dem speicher nehmen (partei gelöscht, neuer lauf
+    eingereiht). keep_running: einen laufenden lauf nicht anfassen, sein
+    kanal schreibt weiter in den eintrag. gibt zurück, ob etwas entfernt wurde
+    """
+    with _LOCK:
+        state = PROGRESS.get(party)
+        if state is None or (keep_running and state.get("status") == "running"):
+            return False
+        del PROGRESS[party]
+        _VERSION[0] += 1
+        return True
+
+
+def mark_error(party, message):
+    """job ist mit exception ausgestiegen -> status error (speicher + snapshot)"""
+    with _LOCK:
+        state = PROGRESS.setdefault(party, {"party": party})
+        state.update(status="error", message=message, ts=int(time.time()))
+        _VERSION[0] += 1
+        data = dict(state)
+    write_json_atomic(progress_path(party), data)
@@ -0,0 +1,170 @@
+# face_analysis/result_cache.py
+#
+# persistenter ergebnis-cache: schlüssel = sha256 vom bildinhalt + modellversion.
+# gespeichert werden die face rows von FairFace, die zählwerte fürs per-image
+# record und die crops (als hardlinks). liegt in sqlite, alte einträge fliegen
+# raus wenn der cache größer als max_bytes wird (lru).
+
+import os, json, time, shutil, sqlite3, hashlib, threading
+
+CACHE_DIR = os.path.join("data", "analysis", "_cache")
+DEFAULT_MAX_MB = 2048
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    sha TEXT NOT NULL,
+    model TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(pfad):
+    h = hashlib.sha256()
+    with open(pfad, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def model_version(fairface_dir):
+    """
+    version vom modell: predict.py + größe/mtime der gewichte.
+    neue gewichte oder ein geändertes predict.py -> neue cache-keys.
+    """
+    h = hashlib.sha1()
+    predict_py = os.path.join(fairface_dir, "predict.py")
+    if os.path.isfile(predict_py):
+        h.update(file_sha256(predict_py).encode())
+    for sub in ("fair_face_models", "dlib_models"):
+        d = os.path.join(fairface_dir, sub)
+        if not os.path.isdir(d):
+            continue
+        for name in sorted(os.listdir(d)):
+            st = os.stat(os.path.join(d, name))
+            h.update(f"{sub}/{name}:{st.st_size}:{int(st.st_mtime)}".encode())
+    return "fairface-" + h.hexdigest()[:16]
+
+
+def _json_default(o):
+    # numpy-zahlen aus pandas
+    if hasattr(o, "item"):
+        return o.item()
+    return str(o)
+
+
+class ResultCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=None):
+        self.dir = cache_dir
+        self.crops_dir = os.path.join(cache_dir, "crops")
+        os.makedirs(self.crops_dir, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("RESULT_CACHE_MB") or DEFAULT_MAX_MB) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "results.sqlite"),
+                                   check_same_thread=False, timeout=30)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def image_hash(self, pfad):
+        """sha256 vom bild, gemerkt über pfad+größe+mtime (kein neu-lesen)"""
+        st = os.stat(pfad)
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, sha FROM hashes WHERE path=?", (pfad,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        sha = file_sha256(pfad)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                             (pfad, st.st_size, st.st_mtime_ns, sha))
+            self._db.commit()
+        return sha
+
+    def get(self, sha, model):
+        """gibt {"faces": [...], "counts": {...}, "crops": dir} zurück oder None"""
+        key = f"{sha}:{model}"
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM results WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE results SET last_used=? WHERE key=?", (time.time(), key))
+            self._db.commit()
+        entry = json.loads(row[0])
+        entry["crops"] = os.path.join(self.crops_dir, sha[:2], key.replace(":", "_"))
+        return entry
+
+    def put(self, sha, model, faces, counts, crop_files=()):
+        """face rows + zählwerte ablegen, crops werden hardgelinkt (sonst kopiert)"""
+        key = f"{sha}:{model}"
+        crops = os.path.join(self.crops_dir, sha[:2], key.replace(":", "_"))
+        if os.path.isdir(crops):
+            shutil.rmtree(crops, ignore_errors=True)
+        size = 0
+        if crop_files:
+            os.makedirs(crops, exist_ok=True)
+            for src in crop_files:
+                dst = os.path.join(crops, os.path.basename(src))
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+                size += os.path.getsize(dst)
+
+        payload = json.dumps({"faces": faces, "counts": counts},
+                             ensure_ascii=False, default=_json_default)
+        size += len(payload.encode("utf-8"))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, sha, model, payload, size, time.time()))
+            self._db.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        """älteste einträge löschen bis der cache wieder unter 90% von max_bytes ist"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        ziel = int(self.max_bytes * 0.9)
+        entfernt = 0
+        with self._lock:
+            rows = self._db.execute("SELECT key, sha, size FROM results ORDER BY last_used").fetchall()
+            for key, sha, size in rows:
+                if total <= ziel:
+                    break
+                self._db.execute("DELETE FROM results WHERE key=?", (key,))
+                shutil.rmtree(os.path.join(self.crops_dir, sha[:2], key.replace(":", "_")),
+                              ignore_errors=True)
+                total -= size
+                entfernt += 1
+            self._db.commit()
+        return entfernt
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache()
+        return _CACHE
@@ -0,0 +1,196 @@
+# face_analysis/result_store.py
+#
+# spaltenbasierter ergebnis-speicher (parquet), partitioniert nach partei und
+# monat von created_ts:
+#   data/analysis/_store/faces/party=SPD/month=2021-05/part-....parquet
+#   data/analysis/_store/images/party=SPD/month=unknown/part-....parquet
+# ein lauf schreibt erst in einen staging-ordner und tauscht am ende die
+# partitionen der partei aus. pyarrow ist optional, ohne wird nichts geschrieben.
+#
+# lesen z.b. so:
+#   load_faces(columns=["gender", "race"], parties=["SPD"])
+
+import os, re, shutil, time, uuid
+from datetime import datetime, timezone
+
+from face_analysis.outputs import GENDER_LABELS, RACE_LABELS, RACE4_LABELS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional
+    pa = None
+    pq = None
+
+STORE_DIR = os.path.join("data", "analysis", "_store")
+FLUSH_ROWS = 50_000
+
+_AGE_BIN = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)|\+)?\s*$")
+
+if pa is not None:
+    FACE_SCHEMA = pa.schema([
+        ("image_name", pa.string()),
+        ("face_file", pa.string()),
+        ("created_ts", pa.timestamp("s", tz="UTC")),
+        ("gender", pa.dictionary(pa.int8(), pa.string())),
+        ("race", pa.dictionary(pa.int8(), pa.string())),
+        ("race4", pa.dictionary(pa.int8(), pa.string())),
+        ("age", pa.dictionary(pa.int8(), pa.string())),
+        ("age_min", pa.int16()),
+        ("age_max", pa.int16()),
+    ])
+    IMAGE_SCHEMA = pa.schema(
+        [
+            ("image_name", pa.string()),
+            ("created_ts", pa.timestamp("s", tz="UTC")),
+            ("faces_total", pa.int32()),
+        ]
+        + [(f"gender_{k}", pa.int32()) for k in GENDER_LABELS]
+        + [(f"race_{k}", pa.int32()) for k in RACE_LABELS]
+        + [(f"race4_{k}", pa.int32()) for k in RACE4_LABELS]
+        + [
+            # altersklassen der gesichter wie von FairFace, dazu die spanne als zahl
+            # (age_max leer, wenn eine klasse nach oben offen ist, z.b. "70+")
+            ("ages", pa.list_(pa.dictionary(pa.int8(), pa.string()))),
+            ("age_min", pa.int16()),
+            ("age_max", pa.int16()),
+            ("error", pa.string()),
+        ]
+    )
+    # hive-partitionen; ältere dateien ohne neue spalten lesen sich damit als leer
+    _PARTITION_FIELDS = [("party", pa.string()), ("month", pa.string())]
+
+
+def available():
+    return pa is not None
+
+
+def month_of(ts):
+    if not ts:
+        return "unknown"
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m")
+
+
+def age_range(age):
+    """FairFace-altersklasse ('30-39', '70+', '3-9') oder zahl -> (min, max)"""
+    if isinstance(age, (int, float)) and age == age:
+        return int(age), int(age)
+    m = _AGE_BIN.match(str(age)) if age is not None else None
+    if not m:
+        return None, None
+    lo = int(m.group(1))
+    if m.group(2):
+        return lo, int(m.group(2))
+    return lo, None if "+" in str(age) else lo
+
+
+class PartyStore:
+    """sammelt die zeilen einer partei und schreibt sie monatsweise als parquet"""
+
+    def __init__(self, party, store_dir=STORE_DIR):
+        self.party = party
+        self.store_dir = store_dir
+        self.run_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.staging = os.path.join(store_dir, "_staging", self.run_id)
+        self._faces = {}
+        self._images = {}
+        self._rows = 0
+        self._part = 0
+
+    def add(self, rec, face_rows):
+        ts = rec.get("created_ts")
+        month = month_of(ts)
+
+        img = {"image_name": rec["image_name"], "created_ts": ts,
+               "faces_total": rec["faces_total"], "error": rec.get("error")}
+        for k in GENDER_LABELS:
+            img[f"gender_{k}"] = rec["genders"].get(k, 0)
+        for k in RACE_LABELS:
+            img[f"race_{k}"] = rec["races"].get(k, 0)
+        for k in RACE4_LABELS:
+            img[f"race4_{k}"] = rec["races4"].get(k, 0)
+        ages = [a for a in rec.get("ages") or [] if a is not None and a == a and a != ""]
+        spannen = [age_range(a) for a in ages]
+        spannen = [(lo, hi) for lo, hi in spannen if lo is not None]
+        img["ages"] = [str(int(a)) if isinstance(a, float) and a.is_integer() else str(a) for a in ages]
+        img["age_min"] = min(lo for lo, _ in spannen) if spannen else None
+        img["age_max"] = (None if not spannen or any(hi is None for _, hi in spannen)
+                          else max(hi for _, hi in spannen))
+        self._images.setdefault(month, []).append(img)
+
+        for face in face_rows:
+            lo, hi = age_range(face.get("age"))
+            self._faces.setdefault(month, []).append({
+                "image_name": rec["image_name"],
+                "face_file": face["face_file"],
+                "created_ts": ts,
+                "gender": face["gender"] or None,
+                "race": face["race"] or None,
+                "race4": face["race4"] or None,
+                "age": None if face.get("age") in (None, "") else str(face["age"]),
+                "age_min": lo,
+                "age_max": hi,
+            })
+        self._rows += 1 + len(face_rows)
+        if self._rows >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        for art, puffer, schema in (("faces", self._faces, FACE_SCHEMA),
+                                    ("images", self._images, IMAGE_SCHEMA)):
+            for month, rows in puffer.items():
+                if not rows:
+                    continue
+                ziel = os.path.join(self.staging, art, f"party={self.party}", f"month={month}")
+                os.makedirs(ziel, exist_ok=True)
+                table = pa.Table.from_pylist(rows, schema=schema)
+                pq.write_table(table, os.path.join(ziel, f"part-{self.run_id}-{self._part}.parquet"),
+                               compression="zstd")
+            puffer.clear()
+        self._part += 1
+        self._rows = 0
+
+    def commit(self):
+        """rest schreiben und die alten partitionen der partei ersetzen"""
+        self.flush()
+        for art in ("faces", "images"):
+            alt = os.path.join(self.store_dir, art, f"party={self.party}")
+            neu = os.path.join(self.staging, art, f"party={self.party}")
+            if os.path.isdir(alt):
+                shutil.rmtree(alt, ignore_errors=True)
+            if os.path.isdir(neu):
+                os.makedirs(os.path.dirname(alt), exist_ok=True)
+                shutil.move(neu, alt)
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def _load(art, schema, columns=None, parties=None, months=None, store_dir=STORE_DIR):
+    pfad = os.path.join(store_dir, art)
+    if pa is None or not os.path.isdir(pfad):
+        return None
+    filters = []
+    if parties:
+        filters.append(("party", "in", list(parties)))
+    if months:
+        filters.append(("month", "in", list(months)))
+    schema = pa.schema(list(schema) + [pa.field(n, t) for n, t in _PARTITION_FIELDS])
+    table = pq.read_table(pfad, columns=columns, filters=filters or None,
+                          partitioning="hive", schema=schema)
+    return table.to_pandas()
+
+
+def load_faces(columns=None, parties=None, months=None, store_dir=STORE_DIR):
+    """gesichter als DataFrame, nur die gewünschten spalten/partitionen werden gelesen"""
+    if pa is None:
+        return None
+    return _load("faces", FACE_SCHEMA, columns, parties, months, store_dir)
+
+
+def load_images(columns=None, parties=None, months=None, store_dir=STORE_DIR):
+    """bilder als DataFrame, nur die gewünschten spalten/partitionen werden gelesen"""
+    if pa is None:
+        return None
+    return _load("images", IMAGE_SCHEMA, columns, parties, months, store_dir)
@@ -0,0 +1,387 @@
+# face_analysis/results_db.py
+#
+# sqlite-index über alle analyse-ergebnisse (WAL-modus): parteien mit ihren
+# summaries, bilder, gesichter und job-status. die pipeline schreibt hier
+# transaktional mit, die dash-callbacks lesen aggregate per sql statt
+# verzeichnisse zu durchsuchen und json zu parsen.
+#
+# bilder/gesichter tragen die run_id des laufs. erst wenn ein lauf fertig ist,
+# wird in einer transaktion auf den neuen lauf umgeschaltet.
+#
+# trends: zähler pro partei und zeit-bucket (tag/woche/monat aus created_ts),
+# werden pro bild hochgezählt. metriken: images, faces, gender:<label>,
+# race:<label>, race4:<label>, age:<klasse>.
+
+import os, json, time, uuid, sqlite3, threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+DB_PATH = os.path.join("data", "analysis", "_index.sqlite")
+FLUSH_ROWS = 500
+GRAINS = ("day", "week", "month")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parties (
+    party TEXT PRIMARY KEY,
+    run_id TEXT,
+    total_images INTEGER NOT NULL DEFAULT 0,
+    images_processed INTEGER NOT NULL DEFAULT 0,
+    faces_total INTEGER NOT NULL DEFAULT 0,
+    average_age REAL,
+    summary_path TEXT,
+    summary_mtime REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS party_counts (
+    party TEXT NOT NULL,
+    dim TEXT NOT NULL,
+    label TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    PRIMARY KEY (party, dim, label)
+);
+CREATE TABLE IF NOT EXISTS images (
+    party TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    image_name TEXT NOT NULL,
+    created_ts INTEGER,
+    faces_total INTEGER NOT NULL,
+    error TEXT,
+    PRIMARY KEY (party, run_id, image_name)
+);
+CREATE INDEX IF NOT EXISTS images_ts ON images(party, created_ts);
+CREATE TABLE IF NOT EXISTS faces (
+    party TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    image_name TEXT NOT NULL,
+    face_file TEXT,
+    gender TEXT,
+    race TEXT,
+    race4 TEXT,
+    age TEXT
+);
+CREATE INDEX IF NOT EXISTS faces_party ON faces(party, run_id);
+CREATE INDEX IF NOT EXISTS faces_gender ON faces(party, gender);
+CREATE INDEX IF NOT EXISTS faces_race ON faces(party, race);
+CREATE TABLE IF NOT EXISTS trends (
+    party TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    grain TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (party, run_id, grain, bucket, metric)
+);
+CREATE INDEX IF NOT EXISTS trends_grain ON trends(grain, metric, bucket);
+CREATE TABLE IF NOT EXISTS jobs (
+    party TEXT PRIMARY KEY,
+    run_id TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    finished_at REAL
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialised = set()
+
+
+def connect(db_path=DB_PATH):
+    """eine verbindung pro thread (sqlite-objekte dürfen nicht zwischen threads wandern)"""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if db_path not in _initialised:
+                conn.executescript(_SCHEMA)
+                conn.commit()
+                _initialised.add(db_path)
+        conns[db_path] = conn
+    return conn
+
+
+def buckets(ts):
+    """created_ts -> {grain: bucket}; woche = montag der ISO-woche"""
+    d = datetime.fromtimestamp(int(ts), tz=timezone.utc).date()
+    return {
+        "day": d.isoformat(),
+        "week": (d - timedelta(days=d.weekday())).isoformat(),
+        "month": d.strftime("%Y-%m"),
+    }
+
+
+def trend_metrics(rec):
+    """zähler eines bildes (rec wie in per_image.jsonl)"""
+    m = Counter(images=1, faces=int(rec.get("faces_total", 0) or 0))
+    for dim, key in (("gender", "genders"), ("race", "races"), ("race4", "races4")):
+        for label, n in (rec.get(key) or {}).items():
+            m[f"{dim}:{label}"] += int(n)
+    for age in rec.get("ages") or []:
+        m[f"age:{age}"] += 1
+    return m
+
+
+def _add_trends(puffer, rec):
+    ts = rec.get("created_ts")
+    if not ts:
+        return
+    metrics = trend_metrics(rec)
+    for grain, bucket in buckets(ts).items():
+        for metric, n in metrics.items():
+            puffer[(grain, bucket, metric)] += n
+
+
+def _write_trends(conn, party, run_id, puffer):
+    conn.executemany(
+        """INSERT INTO trends VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(party, run_id, grain, bucket, metric) DO UPDATE SET n = n + excluded.n""",
+        [(party, run_id, g, b, m, n) for (g, b, m), n in puffer.items()])
+
+
+def _write_summary(conn, party, run_id, summary, summary_path=None):
+    # parties + party_counts aus einer summary (dict wie in summary.json)
+    mtime = os.path.getmtime(summary_path) if summary_path and os.path.exists(summary_path) else None
+    conn.execute(
+        """INSERT INTO parties (party, run_id, total_images, images_processed, faces_total,
+                                average_age, summary_path, summary_mtime, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(party) DO UPDATE SET
+               run_id=excluded.run_id, total_images=excluded.total_images,
+               images_processed=excluded.images_processed, faces_total=excluded.faces_total,
+               average_age=excluded.average_age, summary_path=excluded.summary_path,
+               summary_mtime=excluded.summary_mtime, updated_at=excluded.updated_at""",
+        (party, run_id,
+         int(summary.get("total_images", 0) or 0),
+         int(summary.get("images_processed", 0) or 0),
+         int(summary.get("faces_total", 0) or 0),
+         summary.get("average_age"),
+         summary_path, mtime, time.time()))
+    conn.execute("DELETE FROM party_counts WHERE party=?", (party,))
+    for dim, key in (("gender", "by_gender"), ("race", "by_race"), ("race4", "by_race4")):
+        for pos, (label, n) in enumerate((summary.get(key) or {}).items()):
+            conn.execute("INSERT INTO party_counts VALUES (?, ?, ?, ?, ?)",
+                         (party, dim, label, int(n or 0), pos))
+
+
+class RunWriter:
+    """schreibt einen analyse-lauf einer partei in den index"""
+
+    def __init__(self, party, total, db_path=DB_PATH):
+        self.party = party
+        self.db_path = db_path
+        self.run_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self._images = []
+        self._faces = []
+        self._trends = Counter()
+        self.done = 0
+        conn = connect(db_path)
+        with conn:
+            # reste von abgebrochenen läufen weg
+            conn.execute("DELETE FROM images WHERE party=? AND run_id NOT IN "
+                         "(SELECT COALESCE(run_id, '') FROM parties WHERE party=?)", (party, party))
+            conn.execute("DELETE FROM faces WHERE party=? AND run_id NOT IN "
+                         "(SELECT COALESCE(run_id, '') FROM parties WHERE party=?)", (party, party))
+            conn.execute("DELETE FROM trends WHERE party=? AND run_id NOT IN "
+                         "(SELECT COALESCE(run_id, '') FROM parties WHERE party=?)", (party, party))
+            conn.execute(
+                """INSERT OR REPLACE INTO jobs (party, run_id, status, message, done, total, started_at, finished_at)
+                   VALUES (?, ?, 'running', '', 0, ?, ?, NULL)""",
+                (party, self.run_id, total, time.time()))
+
+    def add(self, rec, face_rows, zaehlt=True):
+        self._images.append((self.party, self.run_id, rec["image_name"], rec.get("created_ts"),
+                             rec["faces_total"], rec.get("error")))
+        for face in face_rows:
+            age = face.get("age")
+            self._faces.append((self.party, self.run_id, rec["image_name"], face["face_file"],
+                                face["gender"], face["race"], face["race4"],
+                                None if age in (None, "") else str(age)))
+        if zaehlt:
+            _add_trends(self._trends, rec)
+        self.done += 1
+        if len(self._images) + len(self._faces) >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        conn = connect(self.db_path)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)", self._images)
+            conn.executemany("INSERT INTO faces VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._faces)
+            _write_trends(conn, self.party, self.run_id, self._trends)
+            conn.execute("UPDATE jobs SET done=? WHERE party=? AND run_id=?",
+                         (self.done, self.party, self.run_id))
+        self._images, self._faces = [], []
+        self._trends.clear()
+
+    def commit(self, summary, summary_path=None):
+        """lauf fertig: in einer transaktion auf die neuen daten umschalten"""
+        self.flush()
+        conn = connect(self.db_path)
+        with conn:
+            conn.execute("DELETE FROM images WHERE party=? AND run_id<>?", (self.party, self.run_id))
+            conn.execute("DELETE FROM faces WHERE party=? AND run_id<>?", (self.party, self.run_id))
+            conn.execute("DELETE FROM trends WHERE party=? AND run_id<>?", (self.party, self.run_id))
+            _write_summary(conn, self.party, self.run_id, summary, summary_path)
+            conn.execute("UPDATE jobs SET status='done', message='', done=total, finished_at=? WHERE party=?",
+                         (time.time(), self.party))
+
+    def fail(self, message, status="error"):
+        """
+        lauf endet ohne umschalten (fehler oder angehalten): zeilen dieses
+        laufs (gepuffert und schon geschrieben) weg, job-status setzen
+        """
+        self._images, self._faces = [], []
+        self._trends.clear()
+        conn = connect(self.db_path)
+        with conn:
+            for tabelle in ("images", "faces", "trends"):
+                conn.execute(f"DELETE FROM {tabelle} WHERE party=? AND run_id=?", (self.party, self.run_id))
+        set_job_status(self.party, status, message, db_path=self.db_path)
+
+
+def set_job_status(party, status, message="", db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        conn.execute(
+            """INSERT INTO jobs (party, status, message, started_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(party) DO UPDATE SET status=excluded.status, message=excluded.message,
+                   finished_at=CASE WHEN excluded.status IN ('done', 'error') THEN ? ELSE finished_at END""",
+            (party, status, message, time.time(), time.time()))
+
+
+def sync_summaries(analysis_dir=os.path.join("data", "analysis"), db_path=DB_PATH):
+    """
+    summary.json-dateien übernehmen, die der index noch nicht (oder älter)
+    kennt, z.b. von analysen vor dem index. läuft einmal beim app-start.
+    """
+    if not os.path.isdir(analysis_dir):
+        return 0
+    conn = connect(db_path)
+    bekannt = {r["party"]: r["summary_mtime"] for r in conn.execute("SELECT party, summary_mtime FROM parties")}
+    neu = 0
+    with conn:
+        for party in sorted(os.listdir(analysis_dir)):
+            summary_file = os.path.join(analysis_dir, party, "summary.json")
+            if not os.path.isfile(summary_file):
+                continue
+            if bekannt.get(party) == os.path.getmtime(summary_file):
+                continue
+            try:
+                with open(summary_file, encoding="utf-8") as fp:
+                    s = json.load(fp)
+            except Exception:
+                continue
+            if not isinstance(s, dict):
+                continue
+            run_id = f"import-{int(os.path.getmtime(summary_file))}"
+            conn.execute("DELETE FROM trends WHERE party=?", (party,))
+            jsonl = os.path.join(analysis_dir, party, "per_image.jsonl")
+            if os.path.isfile(jsonl):
+                # einmalig die trends aus den alten bild-ergebnissen
+                puffer = Counter()
+                with open(jsonl, encoding="utf-8") as fp:
+                    for line in fp:
+                        try:
+                            _add_trends(puffer, json.loads(line))
+                        except (ValueError, TypeError):
+                            continue
+                _write_trends(conn, party, run_id, puffer)
+            _write_summary(conn, party, run_id, s, summary_file)
+            neu += 1
+    return neu
+
+
+def data_version(db_path=DB_PATH):
+    """
+    billiger schlüssel für caches in der app: ändert sich, sobald ein lauf
+    umschaltet, summaries übernommen oder eine partei gelöscht wird
+    """
+    conn = connect(db_path)
+    return tuple(tuple(r) for r in conn.execute(
+        "SELECT party, run_id, summary_mtime, updated_at FROM parties ORDER BY party"))
+
+
+def party_summaries(db_path=DB_PATH):
+    """alle parteien mit summary-werten, by_gender/by_race wie in summary.json"""
+    conn = connect(db_path)
+    counts = {}
+    for r in conn.execute("SELECT party, dim, label, n FROM party_counts ORDER BY party, dim, pos"):
+        counts.setdefault(r["party"], {}).setdefault(r["dim"], {})[r["label"]] = r["n"]
+    out = []
+    for r in conn.execute("SELECT * FROM parties ORDER BY party"):
+        c = counts.get(r["party"], {})
+        out.append({
+            "party": r["party"],
+            "total_images": r["total_images"],
+            "images_processed": r["images_processed"],
+            "faces_total": r["faces_total"],
+            "average_age": r["average_age"],
+            "by_gender": c.get("gender", {}),
+            "by_race": c.get("race", {}),
+        })
+    return out
+
+
+def trends(grain="month", parties=None, metrics=None, db_path=DB_PATH):
+    """
+    zeitreihe aus den trend-tabellen: liste von (party, bucket, metric, n),
+    nur der aktuelle (fertige) lauf jeder partei
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"unbekanntes grain: {grain}")
+    sql = ("SELECT t.party, t.bucket, t.metric, t.n FROM trends t "
+           "JOIN parties p ON p.party = t.party AND p.run_id = t.run_id "
+           "WHERE t.grain = ?")
+    args = [grain]
+    if parties:
+        sql += f" AND t.party IN ({','.join('?' * len(parties))})"
+        args += list(parties)
+    if metrics:
+        sql += f" AND t.metric IN ({','.join('?' * len(metrics))})"
+        args += list(metrics)
+    sql += " ORDER BY t.party, t.bucket"
+    conn = connect(db_path)
+    return [tuple(r) for r in conn.execute(sql, args)]
+
+
+def analyzed_parties(db_path=DB_PATH):
+    conn = connect(db_path)
+    return {r["party"] for r in conn.execute("SELECT party FROM parties")}
+
+
+def job_status(party, db_path=DB_PATH):
+    conn = connect(db_path)
+    r = conn.execute("SELECT * FROM jobs WHERE party=?", (party,)).fetchone()
+    return dict(r) if r else None
+
+
+def job_statuses(db_path=DB_PATH):
+    """{partei: job} für alle parteien, eine abfrage"""
+    conn = connect(db_path)
+    return {r["party"]: dict(r) for r in conn.execute("SELECT * FROM jobs")}
+
+
+def jobs_version(db_path=DB_PATH):
+    """ändert sich mit jedem status-/fortschritts-update in jobs (auch aus anderen prozessen)"""
+    conn = connect(db_path)
+    r = conn.execute("SELECT COUNT(*), MAX(started_at), MAX(finished_at), SUM(done), "
+                     "SUM(status='running') FROM jobs").fetchone()
+    return list(r)
+
+
+def delete_party(party, db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        for table in ("parties", "party_counts", "images", "faces", "trends", "jobs"):
+            conn.execute(f"DELETE FROM {table} WHERE party=?", (party,))
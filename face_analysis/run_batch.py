@@ -0,0 +1,166 @@
+# face_analysis/run_batch.py
+#
+# analyse ohne dash, z.b. per cron auf einem rechner ohne browser:
+#
+#   python -m face_analysis.run_batch SPD CDU --batch-size 8
+#   python -m face_analysis.run_batch --all --skip-done --report bericht.json
+#
+# parteien laufen nacheinander (jede nutzt den ganzen FairFace-pool).
+# abgebrochene läufe machen beim checkpoint weiter (--no-resume: von vorn).
+# SIGTERM/SIGINT halten nach dem aktuellen bild an, der checkpoint bleibt.
+# am ende ein json-bericht, exit-code 1 wenn eine partei fehlgeschlagen ist.
+
+import os, sys, json, time, signal, argparse, traceback
+
+from face_analysis.analyze_images import analyze_party_images, checkpoint_count
+from face_analysis.normalize import NORMALIZE_MAX_SIDE
+from face_analysis.progress import read_progress
+from face_analysis import results_db, prefilter, phash_index
+
+DATA_DIR = "data"
+REPORT_DIR = os.path.join(DATA_DIR, "analysis", "_runs")
+
+
+def list_parties(data_dir=DATA_DIR):
+    """alle partei-ordner unter data/ (wie im analyse-tab)"""
+    return sorted(p for p in os.listdir(data_dir)
+                  if os.path.isdir(os.path.join(data_dir, p)) and p not in ("analysis", ".status"))
+
+
+def party_report(party, status, secs, error=None, resumed=0):
+    """
+    eintrag im bericht: zahlen aus summary.json und dem letzten fortschritt.
+    resumed: bilder, die schon im checkpoint standen - zählen bei images_done
+    mit, aber nicht beim durchsatz
+    """
+    rec = {"party": party, "status": status, "secs": round(secs, 2)}
+    p = read_progress(party) or {}
+    rec["images_done"] = int(p.get("done") or 0)
+    rec["images_resumed"] = min(resumed, rec["images_done"])
+    rec["images_total"] = int(p.get("total") or 0)
+    rec["cache_hits"] = int(p.get("cache_hits") or 0)
+    if p.get("duplicates"):
+        rec["duplicates"] = p["duplicates"]
+    if p.get("prefilter"):
+        rec["prefilter"] = p["prefilter"]
+    if status == "done":
+        try:
+            with open(os.path.join(DATA_DIR, "analysis", party, "summary.json"), encoding="utf-8") as fp:
+                summary = json.load(fp)
+            rec["faces_total"] = int(summary.get("faces_total", 0)) if isinstance(summary, dict) else 0
+        except (OSError, ValueError):
+            pass
+    neu = rec["images_done"] - rec["images_resumed"]
+    rec["images_per_sec"] = round(neu / secs, 3) if secs > 0 else None
+    if error:
+        rec["error"] = error
+    return rec
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m face_analysis.run_batch",
+                                 description="FairFace-analyse für parteien ohne web-oberfläche")
+    ap.add_argument("parties", nargs="*", help="parteien (ordner unter data/)")
+    ap.add_argument("--all", action="store_true", help="alle parteien unter data/")
+    ap.add_argument("--skip-done", action="store_true",
+                    help="parteien überspringen, die schon fertig analysiert sind (ohne checkpoint)")
+    ap.add_argument("--workers", type=int, default=None, help="gleichzeitige batches (standard: pool-größe)")
+    ap.add_argument("--batch-size", type=int, default=8, help="bilder pro FairFace-aufruf")
+    ap.add_argument("--resume", action=argparse.BooleanOptionalAction, default=True,
+                    help="beim checkpoint eines abgebrochenen laufs weitermachen")
+    ap.add_argument("--no-cache", action="store_true", help="ergebnis-cache nicht benutzen")
+    ap.add_argument("--no-worker", action="store_true", help="predict.py pro batch als subprocess")
+    ap.add_argument("--prefilter", choices=prefilter.MODES, default=os.environ.get("FACE_PREFILTER", "off"))
+    ap.add_argument("--dedup", choices=phash_index.MODES, default=os.environ.get("FACE_DEDUP", "off"))
+    ap.add_argument("--max-side", type=int, default=NORMALIZE_MAX_SIDE, help="normalisierung, 0 = aus")
+    ap.add_argument("--report", default=None, help="json-bericht (standard: data/analysis/_runs/<zeit>.json)")
+    args = ap.parse_args(argv)
+
+    if args.all:
+        parties = list_parties()
+    elif args.parties:
+        parties = args.parties
+    else:
+        ap.error("parteien angeben oder --all")
+    fehlen = [p for p in parties if not os.path.isdir(os.path.join(DATA_DIR, p))]
+    if fehlen:
+        ap.error("ordner fehlt: " + ", ".join(os.path.join(DATA_DIR, p) for p in fehlen))
+    if args.skip_done:
+        fertig = results_db.analyzed_parties()
+        parties = [p for p in parties if p not in fertig or checkpoint_count(p)]
+
+    # sauber anhalten statt mitten im bild zu sterben
+    angehalten = []
+
+    def anhalten(signum, _frame):
+        print(f"signal {signum}: halte nach dem aktuellen bild an", file=sys.stderr)
+        angehalten.append(signum)
+
+    signal.signal(signal.SIGTERM, anhalten)
+    signal.signal(signal.SIGINT, anhalten)
+
+    start = time.time()
+    berichte = []
+    for party in parties:
+        if angehalten:
+            berichte.append({"party": party, "status": "skipped", "secs": 0.0})
+            continue
+        print(f"[{party}] start", file=sys.stderr)
+        # was schon im checkpoint steht, rechnet dieser lauf nicht
+        resumed = checkpoint_count(party) if args.resume else 0
+        t0 = time.time()
+        status, error = "done", None
+        try:
+            ergebnis = analyze_party_images(os.path.join(DATA_DIR, party),
+                                            use_worker=not args.no_worker,
+                                            batch_size=args.batch_size,
+                                            workers=args.workers,
+                                            use_cache=not args.no_cache,
+                                            resume=args.resume,
+                                            prefilter_mode=args.prefilter,
+                                            max_side=args.max_side,
+                                            dedup=args.dedup,
+                                            should_stop=lambda: "paused" if angehalten else None)
+            if ergebnis is None:
+                status = "paused"
+        except Exception as e:
+            status, error = "error", str(e)
+            traceback.print_exc()
+            results_db.set_job_status(party, "error", str(e))
+        rec = party_report(party, status, time.time() - t0, error, resumed)
+        berichte.append(rec)
+        print(f"[{party}] {status}: {rec['images_done']}/{rec['images_total']} bilder "
+              f"in {rec['secs']}s ({rec['images_per_sec']} bilder/s)", file=sys.stderr)
+
+    secs = time.time() - start
+    bilder = sum(r.get("images_done", 0) for r in berichte)
+    neu = bilder - sum(r.get("images_resumed", 0) for r in berichte)
+    report = {
+        "started_at": int(start),
+        "finished_at": int(time.time()),
+        "secs": round(secs, 2),
+        "args": {k: v for k, v in vars(args).items() if k != "report"},
+        "parties": berichte,
+        "totals": {
+            "parties": len(berichte),
+            "done": sum(r["status"] == "done" for r in berichte),
+            "errors": sum(r["status"] == "error" for r in berichte),
+            "images": bilder,
+            "images_resumed": bilder - neu,
+            "faces": sum(r.get("faces_total", 0) for r in berichte),
+            "images_per_sec": round(neu / secs, 3) if secs > 0 else None,
+        },
+    }
+    pfad = args.report or os.path.join(REPORT_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(pfad)), exist_ok=True)
+    with open(pfad, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=2, ensure_ascii=False)
+    print(pfad)
+
+    if report["totals"]["errors"]:
+        return 1
+    return 130 if angehalten else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# face_analysis/scheduler.py
+#
+# warteschlange für die analysen (statt einem losen thread pro partei).
+# aufträge liegen in der tabelle job_queue im ergebnis-index und überleben
+# damit einen neustart. eine feste zahl worker-threads (ANALYSIS_WORKERS)
+# holt sich immer den auftrag mit der höchsten priorität, bei gleicher
+# priorität den ältesten.
+#
+# status: queued -> running -> done | error | cancelled | paused
+# paused/cancelled: der lauf hört vor dem nächsten bild auf (should_stop),
+# der checkpoint bleibt liegen. resume stellt einen pausierten auftrag
+# wieder in die schlange, er macht dann beim checkpoint weiter.
+# läufe, die beim beenden der app noch "running" waren, kommen beim start
+# wieder in die schlange.
+
+import os, time, threading, traceback
+
+from face_analysis import results_db
+
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    party TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    message TEXT,
+    requested_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    run_secs REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS job_queue_next ON job_queue(status, priority, id);
+CREATE INDEX IF NOT EXISTS job_queue_party ON job_queue(party, status);
+CREATE TABLE IF NOT EXISTS party_priority (
+    party TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL
+);
+"""
+
+
+class Scheduler:
+    """
+    run_fn(party, should_stop) macht die eigentliche analyse. exceptions
+    landen als status "error" mit der meldung in der history.
+    """
+
+    def __init__(self, run_fn, workers=ANALYSIS_WORKERS, db_path=results_db.DB_PATH):
+        self.run_fn = run_fn
+        self.workers = max(1, int(workers))
+        self.db_path = db_path
+        self._wake = threading.Condition()
+        self._threads = []
+        # job-id -> gewünschter status ("paused"/"cancelled") für laufende jobs
+        self._stop = {}
+        # job-id -> event, wird gesetzt, wenn der worker mit dem job fertig ist
+        self._finished = {}
+        self._lock = threading.Lock()
+        # zählt jede änderung an der schlange mit (für die fortschritts-anzeige)
+        self.version = 0
+        conn = results_db.connect(db_path)
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        return results_db.connect(self.db_path)
+
+    # ---------- steuern ---------- #
+    def start(self):
+        """worker starten (mehrfacher aufruf schadet nicht)"""
+        with self._lock:
+            if self._threads:
+                return
+            conn = self._conn()
+            with conn:
+                # vom letzten prozess liegen gebliebene läufe, checkpoint macht weiter
+                conn.execute("UPDATE job_queue SET status='queued', message='Neustart', started_at=NULL "
+                             "WHERE status='running'")
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"analysis-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def enqueue(self, party, priority=None):
+        """auftrag anlegen; gibt es schon einen offenen für die partei, wird der genommen"""
+        conn = self._conn()
+        with conn:
+            if priority is None:
+                priority = self.priority(party)
+            row = conn.execute("SELECT id, status, priority FROM job_queue WHERE party=? AND status IN "
+                               "('queued', 'running', 'paused') ORDER BY id DESC LIMIT 1", (party,)).fetchone()
+            if row is None:
+                job_id = conn.execute(
+                    "INSERT INTO job_queue (party, priority, status, message, requested_at) "
+                    "VALUES (?, ?, 'queued', '', ?)", (party, priority, time.time())).lastrowid
+            else:
+                job_id = row["id"]
+                # doppelter klick: höchstens die priorität hochsetzen, pausierte wieder einreihen
+                conn.execute("UPDATE job_queue SET priority=MAX(priority, ?), "
+                             "status=CASE WHEN status='paused' THEN 'queued' ELSE status END WHERE id=?",
+                             (priority, job_id))
+        self._notify()
+        return job_id
+
+    def resume(self, party):
+        return self.enqueue(party)
+
+    def pause(self, party):
+        return self._halt(party, "paused")
+
+    def cancel(self, party, wait=False, timeout=None):
+        """
+        auftrag abbrechen. wait=True: bei einem laufenden auftrag warten, bis
+        der lauf wirklich steht (danach schreibt er nichts mehr); False, wenn
+        er nach timeout sekunden noch läuft
+        """
+        with self._lock:
+            job = self._halt(party, "cancelled")
+            fertig = self._finished.get(job) if job else None
+        if wait and fertig is not None:
+            return fertig.wait(timeout)
+        return True
+
+    def _halt(self, party, status):
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT id, status FROM job_queue WHERE party=? AND status IN "
+                               "('queued', 'running', 'paused') ORDER BY id DESC LIMIT 1", (party,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "running":
+                # der worker trägt den status ein, sobald der lauf steht
+                self._stop[row["id"]] = status
+                conn.execute("UPDATE job_queue SET message=? WHERE id=?",
+                             ("Wird angehalten ..." if status == "paused" else "Wird abgebrochen ...", row["id"]))
+            elif status != row["status"]:
+                conn.execute("UPDATE job_queue SET status=?, finished_at=? WHERE id=?",
+                             (status, time.time() if status == "cancelled" else None, row["id"]))
+        self.version += 1
+        return row["id"]
+
+    def set_priority(self, party, priority):
+        """standard-priorität der partei, gilt auch für einen wartenden auftrag"""
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO party_priority VALUES (?, ?) ON CONFLICT(party) DO UPDATE "
+                         "SET priority=excluded.priority", (party, int(priority)))
+            conn.execute("UPDATE job_queue SET priority=? WHERE party=? AND status IN ('queued', 'paused')",
+                         (int(priority), party))
+        self.version += 1
+
+    def priority(self, party):
+        row = self._conn().execute("SELECT priority FROM party_priority WHERE party=?", (party,)).fetchone()
+        return row["priority"] if row else 0
+
+    # ---------- lesen ---------- #
+    def jobs(self, history=20):
+        """offene aufträge (in abarbeitungs-reihenfolge) + die letzten fertigen"""
+        conn = self._conn()
+        offen = conn.execute(
+            "SELECT * FROM job_queue WHERE status IN ('queued', 'running', 'paused') "
+            "ORDER BY status='running' DESC, status='paused', priority DESC, id").fetchall()
+        fertig = conn.execute(
+            "SELECT * FROM job_queue WHERE status NOT IN ('queued', 'running', 'paused') "
+            "ORDER BY finished_at DESC, id DESC LIMIT ?", (history,)).fetchall()
+        return [dict(r) for r in offen], [dict(r) for r in fertig]
+
+    def job_for(self, party):
+        """letzter auftrag der partei (oder None)"""
+        r = self._conn().execute("SELECT * FROM job_queue WHERE party=? ORDER BY id DESC LIMIT 1",
+                                 (party,)).fetchone()
+        return dict(r) if r else None
+
+    def latest_jobs(self):
+        """{partei: letzter auftrag} für alle parteien, eine abfrage"""
+        rows = self._conn().execute(
+            "SELECT * FROM job_queue WHERE id IN (SELECT MAX(id) FROM job_queue GROUP BY party)").fetchall()
+        return {r["party"]: dict(r) for r in rows}
+
+    def count(self, status):
+        return self._conn().execute("SELECT COUNT(*) FROM job_queue WHERE status=?", (status,)).fetchone()[0]
+
+    # ---------- worker ---------- #
+    def _notify(self):
+        self.version += 1
+        with self._wake:
+            self._wake.notify_all()
+
+    def _claim(self):
+        conn = self._conn()
+        with self._lock, conn:
+            row = conn.execute("SELECT id, party FROM job_queue WHERE status='queued' "
+                               "ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE job_queue SET status='running', message='', started_at=? WHERE id=?",
+                         (time.time(), row["id"]))
+            self._finished[row["id"]] = threading.Event()
+            self.version += 1
+        return row["id"], row["party"]
+
+    def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wake:
+                    self._wake.wait(timeout=5)
+                continue
+            job_id, party = job
+            t0 = time.time()
+            status, message = "done", ""
+            try:
+                ergebnis = self.run_fn(party, lambda: self._stop.get(job_id))
+            except Exception as e:
+                ergebnis = None
+                status, message = "error", str(e)
+                traceback.print_exc()
+            gewuenscht = self._stop.pop(job_id, None)
+            # run_fn gibt None zurück, wenn der lauf wirklich angehalten wurde
+            if gewuenscht and status == "done" and ergebnis is None:
+                status = gewuenscht
+            conn = self._conn()
+            with conn:
+                conn.execute("UPDATE job_queue SET status=?, message=?, run_secs=run_secs+?, "
+                             "finished_at=CASE WHEN ?='paused' THEN NULL ELSE ? END WHERE id=?",
+                             (status, message, time.time() - t0, status, time.time(), job_id))
+            self.version += 1
+            with self._lock:
+                self._finished.pop(job_id).set()
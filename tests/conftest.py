@@ -0,0 +1,39 @@
+# tests/conftest.py
+#
+# die tests laufen ohne echtes FairFace: wie bei bench/run_bench.py gibt es
+# einen arbeitsordner mit bench/fake_predict.py als predict.py und
+# synthetischen partei-ordnern. die pipeline arbeitet mit relativen pfaden
+# ("data/...") und prozessweiten singletons (pool, cache, index), deshalb ein
+# arbeitsordner für die ganze sitzung, in den einmal gewechselt wird.
+#
+#   python -m pytest -q
+
+import os, sys, shutil
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+# fake-modell: kein ladezeit-sleep, kurze latenz (erbt der worker-prozess)
+os.environ.setdefault("FAKE_STARTUP", "0")
+os.environ.setdefault("FAKE_LATENCY", "0.005")
+
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    from bench.run_bench import FAKE_PREDICT, make_dataset
+
+    wd = str(tmp_path_factory.mktemp("work"))
+    fairface_dir = os.path.join(wd, "face_analysis", "model", "FairFace")
+    os.makedirs(fairface_dir)
+    shutil.copy(FAKE_PREDICT, os.path.join(fairface_dir, "predict.py"))
+    make_dataset(wd, parties=2, images=12, size=(240, 240))
+
+    alt = os.getcwd()
+    os.chdir(wd)
+    yield wd
+    from face_analysis.fairface_worker import current_pool
+    if current_pool() is not None:
+        current_pool().close()
+    os.chdir(alt)
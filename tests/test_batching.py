@@ -0,0 +1,37 @@
+# tests/test_batching.py
+#
+# mehrere bilder pro FairFace-aufruf (batch_size) dürfen an den outputs
+# nichts ändern: gleiche dateien, byte für byte, wie ein bild pro aufruf.
+
+import os
+
+import pytest
+
+PARTY = "BENCH1"
+OUTPUTS = ("per_image.csv", "per_image.jsonl", "predictions.csv", "predictions.json", "summary.json")
+
+
+def _outputs(party):
+    out_dir = os.path.join("data", "analysis", party)
+    dateien = {}
+    for name in OUTPUTS:
+        with open(os.path.join(out_dir, name), "rb") as f:
+            dateien[name] = f.read()
+    dateien["detected_faces"] = sorted(os.listdir(os.path.join(out_dir, "detected_faces")))
+    return dateien
+
+
+@pytest.mark.parametrize("use_worker", [True, False])
+def test_batch_size_does_not_change_outputs(workdir, use_worker):
+    from face_analysis.analyze_images import analyze_party_images
+
+    folder = os.path.join("data", PARTY)
+    analyze_party_images(folder, use_worker=use_worker, batch_size=1, use_cache=False, resume=False)
+    einzeln = _outputs(PARTY)
+    assert einzeln["detected_faces"]
+
+    # 12 bilder: ein voller batch und ein angefangener
+    analyze_party_images(folder, use_worker=use_worker, batch_size=8, use_cache=False, resume=False)
+    gebatcht = _outputs(PARTY)
+    for name in einzeln:
+        assert gebatcht[name] == einzeln[name], name
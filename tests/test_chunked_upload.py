@@ -0,0 +1,70 @@
+# tests/test_chunked_upload.py
+#
+# upload-ids (utils/chunked_upload.py): gleichnamige dateien gleicher größe
+# mit anderem inhalt teilen sich kein .part, der dateianfang wird gegen den
+# prefix aus init geprüft, falscher offset gibt 409 mit dem stand.
+
+import io, os
+
+import pytest
+
+from utils.chunked_upload import PREFIX_LEN, UploadError, init_upload, prefix_hash, write_chunk
+
+PARTY = "UPLOAD"
+
+
+def _jpeg(fuell):
+    return b"\xff\xd8\xff\xe0" + bytes([fuell]) * (PREFIX_LEN + 1000)
+
+
+def _init(data, staging, last_modified=1700000000000, prefix=None):
+    return init_upload(PARTY, "bild.jpg", len(data), last_modified,
+                       prefix or prefix_hash(data[:PREFIX_LEN]), staging_dir=staging)
+
+
+def _put(upload_id, offset, data, staging):
+    return write_chunk(upload_id, offset, io.BytesIO(data), len(data), staging_dir=staging)
+
+
+def test_same_name_and_size_get_separate_uploads(workdir, tmp_path):
+    a, b = _jpeg(1), _jpeg(2)
+    staging = str(tmp_path)
+    ida, idb = _init(a, staging)["upload_id"], _init(b, staging)["upload_id"]
+    assert ida != idb
+    # gleiche datei, anderer zeitstempel -> auch getrennt
+    assert _init(a, staging, last_modified=1)["upload_id"] != ida
+
+    # abwechselnd stücke schreiben, keiner überschreibt den anderen
+    half = len(a) // 2
+    assert _put(ida, 0, a[:half], staging)["offset"] == half
+    assert _put(idb, 0, b[:half], staging)["offset"] == half
+    ra = _put(ida, half, a[half:], staging)
+    rb = _put(idb, half, b[half:], staging)
+    assert ra["done"] and rb["done"]
+    assert ra["filename"] != rb["filename"]
+    for res, data in ((ra, a), (rb, b)):
+        with open(os.path.join("data", PARTY, res["filename"]), "rb") as f:
+            assert f.read() == data
+
+    # wiederfinden nach neuladen: derselbe stand
+    assert _init(a, staging)["upload_id"] == ida
+
+
+def test_prefix_mismatch_is_rejected(workdir, tmp_path):
+    a, b = _jpeg(3), _jpeg(4)
+    staging = str(tmp_path)
+    upload_id = _init(a, staging, prefix=prefix_hash(b[:PREFIX_LEN]))["upload_id"]
+    with pytest.raises(UploadError) as e:
+        _put(upload_id, 0, a, staging)
+    assert e.value.status == 400
+    assert not os.listdir(staging)
+
+
+def test_wrong_offset_conflicts(workdir, tmp_path):
+    a = _jpeg(5)
+    staging = str(tmp_path)
+    upload_id = _init(a, staging)["upload_id"]
+    _put(upload_id, 0, a[:1000], staging)
+    with pytest.raises(UploadError) as e:
+        _put(upload_id, 0, a[:1000], staging)
+    assert e.value.status == 409 and e.value.extra == {"offset": 1000}
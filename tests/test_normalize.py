@@ -0,0 +1,47 @@
+# tests/test_normalize.py
+#
+# bilder über NORMALIZE_MAX_SIDE oder mit EXIF-drehung liest FairFace aus
+# der normalisierten kopie in data/analysis/_norm. die muss auch aus dem
+# arbeitsordner des workers (face_analysis/model/FairFace) erreichbar sein.
+
+import os, json, hashlib
+
+from PIL import Image
+
+PARTY = "NORM"
+
+
+def _mit_gesichtern(stem, ext=".jpg"):
+    """dateiname, für den bench/fake_predict.py gesichter meldet"""
+    max_faces = int(os.environ.get("FAKE_FACES", "3"))
+    for i in range(100):
+        name = f"{stem}{i}_1600000000{ext}"
+        if int(hashlib.md5(name.encode("utf-8")).hexdigest(), 16) % (max_faces + 1):
+            return name
+    raise AssertionError("kein passender name")
+
+
+def test_oversized_and_rotated_images_are_analysed(workdir):
+    from face_analysis.analyze_images import analyze_party_images
+    from face_analysis.normalize import NORMALIZE_MAX_SIDE, normalized_path
+
+    folder = os.path.join("data", PARTY)
+    os.makedirs(folder, exist_ok=True)
+    gross = os.path.join(folder, _mit_gesichtern("gross"))
+    Image.new("RGB", (NORMALIZE_MAX_SIDE + 400, NORMALIZE_MAX_SIDE + 200), (200, 120, 80)).save(gross)
+    gedreht = os.path.join(folder, _mit_gesichtern("gedreht"))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.new("RGB", (320, 240), (80, 120, 200)).save(gedreht, exif=exif)
+
+    for bild in (gross, gedreht):
+        kopie = normalized_path(os.path.abspath(bild))
+        assert os.path.isabs(kopie) and "_norm" in kopie
+
+    analyze_party_images(folder, use_cache=False, resume=False)
+    with open(os.path.join("data", "analysis", PARTY, "per_image.jsonl"), encoding="utf-8") as f:
+        records = {r["image_name"]: r for r in map(json.loads, f)}
+    for bild in (gross, gedreht):
+        rec = records[os.path.basename(bild)]
+        assert rec["error"] is None
+        assert rec["faces_total"] > 0
@@ -0,0 +1,28 @@
+# tests/test_progress.py
+#
+# fortschritt im speicher (face_analysis/progress.py): gelöschte oder neu
+# eingereihte parteien dürfen keinen alten stand mehr liefern.
+
+from face_analysis import progress
+
+
+def test_forget_drops_finished_state(workdir):
+    kanal = progress.ProgressChannel("FORGET")
+    kanal.update(status="done", done=3, total=3)
+    version = progress.snapshot()[0]
+
+    assert progress.forget("FORGET")
+    neu, laeufe = progress.snapshot()
+    assert "FORGET" not in laeufe and neu > version
+    assert not progress.forget("FORGET")
+
+
+def test_forget_keeps_running_state(workdir):
+    kanal = progress.ProgressChannel("FORGET_RUN")
+    kanal.update(status="running", done=1, total=3)
+    assert not progress.forget("FORGET_RUN", keep_running=True)
+    assert progress.snapshot()[1]["FORGET_RUN"]["done"] == 1
+
+    kanal.update(status="cancelled")
+    assert progress.forget("FORGET_RUN", keep_running=True)
+    assert "FORGET_RUN" not in progress.snapshot()[1]
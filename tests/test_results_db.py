@@ -0,0 +1,70 @@
+# tests/test_results_db.py
+#
+# ergebnis-index (face_analysis/results_db.py): ein lauf, der abstürzt oder
+# angehalten wird, schaltet nicht um und lässt keine zeilen im index zurück.
+
+import os
+
+import pytest
+
+PARTY = "BENCH1"
+
+
+def _zeilen(party):
+    from face_analysis import results_db
+
+    conn = results_db.connect()
+    aktiv = conn.execute("SELECT run_id FROM parties WHERE party=?", (party,)).fetchone()
+    runs = {r["run_id"] for r in conn.execute("SELECT DISTINCT run_id FROM images WHERE party=?", (party,))}
+    job = conn.execute("SELECT status, message FROM jobs WHERE party=?", (party,)).fetchone()
+    return (aktiv["run_id"] if aktiv else None), runs, dict(job)
+
+
+def test_crash_leaves_previous_run(workdir, monkeypatch):
+    from face_analysis import analyze_images, results_db
+
+    folder = os.path.join("data", PARTY)
+    analyze_images.analyze_party_images(folder, use_cache=False, resume=False)
+    vorher, runs, job = _zeilen(PARTY)
+    assert runs == {vorher} and job["status"] == "done"
+
+    # nach ein paar bildern (und einem flush in den index) stürzt der lauf ab
+    monkeypatch.setattr(results_db, "FLUSH_ROWS", 1)
+    original = analyze_images.PartyOutputs.add
+    zaehler = [0]
+
+    def add(self, *args, **kwargs):
+        zaehler[0] += 1
+        if zaehler[0] > 5:
+            raise RuntimeError("platte voll")
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(analyze_images.PartyOutputs, "add", add)
+    with pytest.raises(RuntimeError):
+        analyze_images.analyze_party_images(folder, use_cache=False, resume=False)
+    aktiv, runs, job = _zeilen(PARTY)
+    assert aktiv == vorher and runs == {vorher}
+    assert job == {"status": "error", "message": "platte voll"}
+    # checkpoint bleibt, der nächste lauf macht dort weiter
+    assert analyze_images.checkpoint_count(PARTY) > 0
+
+
+def test_stop_leaves_previous_run(workdir, monkeypatch):
+    from face_analysis import analyze_images, results_db
+
+    folder = os.path.join("data", PARTY)
+    analyze_images.analyze_party_images(folder, use_cache=False, resume=False)
+    vorher = _zeilen(PARTY)[0]
+
+    monkeypatch.setattr(results_db, "FLUSH_ROWS", 1)
+    fragen = [0]
+
+    def should_stop():
+        fragen[0] += 1
+        return "paused" if fragen[0] > 6 else None
+
+    assert analyze_images.analyze_party_images(folder, use_cache=False, resume=False,
+                                               should_stop=should_stop) is None
+    aktiv, runs, job = _zeilen(PARTY)
+    assert aktiv == vorher and runs == {vorher}
+    assert job["status"] == "paused"
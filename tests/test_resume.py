@@ -0,0 +1,85 @@
+# tests/test_resume.py
+#
+# ein angehaltener und wieder aufgenommener lauf muss dieselben outputs
+# liefern wie ein lauf am stück, und beim weitermachen nur die bilder
+# rechnen, die noch nicht im checkpoint stehen.
+
+import os, json
+
+import pytest
+
+PARTY = "BENCH0"
+
+
+def _outputs(party):
+    out_dir = os.path.join("data", "analysis", party)
+    with open(os.path.join(out_dir, "per_image.jsonl"), encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    with open(os.path.join(out_dir, "summary.json"), encoding="utf-8") as f:
+        summary = json.load(f)
+    return records, summary
+
+
+@pytest.fixture
+def gezaehlt(monkeypatch):
+    """bilder, die wirklich an FairFace gehen"""
+    from face_analysis import analyze_images
+
+    bilder = []
+    original = analyze_images.fairface_batch
+
+    def zaehlen(pool, batch, *args, **kwargs):
+        bilder.extend(batch)
+        return original(pool, batch, *args, **kwargs)
+
+    monkeypatch.setattr(analyze_images, "fairface_batch", zaehlen)
+    return bilder
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_resume_equals_full_run(workdir, gezaehlt, batch_size):
+    from face_analysis.analyze_images import analyze_party_images, checkpoint_count, list_images_ordner
+
+    folder = os.path.join("data", PARTY)
+    total = len(list_images_ordner(folder))
+
+    assert analyze_party_images(folder, batch_size=batch_size, use_cache=False, resume=False) is not None
+    voll = _outputs(PARTY)
+    assert len(voll[0]) == total
+
+    # nach ein paar bildern anhalten
+    fragen = [0]
+
+    def should_stop():
+        fragen[0] += 1
+        return "paused" if fragen[0] > total // 2 else None
+
+    assert analyze_party_images(folder, batch_size=batch_size, use_cache=False, resume=False,
+                                should_stop=should_stop) is None
+    gesichert = checkpoint_count(PARTY)
+    assert 0 < gesichert < total
+
+    gezaehlt.clear()
+    assert analyze_party_images(folder, batch_size=batch_size, use_cache=False, resume=True) is not None
+    assert len(gezaehlt) == total - gesichert
+    assert _outputs(PARTY) == voll
+    assert checkpoint_count(PARTY) == 0
+
+
+def test_resume_false_starts_over(workdir, gezaehlt):
+    from face_analysis.analyze_images import analyze_party_images, checkpoint_count, list_images_ordner
+
+    folder = os.path.join("data", PARTY)
+    total = len(list_images_ordner(folder))
+    fragen = [0]
+
+    def should_stop():
+        fragen[0] += 1
+        return "cancelled" if fragen[0] > 3 else None
+
+    analyze_party_images(folder, use_cache=False, resume=False, should_stop=should_stop)
+    assert checkpoint_count(PARTY) > 0
+
+    gezaehlt.clear()
+    analyze_party_images(folder, use_cache=False, resume=False)
+    assert len(gezaehlt) == total
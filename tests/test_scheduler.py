@@ -0,0 +1,170 @@
+# tests/test_scheduler.py
+#
+# zustände der warteschlange (face_analysis/scheduler.py) mit einer
+# run_fn, die der test steuert: queued -> running -> done | error |
+# cancelled | paused, dazu priorität, doppeltes einreihen und neustart.
+
+import time, threading
+
+import pytest
+
+from face_analysis.scheduler import Scheduler
+
+
+class Lauf:
+    """run_fn, die läuft, bis sie freigegeben oder angehalten wird"""
+
+    def __init__(self, ignore_stop=False):
+        self.ignore_stop = ignore_stop
+        self.gestartet = threading.Event()
+        self.frei = threading.Event()
+        self.reihenfolge = []
+
+    def __call__(self, party, should_stop):
+        self.reihenfolge.append(party)
+        self.gestartet.set()
+        while not self.frei.wait(0.01):
+            if not self.ignore_stop and should_stop():
+                return None
+        return {"party": party}
+
+
+def warte_status(sched, party, status, timeout=5):
+    ende = time.time() + timeout
+    while time.time() < ende:
+        job = sched.job_for(party)
+        if job and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{party}: {sched.job_for(party)} statt {status}")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "index.sqlite")
+
+
+def test_enqueue_deduplicates_and_raises_priority(db_path):
+    sched = Scheduler(Lauf(), workers=1, db_path=db_path)
+    a = sched.enqueue("SPD", priority=1)
+    assert sched.enqueue("SPD", priority=5) == a
+    assert sched.enqueue("SPD", priority=0) == a
+    offen, fertig = sched.jobs()
+    assert [(j["party"], j["priority"], j["status"]) for j in offen] == [("SPD", 5, "queued")]
+    assert fertig == []
+
+
+def test_priority_order(db_path):
+    lauf = Lauf()
+    lauf.frei.set()
+    sched = Scheduler(lauf, workers=1, db_path=db_path)
+    sched.set_priority("GRUENE", 3)
+    sched.enqueue("SPD")
+    sched.enqueue("CDU", priority=5)
+    sched.enqueue("GRUENE")
+    sched.enqueue("FDP", priority=5)
+    sched.start()
+    for party in ("SPD", "CDU", "GRUENE", "FDP"):
+        warte_status(sched, party, "done")
+    assert lauf.reihenfolge == ["CDU", "FDP", "GRUENE", "SPD"]
+
+
+def test_run_until_done(db_path):
+    lauf = Lauf()
+    sched = Scheduler(lauf, workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    sched.start()
+    assert lauf.gestartet.wait(5)
+    warte_status(sched, "SPD", "running")
+    lauf.frei.set()
+    job = warte_status(sched, "SPD", "done")
+    assert job["finished_at"] is not None and job["run_secs"] > 0
+
+
+def test_pause_and_resume(db_path):
+    lauf = Lauf()
+    sched = Scheduler(lauf, workers=1, db_path=db_path)
+    job_id = sched.enqueue("SPD")
+    sched.start()
+    assert lauf.gestartet.wait(5)
+    assert sched.pause("SPD") == job_id
+    job = warte_status(sched, "SPD", "paused")
+    assert job["finished_at"] is None
+
+    # pausiert bleibt liegen, resume reiht denselben auftrag wieder ein
+    lauf.gestartet.clear()
+    assert sched.resume("SPD") == job_id
+    assert lauf.gestartet.wait(5)
+    lauf.frei.set()
+    warte_status(sched, "SPD", "done")
+    assert lauf.reihenfolge == ["SPD", "SPD"]
+
+
+def test_pause_queued_job(db_path):
+    sched = Scheduler(Lauf(), workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    sched.pause("SPD")
+    assert sched.job_for("SPD")["status"] == "paused"
+    sched.enqueue("SPD")
+    assert sched.job_for("SPD")["status"] == "queued"
+
+
+def test_cancel_queued_job(db_path):
+    sched = Scheduler(Lauf(), workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    assert sched.cancel("SPD", wait=True, timeout=1)
+    job = sched.job_for("SPD")
+    assert job["status"] == "cancelled" and job["finished_at"] is not None
+    # danach gibt es einen neuen auftrag
+    assert sched.enqueue("SPD") != job["id"]
+
+
+def test_cancel_wait_blocks_until_stopped(db_path):
+    lauf = Lauf()
+    sched = Scheduler(lauf, workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    sched.start()
+    assert lauf.gestartet.wait(5)
+    assert sched.cancel("SPD", wait=True, timeout=5)
+    # der worker hat den status schon eingetragen, wenn cancel zurückkommt
+    assert sched.job_for("SPD")["status"] == "cancelled"
+
+
+def test_cancel_wait_times_out(db_path):
+    lauf = Lauf(ignore_stop=True)
+    sched = Scheduler(lauf, workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    sched.start()
+    assert lauf.gestartet.wait(5)
+    assert not sched.cancel("SPD", wait=True, timeout=0.2)
+    assert sched.job_for("SPD")["status"] == "running"
+    # lauf war schon fertig, als das anhalten ankam -> bleibt "done"
+    lauf.frei.set()
+    warte_status(sched, "SPD", "done")
+
+
+def test_error_is_recorded(db_path):
+    def kaputt(party, should_stop):
+        raise RuntimeError("predict.py exit 1")
+
+    sched = Scheduler(kaputt, workers=1, db_path=db_path)
+    sched.enqueue("SPD")
+    sched.start()
+    job = warte_status(sched, "SPD", "error")
+    assert job["message"] == "predict.py exit 1"
+
+
+def test_restart_requeues_running_jobs(db_path):
+    # prozess stirbt mitten im lauf: job steht noch auf "running"
+    alt = Scheduler(Lauf(), workers=1, db_path=db_path)
+    job_id = alt.enqueue("SPD")
+    assert alt._claim() == (job_id, "SPD")
+    assert alt.job_for("SPD")["status"] == "running"
+
+    lauf = Lauf()
+    lauf.frei.set()
+    neu = Scheduler(lauf, workers=1, db_path=db_path)
+    neu.start()
+    job = warte_status(neu, "SPD", "done")
+    assert job["id"] == job_id
+    assert lauf.reihenfolge == ["SPD"]
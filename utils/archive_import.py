@@ -0,0 +1,117 @@
+# utils/archive_import.py
+#
+# partei-exporte als archiv (.zip, .tar.gz/.tgz) direkt einlesen, ohne sie
+# vorher auszupacken. die einträge werden der reihe nach gestreamt, nach
+# endung (ALLOWED_EXTS) und magic bytes gefiltert und gehen sofort in den
+# blob-store (utils/blob_store.py) -> jedes bild wird genau einmal
+# geschrieben, ordnerstruktur im archiv wird flachgeklopft.
+#
+# zip braucht eine datei mit seek (upload-staging oder BytesIO), tar wird im
+# reinen stream-modus gelesen ("r|*"), funktioniert also auch mit pipes.
+
+import os, time, tarfile, zipfile
+
+from utils.uploader import ALLOWED_EXTS, check_magic
+from utils.blob_store import get_store
+
+# endung -> erlaubte dateianfänge des archivs
+ARCHIVE_MAGIC = {
+    ".zip": (b"PK\x03\x04", b"PK\x05\x06"),
+    ".tar.gz": (b"\x1f\x8b",),
+    ".tgz": (b"\x1f\x8b",),
+}
+ARCHIVE_MAX = int(os.environ.get("UPLOAD_ARCHIVE_MB", "20480")) * 1024 * 1024
+# größtes einzelbild im archiv (schutz vor zip-bomben)
+MEMBER_MAX = int(os.environ.get("UPLOAD_FILE_MB", "200")) * 1024 * 1024
+
+
+def archive_ext(filename):
+    """".zip" / ".tar.gz" / ".tgz" oder None"""
+    name = (filename or "").lower()
+    for ext in ARCHIVE_MAGIC:
+        if name.endswith(ext):
+            return ext
+    return None
+
+
+def check_archive_magic(ext, head):
+    return any(head.startswith(m) for m in ARCHIVE_MAGIC.get(ext, ()))
+
+
+class _Member:
+    """leser für einen eintrag: kopf schon gelesen, größe begrenzt"""
+
+    def __init__(self, head, f, limit):
+        self.head = head
+        self.f = f
+        self.rest = limit - len(head)
+
+    def read(self, n):
+        if self.head:
+            buf, self.head = self.head, b""
+            return buf
+        buf = self.f.read(n)
+        self.rest -= len(buf)
+        if self.rest < 0:
+            raise ValueError("Bild im Archiv zu groß")
+        return buf
+
+
+def _members(fileobj, ext):
+    """(name, mtime, größe, öffner) für jede datei im archiv, in archiv-reihenfolge"""
+    if ext == ".zip":
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield info.filename, mtime, info.file_size, lambda info=info: zf.open(info)
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                # im stream-modus nur gültig, bis der nächste eintrag gelesen wird
+                yield info.name, info.mtime, info.size, lambda info=info: tf.extractfile(info)
+
+
+def import_archive(party, fileobj, filename):
+    """
+    archiv in die partei einlesen. gibt zähler zurück:
+    {"stored", "duplicate", "renamed", "skipped", "errors", "messages"}
+    """
+    ext = archive_ext(filename)
+    if ext is None:
+        raise ValueError(f"Kein Archiv: {filename}")
+    store = get_store()
+    res = {"stored": 0, "duplicate": 0, "renamed": 0, "skipped": 0, "errors": 0, "messages": []}
+    for pfad, mtime, size, oeffnen in _members(fileobj, ext):
+        name = os.path.basename(pfad.replace("\\", "/"))
+        bild_ext = os.path.splitext(name)[1].lower()
+        # __MACOSX/._bild.jpg, .DS_Store usw.
+        if (not name or name.startswith(".") or "__MACOSX/" in pfad
+                or bild_ext not in ALLOWED_EXTS or size > MEMBER_MAX):
+            res["skipped"] += 1
+            continue
+        try:
+            with oeffnen() as f:
+                head = f.read(16)
+                if not check_magic(bild_ext, head):
+                    res["skipped"] += 1
+                    continue
+                status, _ = store.put_stream(party, name, _Member(head, f, MEMBER_MAX), orig_mtime=mtime)
+            res[status] += 1
+        except Exception as e:
+            res["errors"] += 1
+            res["messages"].append(f"{pfad}: {e}")
+    return res
+
+
+def import_message(filename, res):
+    """kurze zusammenfassung für die oberfläche"""
+    gespeichert = res["stored"] + res["renamed"]
+    text = (f"Archiv '{filename}': {gespeichert} Bilder gespeichert, "
+            f"{res['duplicate']} schon vorhanden, {res['skipped']} übersprungen")
+    if res["errors"]:
+        text += f", {res['errors']} Fehler"
+    return text
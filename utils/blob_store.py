@@ -0,0 +1,276 @@
+# utils/blob_store.py
+#
+# inhaltsadressierte ablage der hochgeladenen bilder: jede datei liegt genau
+# einmal unter data/analysis/_blobs/<sha[:2]>/<sha256><endung>, in
+# data/<partei>/<dateiname> steht nur ein hardlink darauf (pipeline, vorschau
+# und katalog sehen also weiter normale dateien). geht kein hardlink
+# (anderes dateisystem), wird kopiert.
+#
+# pro partei gibt es ein manifest (dateiname -> sha, größe, hochgeladen am,
+# original-zeitstempel) in data/analysis/_blobs/_manifest.sqlite:
+#   - gleiche bytes in einer partei werden nur einmal abgelegt ("duplicate"),
+#   - gleicher name mit anderem inhalt überschreibt nicht mehr, sondern
+#     bekommt "<name>~<sha8>.<endung>" ("renamed"),
+#   - gleiche bytes in verschiedenen parteien teilen sich einen blob; der
+#     ergebnis-cache (sha256) rechnet sie nur einmal.
+# dateien, die schon vor dem store im partei-ordner lagen oder von außen
+# dazukommen (instaloader, kopieren), werden beim nächsten upload in die
+# partei übernommen (adopt).
+
+import os, time, shutil, sqlite3, hashlib, threading
+
+from utils.dataset_catalog import get_catalog, is_image
+
+DATA_DIR = "data"
+BLOB_DIR = os.path.join(DATA_DIR, "analysis", "_blobs")
+MANIFEST_PATH = os.path.join(BLOB_DIR, "_manifest.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    party TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    orig_mtime REAL,
+    PRIMARY KEY (party, filename)
+);
+CREATE INDEX IF NOT EXISTS manifest_sha ON manifest(party, sha);
+CREATE TABLE IF NOT EXISTS party_dirs (
+    party TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+class BlobStore:
+    def __init__(self, blob_dir=BLOB_DIR, data_dir=DATA_DIR):
+        self.blob_dir = blob_dir
+        self.data_dir = data_dir
+        self.tmp_dir = os.path.join(blob_dir, "_tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # partei -> lock für _adopt
+        self._sync_locks = {}
+        self._db = sqlite3.connect(os.path.join(blob_dir, os.path.basename(MANIFEST_PATH)),
+                                   check_same_thread=False, timeout=30)
+        # ein commit pro bild, bei großen archiven sonst ein fsync pro bild
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def blob_path(self, sha, ext):
+        return os.path.join(self.blob_dir, sha[:2], sha + ext.lower())
+
+    # ---------- ablegen ---------- #
+    def put_stream(self, party, filename, fileobj, orig_mtime=None):
+        """
+        bytes aus fileobj (read(n)) ablegen, sha wird beim schreiben berechnet.
+        -> (status, dateiname) mit status "stored" | "duplicate" | "renamed"
+        """
+        h = hashlib.sha256()
+        size = 0
+        tmp = os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in iter(lambda: fileobj.read(1 << 20), b""):
+                    h.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            return self._commit(party, filename, tmp, h.hexdigest(), size, orig_mtime)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def put_bytes(self, party, filename, data, orig_mtime=None):
+        sha = hashlib.sha256(data).hexdigest()
+        tmp = os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            return self._commit(party, filename, tmp, sha, len(data), orig_mtime)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def put_file(self, party, filename, src, orig_mtime=None):
+        """fertige datei (z.b. chunked upload) übernehmen, src wird verschoben"""
+        h = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        tmp = os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.tmp")
+        os.replace(src, tmp)
+        try:
+            return self._commit(party, filename, tmp, h.hexdigest(), os.path.getsize(tmp), orig_mtime)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _commit(self, party, filename, tmp, sha, size, orig_mtime):
+        stem, ext = os.path.splitext(filename)
+        blob = self.blob_path(sha, ext)
+        party_dir = os.path.join(self.data_dir, party)
+        os.makedirs(party_dir, exist_ok=True)
+        self._adopt(party)
+        with self._lock:
+            row = self._db.execute("SELECT filename FROM manifest WHERE party=? AND sha=? LIMIT 1",
+                                   (party, sha)).fetchone()
+            if row is not None:
+                # gleiche bytes schon in der partei
+                return "duplicate", row[0]
+
+            status = "stored"
+            row = self._db.execute("SELECT sha FROM manifest WHERE party=? AND filename=?",
+                                   (party, filename)).fetchone()
+            if row is not None:
+                # gleicher name, anderer inhalt -> nicht überschreiben
+                filename = f"{stem}~{sha[:8]}{ext}"
+                status = "renamed"
+
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp, blob)
+            ziel = os.path.join(party_dir, filename)
+            if os.path.exists(ziel):
+                os.remove(ziel)
+            _link(blob, ziel)
+
+            self._db.execute("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?)",
+                             (party, filename, sha, size, time.time(), orig_mtime))
+            self._remember_dir(party)
+            self._db.commit()
+        get_catalog().add_file(party, filename, size)
+        return status, filename
+
+    # ---------- bestand ---------- #
+    def _adopt(self, party):
+        """
+        manifest mit dem partei-ordner abgleichen, wenn der ordner seit dem
+        letzten upload von außen verändert wurde (oder die partei neu ist):
+        verschwundene dateien raus, unbekannte hashen und übernehmen.
+        gehasht wird ohne den store-lock (uploads anderer parteien laufen
+        weiter), pro partei gleicht nur ein thread ab.
+        """
+        party_dir = os.path.join(self.data_dir, party)
+        with self._sync_lock(party):
+            with self._lock:
+                row = self._db.execute("SELECT dir_mtime_ns FROM party_dirs WHERE party=?", (party,)).fetchone()
+                bekannt = {r[0] for r in self._db.execute("SELECT filename FROM manifest WHERE party=?", (party,))}
+            dir_mtime_ns = os.stat(party_dir).st_mtime_ns
+            if row is not None and dir_mtime_ns == row[0]:
+                return
+            da = set(os.listdir(party_dir))
+
+            neu = []
+            for name in sorted(da - bekannt):
+                pfad = os.path.join(party_dir, name)
+                if not is_image(name) or not os.path.isfile(pfad):
+                    continue
+                st = os.stat(pfad)
+                h = hashlib.sha256()
+                with open(pfad, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        h.update(chunk)
+                sha = h.hexdigest()
+                blob = self.blob_path(sha, os.path.splitext(name)[1])
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    try:
+                        os.link(pfad, blob)
+                    except OSError:
+                        shutil.copy2(pfad, blob)
+                neu.append((party, name, sha, st.st_size, time.time(), st.st_mtime))
+
+            with self._lock:
+                # nur löschen, was jetzt noch fehlt (ein upload kann inzwischen dazugekommen sein)
+                weg = [(party, name) for name in bekannt - da
+                       if not os.path.exists(os.path.join(party_dir, name))]
+                self._db.executemany("DELETE FROM manifest WHERE party=? AND filename=?", weg)
+                # duplikate, die schon vorher da waren, bleiben liegen (gleicher sha, andere namen)
+                self._db.executemany("INSERT OR IGNORE INTO manifest VALUES (?, ?, ?, ?, ?, ?)", neu)
+                # stand von vor dem listdir: was danach kam, gleicht der nächste upload ab
+                self._db.execute("INSERT INTO party_dirs VALUES (?, ?) ON CONFLICT(party) DO UPDATE "
+                                 "SET dir_mtime_ns=MAX(dir_mtime_ns, excluded.dir_mtime_ns)",
+                                 (party, dir_mtime_ns))
+                self._db.commit()
+
+    def _sync_lock(self, party):
+        with self._lock:
+            return self._sync_locks.setdefault(party, threading.Lock())
+
+    def _remember_dir(self, party):
+        st = os.stat(os.path.join(self.data_dir, party))
+        self._db.execute("INSERT OR REPLACE INTO party_dirs VALUES (?, ?)", (party, st.st_mtime_ns))
+
+    def counts(self):
+        """
+        {partei: bildanzahl} laut manifest, nur für parteien, deren ordner seit
+        dem letzten upload nicht von außen verändert wurde (sonst fehlt die partei)
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT m.party, COUNT(*), d.dir_mtime_ns FROM manifest m "
+                "JOIN party_dirs d ON d.party = m.party GROUP BY m.party").fetchall()
+        out = {}
+        for party, n, mtime_ns in rows:
+            try:
+                if os.stat(os.path.join(self.data_dir, party)).st_mtime_ns == mtime_ns:
+                    out[party] = n
+            except OSError:
+                pass
+        return out
+
+    def manifest(self, party):
+        with self._lock:
+            rows = self._db.execute("SELECT filename, sha, size, added_at, orig_mtime FROM manifest "
+                                    "WHERE party=? ORDER BY filename", (party,)).fetchall()
+        return [dict(zip(("filename", "sha", "size", "added_at", "orig_mtime"), r)) for r in rows]
+
+    def forget_party(self, party):
+        with self._lock:
+            self._db.execute("DELETE FROM manifest WHERE party=?", (party,))
+            self._db.execute("DELETE FROM party_dirs WHERE party=?", (party,))
+            self._db.commit()
+            self._sync_locks.pop(party, None)
+
+    def gc(self):
+        """blobs löschen, die kein manifest mehr kennt und auf die kein hardlink mehr zeigt"""
+        with self._lock:
+            bekannt = {r[0] for r in self._db.execute("SELECT DISTINCT sha FROM manifest")}
+        weg = 0
+        for sub in os.listdir(self.blob_dir):
+            d = os.path.join(self.blob_dir, sub)
+            if sub.startswith("_") or not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                pfad = os.path.join(d, name)
+                if os.path.splitext(name)[0] in bekannt:
+                    continue
+                try:
+                    if os.stat(pfad).st_nlink <= 1:
+                        os.remove(pfad)
+                        weg += 1
+                except OSError:
+                    pass
+        return weg
+
+
+def _link(blob, ziel):
+    try:
+        os.link(blob, ziel)
+    except OSError:
+        shutil.copy2(blob, ziel)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = BlobStore()
+        return _STORE
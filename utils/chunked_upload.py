@@ -0,0 +1,308 @@
+# utils/chunked_upload.py
+#
+# upload großer mengen in stücken, ohne base64 und ohne alles im speicher
+# zu halten (dcc.Upload schickt alle dateien in einem callback). ablauf pro datei:
+#
+#   POST /upload/init   {"party", "filename", "size", "last_modified", "prefix"}
+#                                                      -> {"upload_id", "offset"}
+#   PUT  /upload/<id>?offset=N   rohe bytes            -> {"offset", "done"}
+#   GET  /upload/<id>                                  -> {"offset", "size", "done", "importing"}
+#
+# die bytes landen direkt in data/analysis/_uploads/<id>.part. die id hängt
+# von partei, dateiname, größe, änderungszeit und einem hash über die ersten
+# PREFIX_LEN bytes ("prefix", fnv-1a, rechnet der browser) ab: nach
+# abbruch/neuladen liefert init den schon angekommenen stand und der browser
+# macht dort weiter, zwei verschiedene dateien mit gleichem namen und gleicher
+# größe (zwei tabs, zwei nutzer) landen aber nicht im selben .part. sobald
+# der dateianfang da ist, wird der prefix gegen die bytes geprüft. ist die
+# datei komplett, wird sie geprüft (endung + magic bytes) und wie bei
+# save_uploaded_image an den blob-store übergeben (utils/blob_store.py:
+# gleiche bytes nur einmal, link in data/<partei>/). archive (.zip, .tar.gz)
+# gehen denselben weg und werden danach direkt aus dem staging gelesen
+# (utils/archive_import.py), ohne auspacken. das läuft in einem eigenen
+# thread, der letzte PUT kommt sofort mit "importing" zurück und der browser
+# fragt per GET nach, bis "done" kommt. der ausgang (meldung) bleibt bis zum
+# nächsten aufräumen in der .json stehen, ein wiederholter PUT/GET bekommt
+# ihn also noch. mehrere dateien dürfen parallel laufen, pro datei kommen
+# die stücke der reihe nach.
+
+import os, json, time, hashlib, threading
+
+from utils.uploader import DATA_DIR, ALLOWED_EXTS, check_magic, upload_message
+from utils.archive_import import ARCHIVE_MAX, archive_ext, check_archive_magic, import_archive, import_message
+from utils.dataset_catalog import RESERVED
+from utils.blob_store import get_store
+
+STAGING_DIR = os.path.join(DATA_DIR, "analysis", "_uploads")
+CHUNK_MAX = int(os.environ.get("UPLOAD_CHUNK_MB", "16")) * 1024 * 1024
+FILE_MAX = int(os.environ.get("UPLOAD_FILE_MB", "200")) * 1024 * 1024
+# halbfertige uploads, die so lange nicht angefasst wurden, fliegen raus
+STALE_SECS = 24 * 3600
+# so viele bytes vom dateianfang gehen (als hash) in die upload-id
+PREFIX_LEN = 64 * 1024
+
+_locks = {}
+_locks_lock = threading.Lock()
+# upload-ids, deren archiv gerade in diesem prozess eingelesen wird
+_importing = set()
+_last_cleanup = [0.0]
+
+
+class UploadError(Exception):
+    """fehler, die der browser angezeigt bekommt (status = http-code)"""
+
+    def __init__(self, msg, status=400, **extra):
+        super().__init__(msg)
+        self.status = status
+        self.extra = extra
+
+
+def _lock(upload_id):
+    with _locks_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _paths(upload_id, staging_dir=STAGING_DIR):
+    if not upload_id.isalnum():
+        raise UploadError("Ungültige Upload-ID", 404)
+    base = os.path.join(staging_dir, upload_id)
+    return base + ".part", base + ".json"
+
+
+def _forget_lock(upload_id):
+    with _locks_lock:
+        _locks.pop(upload_id, None)
+
+
+def _read_meta(meta):
+    with open(meta, encoding="utf-8") as fp:
+        m = json.load(fp)
+    if m.get("state") == "importing" and os.path.basename(meta)[:-len(".json")] not in _importing:
+        # der import-thread ist mit dem alten prozess gestorben
+        m.update(state="error", message="Import abgebrochen (Neustart), bitte erneut hochladen")
+    return m
+
+
+def _write_meta(meta, m):
+    tmp = meta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(m, fp)
+    os.replace(tmp, meta)
+
+
+def _result(upload_id, m):
+    """antwort für einen upload, dessen bytes komplett da sind"""
+    if m["state"] == "error":
+        raise UploadError(m["message"], 422)
+    return {"upload_id": upload_id, "offset": m["size"], "size": m["size"],
+            "done": m["state"] == "done", "importing": m["state"] == "importing",
+            "message": m.get("message", ""), **m.get("result", {})}
+
+
+def prefix_hash(data):
+    """fnv-1a (32 bit) als hex, gleich gerechnet in assets/chunked_upload.js"""
+    h = 0x811c9dc5
+    for b in data:
+        h = ((h ^ b) * 0x01000193) & 0xffffffff
+    return f"{h:08x}"
+
+
+def _ext(filename):
+    return archive_ext(filename) or os.path.splitext(filename)[1].lower()
+
+
+def _magic_ok(ext, head):
+    return check_magic(ext, head) if ext in ALLOWED_EXTS else check_archive_magic(ext, head)
+
+
+def init_upload(party, filename, size, last_modified=None, prefix=None, staging_dir=STAGING_DIR):
+    """
+    neuen upload anlegen oder den angefangenen wiederfinden. last_modified
+    (ms, File.lastModified) und prefix (prefix_hash der ersten PREFIX_LEN
+    bytes) unterscheiden gleichnamige dateien gleicher größe
+    """
+    party = (party or "").strip()
+    if not party or party in RESERVED or party.startswith(".") or "/" in party or "\\" in party:
+        raise UploadError("Ungültiger Parteiname")
+    filename = os.path.basename((filename or "").replace("\\", "/"))
+    if not filename or filename.startswith("."):
+        raise UploadError("Ungültiger Dateiname")
+    ext = _ext(filename)
+    if ext not in ALLOWED_EXTS and archive_ext(filename) is None:
+        raise UploadError(f"Format nicht erlaubt: {ext}", 415)
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("Größe fehlt")
+    if size <= 0 or size > (FILE_MAX if ext in ALLOWED_EXTS else ARCHIVE_MAX):
+        raise UploadError(f"Datei zu groß oder leer ({size} Bytes)", 413)
+    try:
+        last_modified = int(last_modified or 0)
+    except (TypeError, ValueError):
+        raise UploadError("Ungültige Änderungszeit")
+    prefix = (prefix or "").lower()
+    if prefix and (len(prefix) != 8 or any(c not in "0123456789abcdef" for c in prefix)):
+        raise UploadError("Ungültiger Prefix")
+
+    if time.time() - _last_cleanup[0] > 3600:
+        _last_cleanup[0] = time.time()
+        cleanup_stale(staging_dir)
+
+    upload_id = hashlib.sha1(f"{party}\0{filename}\0{size}\0{last_modified}\0{prefix}"
+                             .encode("utf-8")).hexdigest()
+    part, meta = _paths(upload_id, staging_dir)
+    os.makedirs(staging_dir, exist_ok=True)
+    with _lock(upload_id):
+        if os.path.exists(meta):
+            m = _read_meta(meta)
+            if m.get("state") == "importing":
+                return _result(upload_id, m)
+            if m.get("state"):
+                # dieselbe datei noch einmal: neu anfangen
+                _discard(part, meta)
+        if not os.path.exists(meta):
+            _write_meta(meta, {"party": party, "filename": filename, "size": size,
+                               "prefix": prefix, "created_at": time.time()})
+            open(part, "wb").close()
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+    return {"upload_id": upload_id, "offset": offset, "size": size}
+
+
+def upload_status(upload_id, staging_dir=STAGING_DIR):
+    part, meta = _paths(upload_id, staging_dir)
+    if not os.path.exists(meta):
+        raise UploadError("Upload unbekannt", 404)
+    m = _read_meta(meta)
+    if m.get("state"):
+        return _result(upload_id, m)
+    return {"upload_id": upload_id, "offset": os.path.getsize(part), "size": m["size"],
+            "done": False, "importing": False}
+
+
+def write_chunk(upload_id, offset, stream, length, staging_dir=STAGING_DIR):
+    """
+    ein stück an offset anhängen, direkt aus dem request-stream auf platte.
+    offset muss dem stand auf dem server entsprechen (sonst 409 mit dem stand).
+    """
+    part, meta = _paths(upload_id, staging_dir)
+    if length is None or length <= 0:
+        raise UploadError("Leeres Stück")
+    if length > CHUNK_MAX:
+        raise UploadError(f"Stück zu groß (max {CHUNK_MAX} Bytes)", 413)
+    with _lock(upload_id):
+        if not os.path.exists(meta):
+            raise UploadError("Upload unbekannt", 404)
+        m = _read_meta(meta)
+        if m.get("state"):
+            # letzter PUT wiederholt (z.b. nach timeout): stand statt fehler
+            return _result(upload_id, m)
+        ist = os.path.getsize(part)
+        if offset != ist:
+            raise UploadError("Falscher Offset", 409, offset=ist)
+        if ist + length > m["size"]:
+            raise UploadError("Mehr Bytes als angekündigt", 400)
+        ext = _ext(m["filename"])
+
+        with open(part, "r+b") as f:
+            f.seek(ist)
+            rest = length
+            erstes = ist == 0
+            while rest > 0:
+                buf = stream.read(min(rest, 1024 * 1024))
+                if not buf:
+                    break
+                if erstes:
+                    # früh ablehnen, nicht erst nach 200 MB
+                    if len(buf) >= 8 and not _magic_ok(ext, buf):
+                        f.truncate(0)
+                        f.close()
+                        _discard(part, meta)
+                        raise UploadError("Inhalt passt nicht zur Endung (kein Bild?)", 415)
+                    erstes = False
+                f.write(buf)
+                rest -= len(buf)
+            f.truncate()
+        offset = os.path.getsize(part)
+        n = min(PREFIX_LEN, m["size"])
+        if m.get("prefix") and ist < n <= offset:
+            # dateianfang komplett: passt er zur id?
+            with open(part, "rb") as f:
+                if prefix_hash(f.read(n)) != m["prefix"]:
+                    _discard(part, meta)
+                    raise UploadError("Dateianfang passt nicht zum Upload, bitte erneut hochladen", 400)
+        if offset < m["size"]:
+            return {"upload_id": upload_id, "offset": offset, "done": False}
+        return _finish(upload_id, part, meta, m, ext)
+
+
+def _finish(upload_id, part, meta, m, ext):
+    """alle bytes da (lock gehalten): bild ablegen bzw. archiv-import starten"""
+    with open(part, "rb") as f:
+        head = f.read(16)
+    if not _magic_ok(ext, head):
+        _discard(part, meta)
+        raise UploadError("Inhalt passt nicht zur Endung (kein Bild?)", 415)
+    if ext not in ALLOWED_EXTS:
+        # archiv: einträge im hintergrund direkt aus dem staging in den blob-store
+        m.update(state="importing", message=f"Archiv '{m['filename']}' wird eingelesen ...")
+        _importing.add(upload_id)
+        _write_meta(meta, m)
+        threading.Thread(target=_import_worker, args=(upload_id, part, meta, dict(m)),
+                         name=f"archive-import-{upload_id[:8]}", daemon=True).start()
+        return _result(upload_id, m)
+    status, name = get_store().put_file(m["party"], m["filename"], part)
+    m.update(state="done", message=upload_message(m["filename"], status, name),
+             result={"status": status, "filename": name})
+    _write_meta(meta, m)
+    _forget_lock(upload_id)
+    return _result(upload_id, m)
+
+
+def _import_worker(upload_id, part, meta, m):
+    try:
+        with open(part, "rb") as f:
+            res = import_archive(m["party"], f, m["filename"])
+        m.update(state="done", message=import_message(m["filename"], res),
+                 result={k: res[k] for k in ("stored", "duplicate", "renamed", "skipped", "errors")})
+    except Exception as e:
+        m.update(state="error", message=f"Archiv nicht lesbar: {e}")
+    with _lock(upload_id):
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        _write_meta(meta, m)
+        _importing.discard(upload_id)
+    _forget_lock(upload_id)
+
+
+def _discard(part, meta):
+    """upload verworfen (abgelehnt, veraltet, neu angefangen): dateien und lock weg"""
+    _forget_lock(os.path.basename(meta)[:-len(".json")])
+    for p in (part, meta):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def cleanup_stale(staging_dir=STAGING_DIR, max_age=STALE_SECS):
+    """alte halbfertige uploads (und alte ergebnisse) löschen, gibt die anzahl zurück"""
+    if not os.path.isdir(staging_dir):
+        return 0
+    weg = 0
+    jetzt = time.time()
+    for name in os.listdir(staging_dir):
+        if not name.endswith(".json") or name[:-len(".json")] in _importing:
+            continue
+        meta = os.path.join(staging_dir, name)
+        part = meta[:-5] + ".part"
+        try:
+            alter = jetzt - max(os.path.getmtime(meta),
+                                os.path.getmtime(part) if os.path.exists(part) else 0)
+        except OSError:
+            continue
+        if alter > max_age:
+            _discard(part, meta)
+            weg += 1
+    return weg
@@ -2,18 +2,26 @@
 
 import os
 
+from utils.blob_store import MANIFEST_PATH, get_store
+
 DATA_DIR = "data"
 VALID_EXTS = (".jpg", ".jpeg", ".png")
 
 def get_account_overview():
     """liefert dict {account: bildanzahl} zurück"""
     overview = {}
+    # parteien, deren ordner zum manifest passt, nicht durchzählen
+    manifest = get_store().counts() if os.path.exists(MANIFEST_PATH) else {}
 
     for acc in os.listdir(DATA_DIR):
         # ordner überspringen
         if acc == "analysis" or acc == ".status":
             continue
 
+        if acc in manifest:
+            overview[acc] = manifest[acc]
+            continue
+
         dir_path = os.path.join(DATA_DIR, acc)
         if os.path.isdir(dir_path):
             bild_count = 0
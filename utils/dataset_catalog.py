@@ -0,0 +1,309 @@
+# utils/dataset_catalog.py
+#
+# katalog der datensätze im speicher: parteien, anzahl bilder, bytes und
+# analyse-stand. die callbacks lesen nur noch hier, statt bei jedem rendern
+# data/ und jeden partei-ordner zu durchsuchen.
+#
+# aktuell gehalten wird er
+#   - direkt vom uploader und nach jeder analyse (add_file / set_analysis),
+#   - von einem watcher (watchdog, optional) für änderungen von außen,
+#   - und zur sicherheit von einem kompletten abgleich alle RECONCILE_SECS.
+
+import os, time, threading
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # ohne watchdog nur der periodische abgleich
+    Observer = None
+    FileSystemEventHandler = object
+
+DATA_DIR = "data"
+VALID_EXTS = (".jpg", ".jpeg", ".png")
+# ordner unter data/, die keine parteien sind
+RESERVED = ("analysis", ".status")
+RECONCILE_SECS = int(os.environ.get("CATALOG_RECONCILE_SECS", "300"))
+
+
+def is_party_dir(name, data_dir=DATA_DIR):
+    """ist data/<name> ein partei-ordner?"""
+    if not name or name in RESERVED or name.startswith(".") or "/" in name or "\\" in name:
+        return False
+    return os.path.isdir(os.path.join(data_dir, name))
+
+
+def is_image(name):
+    return name.lower().endswith(VALID_EXTS)
+
+
+def _checkpoint_path(party, data_dir):
+    # wie face_analysis.analyze_images.CHECKPOINT_NAME
+    return os.path.join(data_dir, "analysis", party, "_checkpoint.jsonl")
+
+
+class _Party:
+    __slots__ = ("files", "bytes")
+
+    def __init__(self):
+        self.files = {}  # dateiname -> größe
+        self.bytes = 0
+
+
+class DatasetCatalog:
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._parties = {}
+        # partei -> {"analyzed": bool, "checkpoint": int, "ckpt_size": int}
+        self._analysis = {}
+        self._observer = None
+        self._watches = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # wird bei jeder änderung hochgezählt
+        self.version = 0
+        self.reconciled_at = 0.0
+
+    # ---------- lesen (nur speicher) ---------- #
+    def parties(self):
+        with self._lock:
+            return sorted(self._parties)
+
+    def overview(self):
+        """{partei: bildanzahl} wie get_account_overview()"""
+        with self._lock:
+            return {p: len(d.files) for p, d in sorted(self._parties.items())}
+
+    def info(self, party):
+        with self._lock:
+            d = self._parties.get(party)
+            a = self._analysis.get(party, {})
+            return {
+                "party": party,
+                "images": len(d.files) if d else 0,
+                "bytes": d.bytes if d else 0,
+                "analyzed": bool(a.get("analyzed")),
+                "checkpoint": int(a.get("checkpoint") or 0),
+            }
+
+    # ---------- inkrementell ---------- #
+    def add_file(self, party, name, size=None):
+        if not is_image(name):
+            return
+        if size is None:
+            try:
+                size = os.path.getsize(os.path.join(self.data_dir, party, name))
+            except OSError:
+                return
+        with self._lock:
+            d = self._parties.setdefault(party, _Party())
+            d.bytes += size - d.files.get(name, 0)
+            d.files[name] = size
+            self.version += 1
+        self._watch_party(party)
+
+    def remove_file(self, party, name):
+        with self._lock:
+            d = self._parties.get(party)
+            if d is None or name not in d.files:
+                return
+            d.bytes -= d.files.pop(name)
+            self.version += 1
+
+    def add_party(self, party):
+        with self._lock:
+            self._parties.setdefault(party, _Party())
+            self.version += 1
+        self._watch_party(party)
+
+    def remove_party(self, party):
+        with self._lock:
+            self._parties.pop(party, None)
+            self._analysis.pop(party, None)
+            self.version += 1
+        self._unwatch_party(party)
+
+    def set_analysis(self, party, analyzed=None, checkpoint=None):
+        """nach einem lauf: fertig analysiert? wie viele bilder im checkpoint?"""
+        with self._lock:
+            a = self._analysis.setdefault(party, {"analyzed": False, "checkpoint": 0, "ckpt_size": 0})
+            if analyzed is not None:
+                a["analyzed"] = analyzed
+            if checkpoint is not None:
+                a["checkpoint"] = checkpoint
+                try:
+                    a["ckpt_size"] = os.path.getsize(_checkpoint_path(party, self.data_dir))
+                except OSError:
+                    a["ckpt_size"] = 0
+            self.version += 1
+
+    # ---------- abgleich mit der platte ---------- #
+    def reconcile(self, analyzed_parties=None):
+        """
+        kompletter scan (os.scandir, ein durchgang pro ordner). analyzed_parties:
+        menge aus dem ergebnis-index, None = analyse-stand so lassen
+        """
+        neu = {}
+        with os.scandir(self.data_dir) as it:
+            for entry in it:
+                if not entry.is_dir() or not is_party_dir(entry.name, self.data_dir):
+                    continue
+                d = _Party()
+                try:
+                    with os.scandir(entry.path) as files:
+                        for f in files:
+                            if is_image(f.name) and f.is_file():
+                                size = f.stat().st_size
+                                d.files[f.name] = size
+                                d.bytes += size
+                except OSError:
+                    continue
+                neu[entry.name] = d
+
+        analysis = {}
+        for party in neu:
+            with self._lock:
+                alt = dict(self._analysis.get(party, {}))
+            try:
+                size = os.path.getsize(_checkpoint_path(party, self.data_dir))
+            except OSError:
+                size = 0
+            # checkpoint nur neu zählen, wenn sich die datei geändert hat
+            if size == 0:
+                ckpt = 0
+            elif size == alt.get("ckpt_size"):
+                ckpt = alt.get("checkpoint", 0)
+            else:
+                ckpt = _count_lines(_checkpoint_path(party, self.data_dir))
+            analyzed = alt.get("analyzed", False) if analyzed_parties is None else party in analyzed_parties
+            analysis[party] = {"analyzed": analyzed, "checkpoint": ckpt, "ckpt_size": size}
+
+        with self._lock:
+            self._parties = neu
+            self._analysis = analysis
+            self.version += 1
+            self.reconciled_at = time.time()
+        for party in neu:
+            self._watch_party(party)
+        return len(neu)
+
+    # ---------- watcher ---------- #
+    def start(self, analyzed_fn=None, reconcile_secs=RECONCILE_SECS, watch=True):
+        """
+        erster abgleich + watcher + periodischer abgleich im hintergrund.
+        analyzed_fn() liefert die menge der analysierten parteien (ergebnis-index).
+        """
+        with self._start_lock:
+            if self._thread is None:
+                self._start(analyzed_fn, reconcile_secs, watch)
+
+    def _start(self, analyzed_fn, reconcile_secs, watch):
+        self.reconcile(analyzed_fn() if analyzed_fn else None)
+        if watch and Observer is not None:
+            self._observer = Observer()
+            self._observer.daemon = True
+            # nicht rekursiv: data/analysis (crops, cache) würde sonst alles fluten
+            self._observer.schedule(_Handler(self), self.data_dir, recursive=False)
+            self._observer.start()
+            for party in self.parties():
+                self._watch_party(party)
+
+        def loop():
+            while True:
+                time.sleep(reconcile_secs)
+                try:
+                    self.reconcile(analyzed_fn() if analyzed_fn else None)
+                except Exception:
+                    pass
+
+        self._thread = threading.Thread(target=loop, name="catalog-reconcile", daemon=True)
+        self._thread.start()
+
+    def _watch_party(self, party):
+        if self._observer is None or party in self._watches:
+            return
+        try:
+            self._watches[party] = self._observer.schedule(
+                _Handler(self), os.path.join(self.data_dir, party), recursive=False)
+        except Exception:
+            pass
+
+    def _unwatch_party(self, party):
+        watch = self._watches.pop(party, None)
+        if watch is not None and self._observer is not None:
+            try:
+                self._observer.unschedule(watch)
+            except Exception:
+                pass
+
+
+def _count_lines(pfad):
+    try:
+        with open(pfad, "rb") as f:
+            return sum(1 for line in f if line.endswith(b"\n"))
+    except OSError:
+        return 0
+
+
+class _Handler(FileSystemEventHandler):
+    """übersetzt dateisystem-events in katalog-updates"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.root = os.path.abspath(catalog.data_dir)
+
+    def _split(self, pfad):
+        """absoluter pfad -> (partei, dateiname); dateiname None = partei-ordner selbst"""
+        rel = os.path.relpath(os.path.abspath(pfad), self.root)
+        teile = rel.split(os.sep)
+        if teile[0] in RESERVED or teile[0].startswith(".") or len(teile) > 2:
+            return None, None
+        return teile[0], teile[1] if len(teile) == 2 else None
+
+    def _upsert(self, pfad, is_dir):
+        party, name = self._split(pfad)
+        if party is None:
+            return
+        if name is None:
+            if is_dir:
+                self.catalog.add_party(party)
+        elif not is_dir:
+            self.catalog.add_file(party, name)
+
+    def _remove(self, pfad):
+        party, name = self._split(pfad)
+        if party is None:
+            return
+        if name is None:
+            self.catalog.remove_party(party)
+        else:
+            self.catalog.remove_file(party, name)
+
+    def on_created(self, event):
+        self._upsert(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._upsert(event.src_path, False)
+
+    def on_closed(self, event):
+        self._upsert(event.src_path, False)
+
+    def on_deleted(self, event):
+        self._remove(event.src_path)
+
+    def on_moved(self, event):
+        self._remove(event.src_path)
+        self._upsert(event.dest_path, event.is_directory)
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog():
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            _CATALOG = DatasetCatalog()
+        return _CATALOG
@@ -0,0 +1,36 @@
+# utils/thumbnails.py
+
+import os, hashlib, threading
+from PIL import Image, ImageOps
+
+THUMB_DIR = os.path.join("data", "analysis", "_thumbs")
+THUMB_SIZE = 220  # passt zur vorschau im analyse-tab
+
+
+def thumb_key(pfad):
+    """schlüssel aus pfad + mtime + größe -> neues bild = neues thumbnail"""
+    st = os.stat(pfad)
+    raw = f"{os.path.abspath(pfad)}|{st.st_mtime_ns}|{st.st_size}|{THUMB_SIZE}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_thumbnail(pfad):
+    """
+    kleines jpeg zum bild, wird einmal erzeugt und dann aus dem cache genommen.
+    gibt (thumb_pfad, key) zurück
+    """
+    key = thumb_key(pfad)
+    thumb = os.path.abspath(os.path.join(THUMB_DIR, key[:2], key + ".jpg"))
+    if os.path.exists(thumb):
+        return thumb, key
+
+    os.makedirs(os.path.dirname(thumb), exist_ok=True)
+    with Image.open(pfad) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        tmp = f"{thumb}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp, "JPEG", quality=80)
+    os.replace(tmp, thumb)
+    return thumb, key
@@ -1,9 +1,33 @@
 import base64
 import os
 
+from utils.blob_store import get_store
+
 DATA_DIR = "data"
 ALLOWED_EXTS = [".jpg", ".jpeg", ".png"]
 
+# endung -> erlaubte dateianfänge
+MAGIC = {
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+}
+
+
+def check_magic(ext, head):
+    return any(head.startswith(m) for m in MAGIC.get(ext, ()))
+
+
+def decode_upload(content: str) -> bytes:
+    """dcc.Upload-inhalt ("data:...;base64,<daten>") -> bytes"""
+    # split in header + inhalt
+    if "," in content:
+        header, encoded = content.split(",", 1)
+    else:
+        encoded = content
+    return base64.b64decode(encoded)
+
+
 def save_uploaded_image(partei_name: str, content: str, filename: str):
     """speichert ein einzelnes hochgeladenes bild ab"""
     ziel_ordner = os.path.join(DATA_DIR, partei_name)
@@ -19,17 +43,21 @@ def save_uploaded_image(partei_name: str, content: str, filename: str):
         return f"Format nicht erlaubt: {ext}"
 
     try:
-        # split in header + inhalt
-        if "," in content:
-            header, encoded = content.split(",", 1)
-        else:
-            encoded = content
-        decoded = base64.b64decode(encoded)
-
-        pfad = os.path.join(ziel_ordner, filename)
-        with open(pfad, "wb") as f:
-            f.write(decoded)
-
-        return f"Bild '{filename}' gespeichert"
+        decoded = decode_upload(content)
+        if not check_magic(ext, decoded[:16]):
+            return f"Inhalt von '{filename}' passt nicht zur Endung (kein Bild?)"
+
+        # inhaltsadressiert ablegen (gleiche bytes nur einmal), führt auch den katalog mit
+        status, name = get_store().put_bytes(partei_name, filename, decoded)
+        return upload_message(filename, status, name)
     except Exception as e:
         return "Fehler bei '" + filename + "': " + str(e)
+
+
+def upload_message(filename, status, name):
+    """meldung für die ergebnisse von BlobStore.put_*"""
+    if status == "duplicate":
+        return f"Bild '{filename}' schon vorhanden (gleicher Inhalt wie '{name}')"
+    if status == "renamed":
+        return f"Bild '{filename}' gespeichert als '{name}' (Name schon vergeben)"
+    return f"Bild '{filename}' gespeichert"